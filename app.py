@@ -1,18 +1,175 @@
 import os
+import json
 import logging
+import math
 import time
 import uuid
-from flask import Flask, render_template, jsonify, request
-from utils.usda_api import get_food_data, search_foods
-from utils.data_transformer import transform_to_sankey
+from flask import Flask, Response, g, render_template, jsonify, request, send_file, stream_with_context
+from utils import metrics
+from utils.log_config import configure_logging
+from utils.profiler import profiler
+from utils.usda_api import get_food_data, get_foods_data, search_foods, similar_foods, suggest_foods
+from utils.data_transformer import resolve_portion, transform_to_sankey, transform_to_sankey_portions
+from utils.nutrient_spec import SPEC_VERSION
+from utils.chart_bundle import BUNDLE_VERSION, build_chart_bundle, build_voronoi_bundle
+from utils.wire_format import (
+    NUTRIENT_VECTOR_MIMETYPE,
+    NUTRIENT_VECTOR_VERSION,
+    SANKEY_COLUMNAR_MIMETYPE,
+    encode_sankey_columnar,
+    nutrient_vector,
+)
+from utils.export import ExportError, iter_export_records, iter_ndjson
+from utils.payload_store import (
+    PayloadStore,
+    payload_key,
+    pick_encoding,
+    DEFAULT_MAX_BYTES as PAYLOAD_MAX_BYTES,
+    DEFAULT_MAX_DISK_BYTES as PAYLOAD_MAX_DISK_BYTES,
+)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (LOG_LEVEL, default INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "development_key")
 
+# Upper bound on ids accepted by /api/foods in one request
+MAX_BATCH_FOODS = 100
+# Upper bounds for /api/compare: foods compared, and similar foods listed per food
+MAX_COMPARE_FOODS = 20
+MAX_NEIGHBORS = 50
+# Upper bound on typeahead suggestions per request
+MAX_SUGGESTIONS = 50
+# /metrics exposes internal counters, so it is only served with METRICS_ENABLED=1;
+# keep it off the public port or behind the scraper's network.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+# /debug/profile exposes stack samples (file and function names); PROFILER_INTERVAL_MS
+# only starts sampling, and the route is served with PROFILE_ENDPOINT_ENABLED=1.
+PROFILE_ENDPOINT_ENABLED = os.environ.get("PROFILE_ENDPOINT_ENABLED", "").lower() in ("1", "true", "yes")
+
+# Serialized /api/food responses, keyed by food revision and transform options.
+# PAYLOAD_STORE_DIR keeps them on disk so they are served with sendfile.
+payload_store = PayloadStore(
+    max_bytes=int(os.environ.get("PAYLOAD_STORE_MAX_BYTES", PAYLOAD_MAX_BYTES)),
+    directory=os.environ.get("PAYLOAD_STORE_DIR") or None,
+    max_disk_bytes=int(os.environ.get("PAYLOAD_STORE_MAX_DISK_BYTES", PAYLOAD_MAX_DISK_BYTES)),
+)
+PAYLOAD_CACHE_CONTROL = "public, max-age=86400, stale-while-revalidate=604800"
+metrics.CallbackMetric(
+    "payload_store_total",
+    "Payload store lookups served from the store (hits), payloads built (builds) and payloads pruned from disk (pruned).",
+    ("event",),
+    lambda: payload_store.stats.items(),
+    kind="counter",
+)
+
+@app.before_request
+def _start_request_timing():
+    g.request_started = time.perf_counter()
+    g.phases = metrics.start_request()
+    if profiler is not None:
+        profiler.enter()
+
+@app.after_request
+def _record_request_timing(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.HTTP_REQUEST_SECONDS.observe(total, route=route, method=request.method, status=response.status_code)
+    response.headers['Server-Timing'] = metrics.server_timing(g.phases, total)
+    return response
+
+@app.teardown_request
+def _end_request_profile(exc):
+    if profiler is not None:
+        profiler.leave()
+
+if METRICS_ENABLED:
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+if profiler is not None and PROFILE_ENDPOINT_ENABLED:
+    @app.route('/debug/profile')
+    def sampling_profile():
+        """
+        Collapsed stacks sampled from request threads since the last reset;
+        pass reset=true to start a new window after reading.
+        """
+        body = profiler.collapsed()
+        summary = profiler.summary()
+        if _parse_bool(request.args.get('reset')):
+            profiler.reset()
+        response = Response(body, mimetype='text/plain')
+        response.headers['X-Profile-Samples'] = str(summary['samples'])
+        return response
+
+def _parse_bool(value, default: bool = False) -> bool:
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() == 'true'
+
+class _BadRequest(ValueError):
+    """A request parameter error, reported to the client as a 400."""
+
+def _parse_batch_request(max_ids: int, unique: bool = False):
+    """
+    ids and Sankey options shared by /api/foods and /api/compare, from a POSTed
+    JSON body or the query string (ids comma-separated). "portion" is grams for
+    every food, or (POST only) an object mapping fdcId to grams.
+
+    Returns (options, ids, portions, reverse_hierarchy, show_sodium,
+    show_fat_breakdown); raises _BadRequest with the message for the client.
+    """
+    if request.method == 'POST':
+        options = request.get_json(silent=True) or {}
+        ids = options.get('ids') or []
+    else:
+        options = request.args
+        ids = [i for i in options.get('ids', '').split(',') if i.strip()]
+    if not isinstance(ids, list) or not ids:
+        raise _BadRequest("Parameter 'ids' is required")
+    if len(ids) > max_ids:
+        raise _BadRequest(f"At most {max_ids} ids per request")
+    ids = [str(i).strip() for i in ids]
+    if unique:
+        ids = list(dict.fromkeys(ids))
+
+    portion_option = options.get('portion')
+    try:
+        if isinstance(portion_option, dict):
+            portions = {str(k): _parse_portion(v) for k, v in portion_option.items()}
+        else:
+            default_portion = _parse_portion(portion_option)
+            portions = {food_id: default_portion for food_id in ids}
+    except (TypeError, ValueError):
+        raise _BadRequest("Parameter 'portion' must be a positive number of grams")
+    return (
+        options,
+        ids,
+        portions,
+        _parse_bool(options.get('reverseHierarchy')),
+        _parse_bool(options.get('showSodium')),
+        _parse_bool(options.get('showFatBreakdown'), default=True),
+    )
+
+def _parse_portion(value):
+    """Portion weight in grams, or None for the USDA 100g basis."""
+    if value in (None, ''):
+        return None
+    portion = float(value)
+    # float() accepts "nan", "inf" and overflowing literals, which jsonify would
+    # write as NaN/Infinity.
+    if not math.isfinite(portion) or portion <= 0:
+        raise ValueError(f"Portion must be a positive number, got {value}")
+    return portion
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -27,13 +184,15 @@ def search_food():
         # Parse data types filter (comma-separated)
         data_types_param = request.args.get('dataTypes', '')
         data_types = [dt.strip() for dt in data_types_param.split(',') if dt.strip()] if data_types_param else None
-        logger.info(f"[{request_id}] /api/search start query='{query}' page={page} pageSize={page_size} dataTypes={data_types}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[{request_id}] /api/search start query='{query}' page={page} pageSize={page_size} dataTypes={data_types}")
         
         if not query:
             return jsonify({"error": "Query parameter 'q' is required", "requestId": request_id}), 400
             
         t0 = time.time()
-        search_result = search_foods(query, page_size=page_size, page=page, request_id=request_id, data_types=data_types)
+        with metrics.timed(phase='fetch'):
+            search_result = search_foods(query, page_size=page_size, page=page, request_id=request_id, data_types=data_types)
         elapsed = (time.time() - t0) * 1000.0
         if isinstance(search_result, dict) and "error" in search_result:
             # Propagate upstream error status if available
@@ -44,22 +203,56 @@ def search_food():
             return jsonify(body), status
             
         logger.info(f"[{request_id}] /api/search success results={len(search_result.get('results', []))} totalPages={search_result.get('totalPages')} elapsedMs={elapsed:.1f}")
-        return jsonify(search_result)
+        with metrics.timed(metrics.SERIALIZE_SECONDS, 'serialize', encoding='identity'):
+            return jsonify(search_result)
     except Exception as e:
         request_id = request.headers.get("X-Request-Id") or uuid.uuid4().hex
         logger.error(f"[{request_id}] Error searching foods: {str(e)}")
         return jsonify({"error": "Failed to search foods", "requestId": request_id}), 500
 
+@app.route('/api/suggest')
+def suggest_food():
+    """
+    Typeahead suggestions for a partial query (q), served from the local suggest
+    index without calling USDA. Accepts limit (default 8) and dataTypes like /api/search.
+    """
+    request_id = uuid.uuid4().hex
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({"error": "Query parameter 'q' is required", "requestId": request_id}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 8)), 1), MAX_SUGGESTIONS)
+    except ValueError:
+        return jsonify({"error": "Parameter 'limit' must be a number", "requestId": request_id}), 400
+    data_types_param = request.args.get('dataTypes', '')
+    data_types = [dt.strip() for dt in data_types_param.split(',') if dt.strip()] if data_types_param else None
+    try:
+        results = suggest_foods(query, limit=limit, data_types=data_types, request_id=request_id)
+    except Exception as e:
+        logger.error(f"[{request_id}] Error suggesting foods: {str(e)}")
+        return jsonify({"error": "Failed to suggest foods", "requestId": request_id}), 500
+    return jsonify({"query": query, "results": results})
+
 @app.route('/api/food/<food_id>')
 def get_food_nutrients(food_id):
     try:
         request_id = uuid.uuid4().hex
         # Check for reverse hierarchy mode
         reverse_hierarchy = request.args.get('reverseHierarchy', 'false').lower() == 'true'
-        logger.info(f"[{request_id}] /api/food start id={food_id} reverseHierarchy={reverse_hierarchy}")
+        show_sodium = _parse_bool(request.args.get('showSodium'))
+        show_fat_breakdown = _parse_bool(request.args.get('showFatBreakdown'), default=True)
+        all_portions = request.args.get('portions', '').lower() == 'all'
+        portion_id = request.args.get('portionId') or None
+        try:
+            portion = _parse_portion(request.args.get('portion'))
+        except ValueError:
+            return jsonify({"error": "Parameter 'portion' must be a positive number of grams", "requestId": request_id}), 400
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[{request_id}] /api/food start id={food_id} reverseHierarchy={reverse_hierarchy} showSodium={show_sodium} showFatBreakdown={show_fat_breakdown} portion={portion} portionId={portion_id} portions={'all' if all_portions else 'one'}")
         # Fetch data from USDA API
         t0 = time.time()
-        food_data = get_food_data(food_id, request_id=request_id)
+        with metrics.timed(phase='fetch'):
+            food_data = get_food_data(food_id, request_id=request_id)
         elapsed = (time.time() - t0) * 1000.0
         if isinstance(food_data, dict) and "error" in food_data:
             status = food_data.get("status", 502)
@@ -69,11 +262,431 @@ def get_food_nutrients(food_id):
             body.setdefault("requestId", request_id)
             return jsonify(body), status if status in (404, 429, 500, 502, 503) else 502
         
-        # Transform data for Sankey diagram
-        sankey_data = transform_to_sankey(food_data, reverse_hierarchy=reverse_hierarchy)
-        logger.info(f"[{request_id}] /api/food success id={food_id} nodes={len(sankey_data.get('nodes', []))} links={len(sankey_data.get('links', []))} elapsedMs={elapsed:.1f}")
-        return jsonify(sankey_data)
+        # The payload is deterministic for a food revision and option set, so it is
+        # transformed and serialized once and then served from the payload store.
+        # Clients that accept the columnar encoding get it for single portions;
+        # JSON stays the default.
+        mimetype = 'application/json'
+        if all_portions:
+            key = payload_key(food_data, 'sankey-portions', (SPEC_VERSION, reverse_hierarchy, show_sodium, show_fat_breakdown))
+
+            def build():
+                with metrics.timed(metrics.TRANSFORM_SECONDS, 'transform', kind='sankey-portions'):
+                    return transform_to_sankey_portions(
+                        food_data,
+                        reverse_hierarchy=reverse_hierarchy,
+                        show_sodium=show_sodium,
+                        show_fat_breakdown=show_fat_breakdown,
+                    )
+        else:
+            try:
+                portion = resolve_portion(food_data, portion=portion, portion_id=portion_id)
+            except ValueError as e:
+                return jsonify({"error": str(e), "requestId": request_id}), 400
+            mimetype = request.accept_mimetypes.best_match(['application/json', SANKEY_COLUMNAR_MIMETYPE], 'application/json')
+            columnar = mimetype == SANKEY_COLUMNAR_MIMETYPE
+            kind = 'sankey-columnar' if columnar else 'sankey'
+            key = payload_key(food_data, kind, (SPEC_VERSION, reverse_hierarchy, show_sodium, show_fat_breakdown, portion))
+
+            def build():
+                with metrics.timed(metrics.TRANSFORM_SECONDS, 'transform', kind=kind):
+                    payload = transform_to_sankey(
+                        food_data,
+                        reverse_hierarchy=reverse_hierarchy,
+                        show_sodium=show_sodium,
+                        show_fat_breakdown=show_fat_breakdown,
+                        portion=portion,
+                    )
+                    return encode_sankey_columnar(payload) if columnar else payload
+        not_modified = _not_modified(key[:32])
+        if not_modified is not None:
+            logger.info(f"[{request_id}] /api/food not modified id={food_id} elapsedMs={elapsed:.1f}")
+            not_modified.vary.add('Accept')
+            return not_modified
+        stored = payload_store.get_or_build(key, build)
+        logger.info(f"[{request_id}] /api/food success id={food_id} etag={stored.etag} elapsedMs={elapsed:.1f}")
+        response = _payload_response(stored, mimetype=mimetype)
+        response.vary.add('Accept')
+        return response
     except Exception as e:
         request_id = uuid.uuid4().hex
         logger.error(f"[{request_id}] Error processing food data: {str(e)}")
         return jsonify({"error": "Failed to process food data", "requestId": request_id}), 500
+
+@app.route('/api/food/<food_id>/bundle')
+def get_food_bundle(food_id):
+    """
+    The nutrients the charts draw from, scaled to one portion, and the food's
+    labelled portions. The Voronoi cells are served by /api/food/<id>/voronoi.
+    """
+    try:
+        request_id = uuid.uuid4().hex
+        portion_id = request.args.get('portionId') or None
+        try:
+            portion = _parse_portion(request.args.get('portion'))
+        except ValueError:
+            return jsonify({"error": "Parameter 'portion' must be a positive number of grams", "requestId": request_id}), 400
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[{request_id}] /api/food/bundle start id={food_id} portion={portion} portionId={portion_id}")
+        t0 = time.time()
+        with metrics.timed(phase='fetch'):
+            food_data = get_food_data(food_id, request_id=request_id)
+        elapsed = (time.time() - t0) * 1000.0
+        if isinstance(food_data, dict) and "error" in food_data:
+            status = food_data.get("status", 502)
+            logger.warning(f"[{request_id}] /api/food/bundle error id={food_id} status={status} elapsedMs={elapsed:.1f} msg={food_data.get('error')}")
+            body = dict(food_data)
+            body.setdefault("requestId", request_id)
+            return jsonify(body), status if status in (404, 429, 500, 502, 503) else 502
+        try:
+            portion = resolve_portion(food_data, portion=portion, portion_id=portion_id)
+        except ValueError as e:
+            return jsonify({"error": str(e), "requestId": request_id}), 400
+        key = payload_key(food_data, 'bundle', (SPEC_VERSION, BUNDLE_VERSION, portion))
+
+        def build():
+            with metrics.timed(metrics.TRANSFORM_SECONDS, 'transform', kind='bundle'):
+                return build_chart_bundle(food_data, portion=portion)
+        not_modified = _not_modified(key[:32])
+        if not_modified is not None:
+            logger.info(f"[{request_id}] /api/food/bundle not modified id={food_id} elapsedMs={elapsed:.1f}")
+            return not_modified
+        stored = payload_store.get_or_build(key, build)
+        logger.info(f"[{request_id}] /api/food/bundle success id={food_id} etag={stored.etag} elapsedMs={elapsed:.1f}")
+        return _payload_response(stored)
+    except Exception as e:
+        request_id = uuid.uuid4().hex
+        logger.error(f"[{request_id}] Error building chart bundle: {str(e)}")
+        return jsonify({"error": "Failed to build chart bundle", "requestId": request_id}), 500
+
+@app.route('/api/food/<food_id>/voronoi')
+def get_food_voronoi(food_id):
+    """
+    Solved Voronoi cells for every treemap hierarchy of a food. They do not
+    depend on the portion, so there is one payload per food, and the client
+    only asks for it when the Voronoi tab is shown.
+    """
+    try:
+        request_id = uuid.uuid4().hex
+        t0 = time.time()
+        with metrics.timed(phase='fetch'):
+            food_data = get_food_data(food_id, request_id=request_id)
+        elapsed = (time.time() - t0) * 1000.0
+        if isinstance(food_data, dict) and "error" in food_data:
+            status = food_data.get("status", 502)
+            logger.warning(f"[{request_id}] /api/food/voronoi error id={food_id} status={status} elapsedMs={elapsed:.1f} msg={food_data.get('error')}")
+            body = dict(food_data)
+            body.setdefault("requestId", request_id)
+            return jsonify(body), status if status in (404, 429, 500, 502, 503) else 502
+        key = payload_key(food_data, 'voronoi', (SPEC_VERSION, BUNDLE_VERSION))
+
+        def build():
+            with metrics.timed(metrics.TRANSFORM_SECONDS, 'transform', kind='voronoi'):
+                return build_voronoi_bundle(food_data)
+        not_modified = _not_modified(key[:32])
+        if not_modified is not None:
+            logger.info(f"[{request_id}] /api/food/voronoi not modified id={food_id} elapsedMs={elapsed:.1f}")
+            return not_modified
+        stored = payload_store.get_or_build(key, build)
+        logger.info(f"[{request_id}] /api/food/voronoi success id={food_id} etag={stored.etag} elapsedMs={elapsed:.1f}")
+        return _payload_response(stored)
+    except Exception as e:
+        request_id = uuid.uuid4().hex
+        logger.error(f"[{request_id}] Error building Voronoi layouts: {str(e)}")
+        return jsonify({"error": "Failed to build Voronoi layouts", "requestId": request_id}), 500
+
+@app.route('/api/food/<food_id>/raw')
+def get_food_raw(food_id):
+    """
+    The USDA food record, as the worker's /raw serves it, or with
+    Accept: application/x-nutrient-vector+json only the nutrients and portion
+    fields the charts read (see utils/wire_format.py).
+    """
+    try:
+        request_id = uuid.uuid4().hex
+        t0 = time.time()
+        with metrics.timed(phase='fetch'):
+            food_data = get_food_data(food_id, request_id=request_id)
+        elapsed = (time.time() - t0) * 1000.0
+        if isinstance(food_data, dict) and "error" in food_data:
+            status = food_data.get("status", 502)
+            logger.warning(f"[{request_id}] /api/food/raw error id={food_id} status={status} elapsedMs={elapsed:.1f} msg={food_data.get('error')}")
+            body = dict(food_data)
+            body.setdefault("requestId", request_id)
+            return jsonify(body), status if status in (404, 429, 500, 502, 503) else 502
+        mimetype = request.accept_mimetypes.best_match(['application/json', NUTRIENT_VECTOR_MIMETYPE], 'application/json')
+        vector = mimetype == NUTRIENT_VECTOR_MIMETYPE
+        key = payload_key(food_data, 'nutrient-vector' if vector else 'raw', (SPEC_VERSION, NUTRIENT_VECTOR_VERSION) if vector else ())
+
+        def build():
+            if not vector:
+                return food_data
+            with metrics.timed(metrics.TRANSFORM_SECONDS, 'transform', kind='nutrient-vector'):
+                return nutrient_vector(food_data)
+        not_modified = _not_modified(key[:32])
+        if not_modified is not None:
+            not_modified.vary.add('Accept')
+            return not_modified
+        stored = payload_store.get_or_build(key, build)
+        logger.info(f"[{request_id}] /api/food/raw success id={food_id} vector={vector} etag={stored.etag} elapsedMs={elapsed:.1f}")
+        response = _payload_response(stored, mimetype=mimetype)
+        response.vary.add('Accept')
+        return response
+    except Exception as e:
+        request_id = uuid.uuid4().hex
+        logger.error(f"[{request_id}] Error serving raw food data: {str(e)}")
+        return jsonify({"error": "Failed to fetch food data", "requestId": request_id}), 500
+
+def _etag_for(stored_etag: str, encoding: str) -> str:
+    # Each content-coding is a different representation and needs its own strong tag.
+    return stored_etag if encoding == 'identity' else f"{stored_etag}-{encoding}"
+
+def _not_modified(etag: str):
+    # The client's tag must be that of the representation a 200 would send now,
+    # i.e. the encoding _payload_response would pick, and the 304 carries it.
+    selected = _etag_for(etag, pick_encoding(request.accept_encodings))
+    if not request.if_none_match.contains(selected):
+        return None
+    response = Response(status=304)
+    response.set_etag(selected)
+    response.headers['Cache-Control'] = PAYLOAD_CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def _payload_response(stored, mimetype: str = 'application/json'):
+    """
+    Serve a stored payload in the best encoding the client accepts.
+    """
+    encoding = stored.pick_encoding(request.accept_encodings)
+    if encoding in stored.paths:
+        response = send_file(stored.paths[encoding], mimetype=mimetype, etag=False, conditional=False)
+    else:
+        response = Response(stored.bodies[encoding], mimetype=mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(_etag_for(stored.etag, encoding))
+    response.headers['Cache-Control'] = PAYLOAD_CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def _sum_sankeys(sankeys):
+    """
+    Merge Sankey payloads built with the same options into one, summing link values.
+    """
+    totals = {}
+    for sankey in sankeys:
+        for link in sankey["links"]:
+            key = (link["source"], link["target"])
+            totals[key] = totals.get(key, 0.0) + link["value"]
+    return {
+        "nodes": sankeys[0]["nodes"] if sankeys else [],
+        "links": [{"source": s, "target": t, "value": v} for (s, t), v in totals.items()],
+    }
+
+@app.route('/api/foods', methods=['GET', 'POST'])
+def get_foods_nutrients():
+    """
+    Sankey payloads for many foods in one request.
+
+    POST a JSON body {"ids": [...], "reverseHierarchy", "showSodium", "showFatBreakdown",
+    "portion", "aggregate"} or GET with the same names as query parameters (see
+    _parse_batch_request). With aggregate=true the response also carries a "meal"
+    Sankey summing all foods.
+    """
+    request_id = uuid.uuid4().hex
+    try:
+        try:
+            options, ids, portions, reverse_hierarchy, show_sodium, show_fat_breakdown = _parse_batch_request(MAX_BATCH_FOODS)
+        except _BadRequest as e:
+            return jsonify({"error": str(e), "requestId": request_id}), 400
+        aggregate = _parse_bool(options.get('aggregate'))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[{request_id}] /api/foods start ids={len(ids)} reverseHierarchy={reverse_hierarchy} aggregate={aggregate}")
+
+        t0 = time.time()
+        with metrics.timed(phase='fetch'):
+            foods = get_foods_data(ids, request_id=request_id)
+        elapsed = (time.time() - t0) * 1000.0
+
+        results = []
+        sankeys = []
+        for food_id in ids:
+            food_data = foods.get(food_id) or {"error": f"USDA food {food_id} not found", "status": 404}
+            if "error" in food_data:
+                results.append({"fdcId": food_id, "error": food_data["error"], "status": food_data.get("status", 502)})
+                continue
+            with metrics.timed(metrics.TRANSFORM_SECONDS, 'transform', kind='sankey'):
+                sankey_data = transform_to_sankey(
+                    food_data,
+                    reverse_hierarchy=reverse_hierarchy,
+                    show_sodium=show_sodium,
+                    show_fat_breakdown=show_fat_breakdown,
+                    portion=portions.get(food_id),
+                )
+            sankeys.append(sankey_data)
+            results.append({
+                "fdcId": food_data.get("fdcId", food_id),
+                "description": food_data.get("description", ""),
+                "portion": portions.get(food_id) or 100.0,
+                "sankey": sankey_data,
+            })
+
+        body = {"foods": results, "requestId": request_id}
+        if aggregate:
+            body["meal"] = _sum_sankeys(sankeys)
+        logger.info(f"[{request_id}] /api/foods success ids={len(ids)} ok={len(sankeys)} elapsedMs={elapsed:.1f}")
+        with metrics.timed(metrics.SERIALIZE_SECONDS, 'serialize', encoding='identity'):
+            return jsonify(body)
+    except Exception as e:
+        logger.error(f"[{request_id}] Error processing food batch: {str(e)}")
+        return jsonify({"error": "Failed to process food batch", "requestId": request_id}), 500
+
+@app.route('/api/compare', methods=['GET', 'POST'])
+def compare_foods_nutrients():
+    """
+    Compare foods on one Sankey layout in a single request.
+
+    Takes the same ids, reverseHierarchy, showSodium, showFatBreakdown and portion
+    options as /api/foods, plus "neighbors" (default 5): how many of the most
+    similar known foods to list for each food. The first food is the reference
+    for deltas and distances. Foods that cannot be fetched are reported under
+    "errors" and left out of the comparison.
+    """
+    # NumPy-backed; imported on first use to keep worker startup lean.
+    from utils.compare import compare_foods
+
+    request_id = uuid.uuid4().hex
+    try:
+        try:
+            options, ids, portions, reverse_hierarchy, show_sodium, show_fat_breakdown = _parse_batch_request(
+                MAX_COMPARE_FOODS, unique=True,
+            )
+        except _BadRequest as e:
+            return jsonify({"error": str(e), "requestId": request_id}), 400
+        try:
+            neighbors = min(max(int(options.get('neighbors', 5)), 0), MAX_NEIGHBORS)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Parameter 'neighbors' must be an integer", "requestId": request_id}), 400
+
+        t0 = time.time()
+        with metrics.timed(phase='fetch'):
+            fetched = get_foods_data(ids, request_id=request_id)
+        elapsed = (time.time() - t0) * 1000.0
+
+        foods = []
+        errors = []
+        for food_id in ids:
+            food_data = fetched.get(food_id) or {"error": f"USDA food {food_id} not found", "status": 404}
+            if "error" in food_data:
+                errors.append({"fdcId": food_id, "error": food_data["error"], "status": food_data.get("status", 502)})
+            else:
+                foods.append((food_id, food_data))
+
+        with metrics.timed(metrics.TRANSFORM_SECONDS, 'transform', kind='compare'):
+            comparison = compare_foods(
+                [food_data for _, food_data in foods],
+                portions=[portions.get(food_id) for food_id, _ in foods],
+                reverse_hierarchy=reverse_hierarchy,
+                show_sodium=show_sodium,
+                show_fat_breakdown=show_fat_breakdown,
+            )
+        similar = [[] for _ in foods]
+        if foods and neighbors:
+            with metrics.timed(metrics.TRANSFORM_SECONDS, 'transform', kind='neighbors'):
+                similar = similar_foods([food_data for _, food_data in foods], limit=neighbors, exclude=ids)
+
+        body = {
+            "foods": [
+                {
+                    "fdcId": food_data.get("fdcId", food_id),
+                    "description": food_data.get("description", ""),
+                    "dataType": food_data.get("dataType", ""),
+                    "portion": portions.get(food_id) or 100.0,
+                    "distance": distance,
+                    "similar": matches,
+                }
+                for (food_id, food_data), distance, matches in zip(foods, comparison["distances"], similar)
+            ],
+            "errors": errors,
+            "nodes": comparison["nodes"],
+            "links": comparison["links"],
+            "merged": comparison["merged"],
+            "requestId": request_id,
+        }
+        logger.info(f"[{request_id}] /api/compare success ids={len(ids)} ok={len(foods)} neighbors={neighbors} elapsedMs={elapsed:.1f}")
+        with metrics.timed(metrics.SERIALIZE_SECONDS, 'serialize', encoding='identity'):
+            return jsonify(body)
+    except Exception as e:
+        logger.error(f"[{request_id}] Error comparing foods: {str(e)}")
+        return jsonify({"error": "Failed to compare foods", "requestId": request_id}), 500
+
+@app.route('/api/export')
+def export_foods():
+    """
+    Stream Sankey payloads for every food matching a search as NDJSON, one food per line,
+    in ascending fdcId order. Pass resumeAfter=<fdcId> to continue an interrupted export.
+    """
+    request_id = uuid.uuid4().hex
+    query = request.args.get('q', '')
+    if not query:
+        return jsonify({"error": "Query parameter 'q' is required", "requestId": request_id}), 400
+    data_types_param = request.args.get('dataTypes', '')
+    data_types = [dt.strip() for dt in data_types_param.split(',') if dt.strip()] if data_types_param else None
+    try:
+        portion = _parse_portion(request.args.get('portion'))
+        resume_after = int(request.args['resumeAfter']) if request.args.get('resumeAfter') else None
+    except ValueError:
+        return jsonify({"error": "Parameters 'portion' and 'resumeAfter' must be numbers", "requestId": request_id}), 400
+    logger.info(f"[{request_id}] /api/export start query='{query}' dataTypes={data_types} resumeAfter={resume_after}")
+
+    records = iter_export_records(
+        query,
+        data_types=data_types,
+        reverse_hierarchy=_parse_bool(request.args.get('reverseHierarchy')),
+        show_sodium=_parse_bool(request.args.get('showSodium')),
+        show_fat_breakdown=_parse_bool(request.args.get('showFatBreakdown'), default=True),
+        portion=portion,
+        resume_after=resume_after,
+        request_id=request_id,
+    )
+
+    def generate():
+        count = 0
+        try:
+            for line in iter_ndjson(records):
+                count += 1
+                yield line
+        except ExportError as e:
+            # Headers are already sent; report the failure as a final line.
+            logger.warning(f"[{request_id}] /api/export stopped after {count} foods: {str(e)}")
+            yield json.dumps({"error": str(e), "status": e.status, "requestId": request_id}) + "\n"
+            return
+        logger.info(f"[{request_id}] /api/export done foods={count}")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Request-Id': request_id, 'Cache-Control': 'no-store'},
+    )
+
+# Modules that import NumPy; loaded lazily by the routes that need them.
+WARM_MODULES = ("utils.compare", "utils.voronoi")
+
+def warm_start():
+    """
+    Do once what each worker would otherwise do on its first requests: import
+    WARM_MODULES, load the typeahead index (and with NEIGHBOR_PRELOAD, the
+    neighbor index) from the local food index and compile the page template. gunicorn.conf.py calls this in a
+    preloading master, so forked workers share the result copy-on-write.
+    """
+    import importlib
+    from utils import usda_api
+
+    t0 = time.perf_counter()
+    for name in WARM_MODULES:
+        importlib.import_module(name)
+    if usda_api.USE_ASYNC_CLIENT:
+        importlib.import_module("utils.usda_async")
+    usda_api.preload_indexes()
+    app.jinja_env.get_template('index.html')
+    logger.info(f"Warm start done in {(time.perf_counter() - t0) * 1000.0:.1f}ms")
@@ -0,0 +1,151 @@
+"""
+Throughput and latency of /api/search and /api/food under concurrent load.
+
+The Flask app runs in a threaded werkzeug server in-process, with
+utils.usda_api pointed at the stub USDA server. Cold scenarios disable the
+response cache and payload store so every request reaches the upstream stub;
+fault scenarios inject 429/5xx responses to exercise retry and backoff.
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.corpus import WORDS, load_corpus
+from benchmarks.stub_usda import StubConfig, StubUSDAServer
+
+# (name, path kind, caches enabled, stub overrides)
+SCENARIOS = [
+    ("api.search.cold", "search", False, {}),
+    ("api.food.cold", "food", False, {}),
+    ("api.food.warm", "food", True, {}),
+    ("api.food.cold.faults", "food", False, {"rate_429": 0.1, "rate_5xx": 0.05}),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies_ms: List[float], statuses: List[int], wall_seconds: float) -> Dict[str, float]:
+    errors = sum(1 for s in statuses if s >= 400 or s == 0)
+    return {
+        "requests": len(latencies_ms),
+        "rps": len(latencies_ms) / wall_seconds if wall_seconds else 0.0,
+        "p50Ms": percentile(latencies_ms, 50),
+        "p95Ms": percentile(latencies_ms, 95),
+        "p99Ms": percentile(latencies_ms, 99),
+        "maxMs": max(latencies_ms) if latencies_ms else 0.0,
+        "meanMs": statistics.fmean(latencies_ms) if latencies_ms else 0.0,
+        "errorRate": errors / len(statuses) if statuses else 0.0,
+    }
+
+
+def load(base_url: str, paths: List[str], concurrency: int) -> Dict[str, float]:
+    local = threading.local()
+    latencies: List[float] = []
+    statuses: List[int] = []
+    lock = threading.Lock()
+
+    def hit(path: str) -> None:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        t0 = time.perf_counter()
+        try:
+            status = session.get(base_url + path, timeout=30).status_code
+        except requests.RequestException:
+            status = 0
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            latencies.append(elapsed)
+            statuses.append(status)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(hit, paths))
+    return summarize(latencies, statuses, time.perf_counter() - t0)
+
+
+class _AppServer:
+    def __init__(self, flask_app):
+        self.server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self) -> "_AppServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+
+
+def run(
+    corpus: Optional[Dict] = None,
+    *,
+    requests_per_scenario: int = 400,
+    concurrency: int = 16,
+    latency_ms: float = 20.0,
+    quick: bool = False,
+) -> Dict[str, Dict[str, float]]:
+    import app as flask_app_module
+    from utils import usda_api
+    from utils.cache import TieredCache
+    from utils.payload_store import PayloadStore
+    from utils.upstream_guard import UpstreamGuard
+
+    corpus = corpus or load_corpus()
+    if quick:
+        requests_per_scenario = min(requests_per_scenario, 100)
+    food_ids = sorted(corpus["foods"])
+    results = {}
+    saved = (usda_api.BASE_URL, usda_api.CACHE_TTLS, usda_api.local_index, usda_api.response_cache,
+             usda_api.upstream_guard, flask_app_module.payload_store)
+    try:
+        usda_api.local_index = None
+        with StubUSDAServer(corpus, StubConfig(latency_ms=latency_ms, jitter_ms=latency_ms / 4)) as stub, \
+                _AppServer(flask_app_module.app) as server:
+            usda_api.BASE_URL = stub.base_url
+            for name, kind, cached, overrides in SCENARIOS:
+                stub.config.rate_429 = overrides.get("rate_429", 0.0)
+                stub.config.rate_5xx = overrides.get("rate_5xx", 0.0)
+                usda_api.response_cache = TieredCache()
+                # Measure the app, not the production request budget (bench_throttle covers that).
+                usda_api.upstream_guard = UpstreamGuard(0, 0)
+                if cached:
+                    usda_api.CACHE_TTLS = saved[1]
+                    flask_app_module.payload_store = PayloadStore()
+                else:
+                    usda_api.CACHE_TTLS = {endpoint: (0, 0, 0) for endpoint in saved[1]}
+                    # A zero budget makes the store build every payload and keep none.
+                    flask_app_module.payload_store = PayloadStore(max_bytes=0)
+                if kind == "search":
+                    paths = [f"/api/search?q={WORDS[i % len(WORDS)]}&page=1" for i in range(requests_per_scenario)]
+                else:
+                    paths = [
+                        f"/api/food/{food_ids[i % len(food_ids)]}?reverseHierarchy={'true' if i % 2 else 'false'}"
+                        for i in range(requests_per_scenario)
+                    ]
+                if cached:
+                    load(server.base_url, paths[: 2 * len(food_ids)], concurrency)
+                before = dict(stub.config.counts)
+                results[name] = load(server.base_url, paths, concurrency)
+                results[name]["upstreamRequests"] = stub.config.counts["requests"] - before["requests"]
+                results[name]["upstream429"] = stub.config.counts["429"] - before["429"]
+                results[name]["upstream5xx"] = stub.config.counts["5xx"] - before["5xx"]
+    finally:
+        (usda_api.BASE_URL, usda_api.CACHE_TTLS, usda_api.local_index, usda_api.response_cache,
+         usda_api.upstream_guard, flask_app_module.payload_store) = saved
+    return results
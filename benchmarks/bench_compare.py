@@ -0,0 +1,44 @@
+"""
+/api/compare building blocks: compare_foods over a handful of corpus foods, and
+NeighborIndex lookups at the index sizes of a full local food index.
+
+The index is filled with jittered copies of the corpus vectors, since the
+corpus itself has only a few dozen foods; lookup cost depends on the number of
+rows, not on their contents.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+from benchmarks.bench_transform import time_per_call
+from benchmarks.corpus import load_corpus
+from utils.compare import NeighborIndex, compare_foods, vector_matrix
+
+INDEX_SIZES = (10_000, 100_000, 300_000)
+
+
+def _filled_index(base: np.ndarray, size: int) -> NeighborIndex:
+    rng = np.random.default_rng(7)
+    rows = base[rng.integers(0, len(base), size)] * rng.uniform(0.8, 1.2, (size, base.shape[1]))
+    index = NeighborIndex(max_entries=size)
+    index._append(list(range(1, size + 1)), [("", "")] * size, rows)
+    return index
+
+
+def run(corpus: Optional[Dict] = None, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    corpus = corpus or load_corpus()
+    foods = list(corpus["foods"].values())
+    min_seconds = 0.05 if quick else 0.2
+    results = {}
+    for count in (2, 5):
+        selected = foods[:count]
+        results[f"compare.foods{count}"] = time_per_call(lambda: compare_foods(selected), min_seconds=min_seconds)
+
+    base = vector_matrix(foods)
+    queries = vector_matrix(foods[:5])
+    for size in INDEX_SIZES[:2] if quick else INDEX_SIZES:
+        index = _filled_index(base, size)
+        results[f"neighbors.{size}.one"] = time_per_call(lambda: index.nearest(queries[:1], limit=5), min_seconds=min_seconds)
+        results[f"neighbors.{size}.five"] = time_per_call(lambda: index.nearest(queries, limit=5), min_seconds=min_seconds)
+        results[f"neighbors.{size}.one"]["entries"] = len(index)
+    return results
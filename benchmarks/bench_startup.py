@@ -0,0 +1,135 @@
+"""
+Worker startup cost: import time, time to a warm worker and per-worker memory.
+
+Every scenario runs in fresh interpreters against a synthetic local food index
+(corpus records under new fdcIds), so the typeahead and neighbor indexes have
+real work to load (NEIGHBOR_PRELOAD=1, so warm_start loads both):
+
+  import    `import app` in a new interpreter
+  cold      import plus app.warm_start(): what every worker pays without preload
+  preload   a master that imported and warmed the app forks WORKERS children, as
+            gunicorn.conf.py does; each serves one /api/suggest request
+
+privateMb is the worker's unshared memory (Private_Clean + Private_Dirty from
+/proc/<pid>/smaps_rollup): for a forked worker, the pages it has copied or
+allocated itself. readyMs for a forked worker runs from fork to its first response.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import load_corpus
+from utils.food_index import ingest
+
+WORKERS = 4
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_MEMORY = """
+def memory():
+    fields = {}
+    try:
+        with open('/proc/self/smaps_rollup') as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024.0
+    except OSError:
+        import resource
+        fields['Rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return {
+        'rssMb': fields.get('Rss', 0.0),
+        'pssMb': fields.get('Pss', 0.0),
+        'privateMb': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0),
+    }
+"""
+
+_IMPORT = _MEMORY + """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+result = {'importMs': (time.perf_counter() - t0) * 1000.0}
+if sys.argv[1] == 'cold':
+    app.warm_start()
+    app.app.test_client().get('/api/suggest?q=be')
+    result['readyMs'] = (time.perf_counter() - t0) * 1000.0
+result.update(memory())
+print(json.dumps(result))
+"""
+
+_PRELOAD = _MEMORY + """
+import gc, json, os, sys, time
+import app
+import flask.testing  # the test client's own imports are not worker startup
+app.warm_start()
+gc.freeze()
+master = memory()
+children = []
+for _ in range(int(sys.argv[1])):
+    read_fd, write_fd = os.pipe()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        app.app.test_client().get('/api/suggest?q=be')
+        result = {'readyMs': (time.perf_counter() - started) * 1000.0}
+        result.update(memory())
+        os.write(write_fd, json.dumps(result).encode())
+        os._exit(0)
+    os.close(write_fd)
+    children.append((pid, read_fd))
+workers = []
+for pid, read_fd in children:
+    with os.fdopen(read_fd) as fh:
+        workers.append(json.loads(fh.read()))
+    os.waitpid(pid, 0)
+print(json.dumps({'master': master, 'workers': workers}))
+"""
+
+
+def _write_index(directory: str, corpus: Dict, count: int) -> str:
+    # Clone corpus records under new ids; descriptions get a serial so they differ.
+    foods = list(corpus["foods"].values())
+    bulk = os.path.join(directory, "bulk.json")
+    with open(bulk, "w", encoding="utf-8") as fh:
+        fh.write('{"SRLegacyFoods": [')
+        for i in range(count):
+            food = dict(foods[i % len(foods)])
+            food["fdcId"] = 2_000_000 + i
+            food["description"] = f"{food['description']} {i}"
+            fh.write(("," if i else "") + json.dumps(food))
+        fh.write("]}")
+    path = os.path.join(directory, "foods.sqlite3")
+    ingest([bulk], path)
+    return path
+
+
+def _python(script: str, args: List[str], env: Dict[str, str]) -> Dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", script] + args, cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _median(samples: List[Dict]) -> Dict[str, float]:
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def run(corpus: Optional[Dict] = None, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    corpus = corpus or load_corpus()
+    foods = 5_000 if quick else 50_000
+    repeats = 3 if quick else 5
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, FOOD_INDEX_PATH=_write_index(tmp, corpus, foods), LOG_LEVEL="ERROR", NEIGHBOR_PRELOAD="1")
+        results["startup.import"] = _median([_python(_IMPORT, ["import"], env) for _ in range(repeats)])
+        results["startup.cold"] = _median([_python(_IMPORT, ["cold"], env) for _ in range(repeats)])
+        results["startup.cold"]["foods"] = foods
+        preload = _python(_PRELOAD, [str(WORKERS)], env)
+        results["startup.preload.master"] = preload["master"]
+        results["startup.preload.worker"] = _median(preload["workers"])
+        results["startup.preload.worker"]["workers"] = len(preload["workers"])
+    return results
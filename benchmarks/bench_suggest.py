@@ -0,0 +1,66 @@
+"""
+Latency of typeahead lookups against a large synthetic index.
+
+Descriptions are built from the corpus vocabulary plus generated words, so
+prefix ranges are wide and typos hit the trigram path. The result cache is
+bypassed so every lookup does the full search.
+"""
+import random
+import string
+import time
+from typing import Dict, List
+
+from benchmarks.bench_api import percentile
+from benchmarks.corpus import WORDS
+from utils.typeahead import TypeaheadIndex
+
+DATA_TYPES = ["Branded", "SR Legacy", "Survey (FNDDS)", "Foundation"]
+BRANDS = ["Kraft Heinz", "General Mills", "Acme Foods", "Tyson", ""]
+
+
+def _synthetic_foods(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    vocab = WORDS + ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))) for _ in range(5000)]
+    for i in range(count):
+        words = [rng.choice(WORDS) if rng.random() < 0.4 else rng.choice(vocab) for _ in range(rng.randint(2, 6))]
+        yield (1_000_000 + i, ", ".join(words).capitalize(), rng.choice(DATA_TYPES), rng.choice(BRANDS))
+
+
+def _queries(rng: random.Random) -> List[str]:
+    queries = []
+    for word in WORDS:
+        queries.extend(word[:n] for n in range(1, len(word) + 1))
+        # A dropped letter exercises the fuzzy path.
+        cut = rng.randint(1, len(word) - 2)
+        queries.append(word[:cut] + word[cut + 1:])
+    for _ in range(50):
+        first, second = rng.sample(WORDS, 2)
+        queries.append(f"{first} {second[:rng.randint(1, len(second))]}")
+    return queries
+
+
+def run(quick: bool = False) -> Dict[str, Dict[str, float]]:
+    size = 50_000 if quick else 200_000
+    index = TypeaheadIndex(loader=lambda: _synthetic_foods(size))
+    index.suggest("a")  # starts the background load
+    while len(index) < size:
+        time.sleep(0.05)
+    rng = random.Random(2)
+    queries = _queries(rng)
+    results = {}
+    for name, data_types in (("suggest.all", None), ("suggest.branded", ["Branded"])):
+        latencies = []
+        for _ in range(1000 if quick else 5000):
+            query = rng.choice(queries)
+            index.generation += 1  # skip the result cache
+            t0 = time.perf_counter()
+            index.suggest(query, limit=8, data_types=data_types)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+        results[name] = {
+            "foods": size,
+            "p50Ms": percentile(latencies, 50),
+            "p95Ms": percentile(latencies, 95),
+            "p99Ms": percentile(latencies, 99),
+            "maxMs": max(latencies),
+        }
+    return results
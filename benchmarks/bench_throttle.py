@@ -0,0 +1,143 @@
+"""
+USDA client behaviour while upstream throttles or is down.
+
+Throttle scenarios run several forked worker processes, each with threads
+calling the USDA client directly (no response cache), against a stub that
+accepts STUB_MAX_RPS requests per second and answers the rest with 429 and
+Retry-After. "unshared" gives every process its own upstream_guard, as if each
+gunicorn worker limited itself; "shared" points them all at one guard file.
+Every worker starts with twice the stub's rate, so the adaptive rate has to
+find the real limit.
+
+Outage scenarios switch the stub to answer 503 to everything. "warm" has every
+food in the response cache (already expired) and should be served from it;
+"cold" has nothing cached and should fail fast once the breaker opens.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.bench_api import summarize
+from benchmarks.corpus import load_corpus
+from benchmarks.stub_usda import StubConfig, StubUSDAServer
+
+STUB_MAX_RPS = 20.0
+PROCESSES = 4
+THREADS = 4
+
+
+def _call_loop(fetch, food_ids: List[str], threads: int, seconds: float) -> Tuple[List[float], List[int], float]:
+    latencies: List[float] = []
+    statuses: List[int] = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def loop(offset: int) -> None:
+        i = offset
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            result = fetch(food_ids[i % len(food_ids)])
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            status = result.get("status", 502) if "error" in result else 200
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+            i += threads
+
+    t0 = time.perf_counter()
+    workers = [threading.Thread(target=loop, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, statuses, time.perf_counter() - t0
+
+
+def _throttle_worker(base_url: str, guard_path: Optional[str], food_ids: List[str], seconds: float, queue) -> None:
+    from utils import usda_api
+    from utils.upstream_guard import UpstreamGuard
+
+    usda_api.BASE_URL = base_url
+    usda_api.upstream_guard = UpstreamGuard(2 * STUB_MAX_RPS, STUB_MAX_RPS, cooldown=1.0, path=guard_path)
+    queue.put(_call_loop(usda_api._get_food_data, food_ids, THREADS, seconds))
+
+
+def _run_throttle(stub: StubUSDAServer, food_ids: List[str], shared: bool, seconds: float) -> Dict[str, float]:
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    with tempfile.TemporaryDirectory() as tmp:
+        guard_path = os.path.join(tmp, "guard") if shared else None
+        procs = [
+            ctx.Process(target=_throttle_worker, args=(stub.base_url, guard_path, food_ids, seconds, queue))
+            for _ in range(PROCESSES)
+        ]
+        for proc in procs:
+            proc.start()
+        latencies: List[float] = []
+        statuses: List[int] = []
+        wall = 0.0
+        for _ in procs:
+            lat, st, elapsed = queue.get()
+            latencies.extend(lat)
+            statuses.extend(st)
+            wall = max(wall, elapsed)
+        for proc in procs:
+            proc.join()
+    return _summarize(latencies, statuses, wall)
+
+
+def _summarize(latencies: List[float], statuses: List[int], wall: float) -> Dict[str, float]:
+    # Failing fast is cheap, so rps alone rewards it; servedRps counts only foods returned.
+    result = summarize(latencies, statuses, wall)
+    result["servedRps"] = sum(1 for s in statuses if s == 200) / wall if wall else 0.0
+    return result
+
+
+def run(corpus: Optional[Dict] = None, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    from utils import usda_api
+    from utils.cache import TieredCache
+    from utils.upstream_guard import UpstreamGuard
+
+    corpus = corpus or load_corpus()
+    food_ids = sorted(corpus["foods"])
+    seconds = 2.0 if quick else 6.0
+    results = {}
+    saved = (usda_api.BASE_URL, usda_api.CACHE_TTLS, usda_api.local_index, usda_api.response_cache, usda_api.upstream_guard)
+    try:
+        usda_api.local_index = None
+        config = StubConfig(latency_ms=10.0, jitter_ms=2.0, retry_after=1.0, max_rps=STUB_MAX_RPS)
+        with StubUSDAServer(corpus, config) as stub:
+            usda_api.BASE_URL = stub.base_url
+            for shared in (False, True):
+                name = f"throttle.{'shared' if shared else 'unshared'}"
+                # Let the stub's bucket refill between scenarios.
+                time.sleep(1.0)
+                before = dict(stub.config.counts)
+                results[name] = _run_throttle(stub, food_ids, shared, seconds)
+                results[name]["upstreamRequests"] = stub.config.counts["requests"] - before["requests"]
+                results[name]["upstream429"] = stub.config.counts["429"] - before["429"]
+
+            stub.config.max_rps = None
+            for warm in (True, False):
+                name = f"outage.{'warm' if warm else 'cold'}"
+                usda_api.upstream_guard = UpstreamGuard(0, 0, cooldown=1.0)
+                usda_api.response_cache = TieredCache()
+                # Zero TTLs: every lookup goes upstream, and entries stay held once expired.
+                usda_api.CACHE_TTLS = {endpoint: (0, 0, 0) for endpoint in saved[1]}
+                stub.config.down = False
+                if warm:
+                    for food_id in food_ids:
+                        usda_api.get_food_data(food_id)
+                stub.config.down = True
+                before = dict(stub.config.counts)
+                latencies, statuses, wall = _call_loop(usda_api.get_food_data, food_ids, THREADS, seconds)
+                results[name] = _summarize(latencies, statuses, wall)
+                results[name]["upstreamRequests"] = stub.config.counts["requests"] - before["requests"]
+            stub.config.down = False
+    finally:
+        (usda_api.BASE_URL, usda_api.CACHE_TTLS, usda_api.local_index, usda_api.response_cache,
+         usda_api.upstream_guard) = saved
+    return results
@@ -0,0 +1,70 @@
+"""
+Microbenchmarks for transform_to_sankey, the batch engine and the chart bundle.
+"""
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.corpus import load_corpus, small_and_large_foods
+from utils import chart_bundle
+from utils.data_transformer import transform_to_sankey
+
+
+def time_per_call(fn: Callable[[], object], *, min_seconds: float = 0.2, repeats: int = 5) -> Dict[str, float]:
+    """
+    Median and best time per call in microseconds, over `repeats` rounds of at least min_seconds.
+    """
+    # Calibrate the loop count so each round runs for about min_seconds.
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_seconds / 4 or loops >= 1 << 20:
+            break
+        loops *= 2
+    loops = max(1, int(loops * (min_seconds / max(elapsed, 1e-9))))
+    rounds: List[float] = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        rounds.append((time.perf_counter() - t0) / loops * 1e6)
+    return {"medianUs": statistics.median(rounds), "bestUs": min(rounds), "loops": loops}
+
+
+def run(corpus: Dict = None, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    corpus = corpus or load_corpus()
+    foods = small_and_large_foods(corpus)
+    min_seconds = 0.05 if quick else 0.2
+    results = {}
+    for size, food in foods.items():
+        for reverse in (False, True):
+            name = f"transform.{size}.{'reverse' if reverse else 'forward'}"
+            results[name] = time_per_call(lambda: transform_to_sankey(food, reverse_hierarchy=reverse), min_seconds=min_seconds)
+            results[name]["nutrients"] = len(food.get("foodNutrients", []))
+    for size, food in foods.items():
+        results[f"bundle.{size}.cold"] = time_per_call(
+            lambda: chart_bundle.build_chart_bundle(food), min_seconds=min_seconds,
+        )
+        results[f"bundle.{size}.portion"] = time_per_call(
+            lambda: chart_bundle.build_chart_bundle(food, portion=28.35), min_seconds=min_seconds,
+        )
+
+        # cold solves every Voronoi layout.
+        def voronoi_cold(food=food):
+            chart_bundle._solve_voronoi.cache_clear()
+            return chart_bundle.build_voronoi_bundle(food)
+        results[f"voronoi.{size}.cold"] = time_per_call(voronoi_cold, min_seconds=min_seconds, repeats=3)
+    try:
+        from utils.batch_transformer import transform_to_sankey_batch
+    except ImportError:  # NumPy is optional outside report jobs
+        return results
+    batch = list(corpus["foods"].values()) * (20 if quick else 100)
+    for reverse in (False, True):
+        name = f"transform_batch.{'reverse' if reverse else 'forward'}"
+        stats = time_per_call(lambda: transform_to_sankey_batch(batch, reverse_hierarchy=reverse), min_seconds=min_seconds, repeats=3)
+        # Report per food so it compares directly with the single-food numbers.
+        results[name] = {k: v / len(batch) if k.endswith("Us") else v for k, v in stats.items()}
+    return results
@@ -0,0 +1,106 @@
+"""
+Payload size and decode cost of the compact wire formats against plain JSON.
+
+For the smallest and largest corpus foods this reports the identity and gzip
+size of the Sankey payload (JSON vs columnar) and of /raw (full record vs
+nutrient vector), and the Python encode time of each. When node is on PATH it
+also times the browser-side decode: JSON.parse against decodeSankeyColumnar
+from docs/js/wire.js.
+"""
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Dict, Optional
+
+from benchmarks.bench_transform import time_per_call
+from benchmarks.corpus import load_corpus, small_and_large_foods
+from utils.data_transformer import transform_to_sankey
+from utils.wire_format import encode_sankey_columnar, nutrient_vector
+
+WIRE_JS = os.path.join(os.path.dirname(__file__), "..", "docs", "js", "wire.js")
+
+# Loads wire.js into a fresh context and prints microseconds per decode.
+_NODE_SCRIPT = """
+const fs = require('fs');
+const vm = require('vm');
+const [wirePath, jsonPath, binPath, seconds] = process.argv.slice(1);
+const ctx = { TextDecoder, Uint8Array, Uint16Array, Float32Array, DataView, String, Error };
+vm.createContext(ctx);
+vm.runInContext(fs.readFileSync(wirePath, 'utf8'), ctx);
+const text = fs.readFileSync(jsonPath, 'utf8');
+const bin = fs.readFileSync(binPath);
+const buffer = bin.buffer.slice(bin.byteOffset, bin.byteOffset + bin.byteLength);
+function time(fn) {
+    let loops = 0;
+    const t0 = process.hrtime.bigint();
+    const deadline = t0 + BigInt(Math.round(Number(seconds) * 1e9));
+    let now = t0;
+    while (now < deadline) {
+        for (let i = 0; i < 100; i++) fn();
+        loops += 100;
+        now = process.hrtime.bigint();
+    }
+    return Number(now - t0) / 1e3 / loops;
+}
+const decode = ctx.decodeSankeyColumnar;
+console.log(JSON.stringify({ json: time(() => JSON.parse(text)), columnar: time(() => decode(buffer)) }));
+"""
+
+
+def _sizes(raw: bytes) -> Dict[str, int]:
+    return {"bytes": len(raw), "gzipBytes": len(gzip.compress(raw, 6))}
+
+
+def _node_decode_us(json_raw: bytes, columnar_raw: bytes, seconds: float) -> Optional[Dict[str, float]]:
+    node = shutil.which("node")
+    if node is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "sankey.json")
+        bin_path = os.path.join(tmp, "sankey.bin")
+        with open(json_path, "wb") as fh:
+            fh.write(json_raw)
+        with open(bin_path, "wb") as fh:
+            fh.write(columnar_raw)
+        proc = subprocess.run(
+            [node, "-e", _NODE_SCRIPT, os.path.abspath(WIRE_JS), json_path, bin_path, str(seconds)],
+            capture_output=True, text=True, check=True,
+        )
+    return json.loads(proc.stdout)
+
+
+def run(corpus: Optional[Dict] = None, quick: bool = False) -> Dict[str, Dict[str, float]]:
+    corpus = corpus or load_corpus()
+    min_seconds = 0.05 if quick else 0.2
+    results = {}
+    for size, food in small_and_large_foods(corpus).items():
+        sankey = transform_to_sankey(food)
+        sankey_json = json.dumps(sankey, separators=(",", ":")).encode("utf-8")
+        columnar = encode_sankey_columnar(sankey)
+        results[f"wire.{size}.sankey.json"] = {
+            **_sizes(sankey_json),
+            **time_per_call(lambda: json.dumps(sankey, separators=(",", ":")), min_seconds=min_seconds),
+        }
+        results[f"wire.{size}.sankey.columnar"] = {
+            **_sizes(columnar),
+            **time_per_call(lambda: encode_sankey_columnar(sankey), min_seconds=min_seconds),
+        }
+
+        record = json.dumps(food, separators=(",", ":")).encode("utf-8")
+        results[f"wire.{size}.raw.full"] = {
+            **_sizes(record),
+            **time_per_call(lambda: json.dumps(food, separators=(",", ":")), min_seconds=min_seconds),
+        }
+        results[f"wire.{size}.raw.vector"] = {
+            **_sizes(json.dumps(nutrient_vector(food), separators=(",", ":")).encode("utf-8")),
+            **time_per_call(lambda: json.dumps(nutrient_vector(food), separators=(",", ":")), min_seconds=min_seconds),
+        }
+
+        decode = _node_decode_us(sankey_json, columnar, min_seconds * 5)
+        if decode is not None:
+            results[f"wire.{size}.sankey.json"]["browserDecodeUs"] = decode["json"]
+            results[f"wire.{size}.sankey.columnar"]["browserDecodeUs"] = decode["columnar"]
+    return results
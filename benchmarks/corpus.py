@@ -0,0 +1,193 @@
+"""
+Fixture corpus of USDA FoodData Central responses for the benchmarks.
+
+The corpus is a JSON file {"foods": {fdcId: format=full record}}. When no
+recorded corpus exists at DEFAULT_CORPUS, a deterministic one is generated in
+the same shape as the live API; `record` captures real responses when the API
+is reachable.
+
+Usage:
+    python -m benchmarks.corpus generate --out benchmarks/fixtures/usda_corpus.json
+    python -m benchmarks.corpus record 171688 2346404 ... --out benchmarks/fixtures/usda_corpus.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Dict, List, Optional
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "usda_corpus.json")
+
+# (id, number, name, unitName) for nutrients that appear in format=full records,
+# macronutrients and the fields the Sankey uses first.
+NUTRIENTS = [
+    (1051, "255", "Water", "g"),
+    (1008, "208", "Energy", "kcal"),
+    (1003, "203", "Protein", "g"),
+    (1004, "204", "Total lipid (fat)", "g"),
+    (1007, "207", "Ash", "g"),
+    (1005, "205", "Carbohydrate, by difference", "g"),
+    (1079, "291", "Fiber, total dietary", "g"),
+    (2000, "269", "Sugars, total including NLEA", "g"),
+    (1009, "209", "Starch", "g"),
+    (1258, "606", "Fatty acids, total saturated", "g"),
+    (1292, "645", "Fatty acids, total monounsaturated", "g"),
+    (1293, "646", "Fatty acids, total polyunsaturated", "g"),
+    (1257, "605", "Fatty acids, total trans", "g"),
+    (1253, "601", "Cholesterol", "mg"),
+    (1087, "301", "Calcium, Ca", "mg"),
+    (1089, "303", "Iron, Fe", "mg"),
+    (1090, "304", "Magnesium, Mg", "mg"),
+    (1091, "305", "Phosphorus, P", "mg"),
+    (1092, "306", "Potassium, K", "mg"),
+    (1093, "307", "Sodium, Na", "mg"),
+    (1095, "309", "Zinc, Zn", "mg"),
+    (1098, "312", "Copper, Cu", "mg"),
+    (1101, "315", "Manganese, Mn", "mg"),
+    (1103, "317", "Selenium, Se", "µg"),
+    (1162, "401", "Vitamin C, total ascorbic acid", "mg"),
+    (1165, "404", "Thiamin", "mg"),
+    (1166, "405", "Riboflavin", "mg"),
+    (1167, "406", "Niacin", "mg"),
+    (1170, "410", "Pantothenic acid", "mg"),
+    (1175, "415", "Vitamin B-6", "mg"),
+    (1177, "417", "Folate, total", "µg"),
+    (1180, "421", "Choline, total", "mg"),
+    (1178, "418", "Vitamin B-12", "µg"),
+    (1106, "320", "Vitamin A, RAE", "µg"),
+    (1109, "323", "Vitamin E (alpha-tocopherol)", "mg"),
+    (1114, "328", "Vitamin D (D2 + D3)", "µg"),
+    (1185, "430", "Vitamin K (phylloquinone)", "µg"),
+    (1011, "211", "Glucose", "g"),
+    (1012, "212", "Fructose", "g"),
+    (1010, "210", "Sucrose", "g"),
+    (1014, "214", "Maltose", "g"),
+    (1013, "213", "Lactose", "g"),
+    (1075, "287", "Galactose", "g"),
+]
+# Amino acids and individual fatty acids make up the long tail of SR Legacy records.
+LONG_TAIL = [(1210 + 100 + i, f"5{i:02d}", f"Amino acid or fatty acid {i}", "g") for i in range(90)]
+DATA_TYPES = ["SR Legacy", "Foundation", "Survey (FNDDS)", "Branded"]
+WORDS = ["apple", "cheddar", "cereal", "beef", "chicken", "oat", "yogurt", "almond", "rice", "bean",
+         "salmon", "spinach", "bread", "milk", "egg", "potato", "tomato", "pasta", "lentil", "banana"]
+
+
+def _food_nutrient(rng: random.Random, nutrient, amount: float) -> Dict:
+    nid, number, name, unit = nutrient
+    return {
+        "type": "FoodNutrient",
+        "id": rng.randint(10 ** 6, 10 ** 7),
+        "nutrient": {"id": nid, "number": number, "name": name, "rank": nid, "unitName": unit},
+        "dataPoints": rng.randint(1, 30),
+        "foodNutrientDerivation": {"code": "A", "description": "Analytical"},
+        "amount": amount,
+    }
+
+
+def generate_food(rng: random.Random, fdc_id: int, large: bool) -> Dict:
+    water = round(rng.uniform(0, 90), 2)
+    remaining = 100 - water
+    protein = round(rng.uniform(0, remaining * 0.4), 2)
+    fat = round(rng.uniform(0, (remaining - protein) * 0.6), 2)
+    carbs = round(rng.uniform(0, remaining - protein - fat), 2)
+    ash = round(max(0.0, 100 - water - protein - fat - carbs) * rng.uniform(0, 1), 2)
+    amounts = {
+        "Water": water, "Protein": protein, "Total lipid (fat)": fat,
+        "Carbohydrate, by difference": carbs, "Ash": ash,
+        "Fatty acids, total saturated": round(fat * rng.uniform(0.1, 0.5), 3),
+        "Fatty acids, total monounsaturated": round(fat * rng.uniform(0.1, 0.4), 3),
+        "Fatty acids, total polyunsaturated": round(fat * rng.uniform(0.05, 0.2), 3),
+        "Fatty acids, total trans": round(fat * rng.uniform(0, 0.03), 3),
+        "Sugars, total including NLEA": round(carbs * rng.uniform(0, 0.6), 2),
+        "Fiber, total dietary": round(carbs * rng.uniform(0, 0.2), 2),
+    }
+    nutrients = NUTRIENTS + (LONG_TAIL if large else [])
+    if not large:
+        nutrients = nutrients[:14]
+    food_nutrients = [
+        _food_nutrient(rng, n, amounts.get(n[2], round(rng.uniform(0, 50), 3)))
+        for n in nutrients
+    ]
+    rng.shuffle(food_nutrients)
+    data_type = rng.choice(DATA_TYPES)
+    words = rng.sample(WORDS, 3)
+    food = {
+        "fdcId": fdc_id,
+        "description": f"{words[0].title()}, {words[1]}, {words[2]}",
+        "dataType": data_type,
+        "publicationDate": "4/1/2019",
+        "foodClass": "FinalFood",
+        "foodNutrients": food_nutrients,
+        "foodPortions": [
+            {
+                "id": fdc_id * 10 + i,
+                "amount": 1.0,
+                "modifier": modifier,
+                "gramWeight": weight,
+                "measureUnit": {"id": 9999, "name": "undetermined", "abbreviation": "undetermined"},
+            }
+            for i, (modifier, weight) in enumerate([("cup", round(rng.uniform(30, 250), 1)), ("serving", round(rng.uniform(20, 150), 1))])
+        ],
+    }
+    if data_type == "Branded":
+        food["brandOwner"] = rng.choice(["Acme Foods", "General Mills", "Kellogg Company", "Kraft Heinz"])
+        food["modifiedDate"] = "8/18/2022"
+    return food
+
+
+def generate_corpus(count: int = 60, seed: int = 1) -> Dict:
+    rng = random.Random(seed)
+    foods = {}
+    for i in range(count):
+        fdc_id = 170000 + i
+        foods[str(fdc_id)] = generate_food(rng, fdc_id, large=i % 2 == 0)
+    return {"foods": foods}
+
+
+def load_corpus(path: Optional[str] = None) -> Dict:
+    if path is None and not os.path.exists(DEFAULT_CORPUS):
+        return generate_corpus()
+    with open(path or DEFAULT_CORPUS, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def small_and_large_foods(corpus: Dict) -> Dict[str, Dict]:
+    """Pick the foods with the shortest and longest foodNutrients lists."""
+    foods = sorted(corpus["foods"].values(), key=lambda f: len(f.get("foodNutrients", [])))
+    return {"small": foods[0], "large": foods[-1]}
+
+
+def record(ids: List[str]) -> Dict:
+    from utils.usda_api import _get_food_data
+
+    foods = {}
+    for fdc_id in ids:
+        food = _get_food_data(fdc_id)
+        if "error" in food:
+            print(f"skipping {fdc_id}: {food['error']}", file=sys.stderr)
+            continue
+        foods[str(fdc_id)] = food
+    return {"foods": foods}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the benchmark fixture corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate")
+    gen.add_argument("--count", type=int, default=60)
+    gen.add_argument("--out", default=DEFAULT_CORPUS)
+    rec = sub.add_parser("record")
+    rec.add_argument("ids", nargs="+")
+    rec.add_argument("--out", default=DEFAULT_CORPUS)
+    args = parser.parse_args(argv)
+    corpus = generate_corpus(args.count) if args.command == "generate" else record(args.ids)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(corpus, fh, separators=(",", ":"))
+    print(f"wrote {len(corpus['foods'])} foods to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
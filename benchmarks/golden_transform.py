@@ -0,0 +1,215 @@
+"""
+Golden-file check that the Flask transform, the NumPy batch engine and the
+Cloudflare worker produce identical Sankey payloads.
+
+The golden file holds trimmed food records (hand-written edge cases plus
+generated corpus foods) and the expected payload for every option
+combination. `check` runs all three engines against it; the worker runs under
+Node, so Node must be on PATH (pass --skip-worker to check Python only).
+
+Usage:
+    python -m benchmarks.golden_transform check
+    python -m benchmarks.golden_transform update   # after an intended spec change
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import generate_food
+from utils.data_transformer import transform_to_sankey
+from utils.nutrient_spec import SPEC_VERSION
+
+ROOT = Path(__file__).resolve().parent.parent
+GOLDEN_PATH = ROOT / "benchmarks" / "fixtures" / "sankey_golden.json"
+WORKER_PATH = ROOT / "cloudflare-worker" / "worker.js"
+
+# (reverse_hierarchy, show_sodium, show_fat_breakdown)
+OPTION_SETS = list(itertools.product((False, True), repeat=3))
+
+# Reads {"foods": [...], "options": [[r, s, b], ...]} on stdin and prints one
+# payload list per food, in option order.
+_NODE_RUNNER = """
+import { transformToSankey } from %s;
+let input = '';
+process.stdin.on('data', chunk => { input += chunk; });
+process.stdin.on('end', () => {
+  const { foods, options } = JSON.parse(input);
+  const out = foods.map(food => options.map(([r, s, b]) => transformToSankey(food, r, s, b)));
+  process.stdout.write(JSON.stringify(out));
+});
+"""
+
+
+def _nutrient(nutrient_id: Optional[int], name: str, amount) -> Dict:
+    nutrient = {"name": name}
+    if nutrient_id is not None:
+        nutrient["id"] = nutrient_id
+    return {"nutrient": nutrient, "amount": amount}
+
+
+def edge_cases() -> List[Dict]:
+    """
+    Records covering each fallback and matching rule in nutrient_spec.
+    """
+    n = _nutrient
+    return [
+        {"fdcId": 1, "description": "Empty record", "foodNutrients": []},
+        {"fdcId": 2, "description": "Names only, no ids", "foodNutrients": [
+            n(None, "Water", 70.1), n(None, "PROTEIN", 12.5), n(None, "Total lipid (fat)", 9.0),
+            n(None, "Carbohydrate, by difference", 6.2), n(None, "Fatty acids, total saturated", 3.1),
+            n(None, "Trans fat", 0.2), n(None, "Sugars, total", 2.2), n(None, "Dietary Fiber", 1.1),
+            n(None, "Sodium, Na", 420),
+        ]},
+        {"fdcId": 3, "description": "Individual sugars, no total", "foodNutrients": [
+            n(1051, "Water", 80), n(1005, "Carbohydrate, by difference", 18.4),
+            n(2000, "Total Sugars", 0), n(1011, "Glucose", 4.1), n(1012, "Fructose", 5.3),
+            n(1010, "Sucrose", 2.25), n(1075, "Galactose", 0.1), n(1079, "Fiber, total dietary", 2.4),
+        ]},
+        {"fdcId": 4, "description": "Reported starch and ash", "foodNutrients": [
+            n(1051, "Water", 12.0), n(1003, "Protein", 10.7), n(1004, "Total lipid (fat)", 2.0),
+            n(1005, "Carbohydrate, by difference", 73.9), n(1007, "Ash", 1.4), n(1009, "Starch", 60.2),
+            n(1063, "Sugars, Total NLEA", 0.4), n(1079, "Fiber, total dietary", 12.2), n(1093, "Sodium, Na", 5),
+        ]},
+        {"fdcId": 5, "description": "Macros over 100g, sodium over ash", "foodNutrients": [
+            n(1051, "Water", 40), n(1003, "Protein", 30), n(1004, "Total lipid (fat)", 25),
+            n(1005, "Carbohydrate, by difference", 10), n(1093, "Sodium, Na", 2300),
+        ]},
+        {"fdcId": 6, "description": "Subtypes exceed total fat", "foodNutrients": [
+            n(1004, "Total lipid (fat)", 5.0), n(1258, "Fatty acids, total saturated", 2.5),
+            n(1292, "Fatty acids, total monounsaturated", 2.0), n(1293, "Fatty acids, total polyunsaturated", 1.0),
+            n(1007, "Ash", 0.9), n(1093, "Sodium, Na", 300),
+        ]},
+        {"fdcId": 7, "description": "Zero and missing amounts fall through to aliases", "foodNutrients": [
+            n(1004, "Total lipid (fat)", 3.3), n(1257, "Fatty acids, total trans", 0),
+            n(None, "Trans fatty acids", 0.15), n(None, "Trans fat", None),
+            n(2000, "Total Sugars", None), n(1063, "Sugars, Total NLEA", 1.7),
+            n(1079, "Fiber, total dietary", 0), n(None, "Dietary fiber, total", 0.6),
+            n(1005, "Carbohydrate, by difference", 4),
+        ]},
+        {"fdcId": 8, "description": "Duplicate entries keep the first", "foodNutrients": [
+            n(1003, "Protein", 8.25), n(1003, "Protein", 99), n(1051, "Water", 50),
+            n(None, "water", 1), n(1005, "Carbohydrate, by difference", 20), n(1009, "Starch", 0),
+            n(1009, "Starch", 7),
+        ]},
+    ]
+
+
+def _trim(food: Dict) -> Dict:
+    return {
+        "fdcId": food["fdcId"],
+        "description": food["description"],
+        "foodNutrients": [
+            {"nutrient": {"id": e["nutrient"]["id"], "name": e["nutrient"]["name"]}, "amount": e["amount"]}
+            for e in food["foodNutrients"]
+        ],
+    }
+
+
+def build_cases(generated: int = 12, seed: int = 12) -> List[Dict]:
+    rng = random.Random(seed)
+    foods = edge_cases()
+    foods.extend(_trim(generate_food(rng, 180000 + i, large=i % 6 == 0)) for i in range(generated))
+    return foods
+
+
+def _option_key(options) -> str:
+    return "".join(str(int(o)) for o in options)
+
+
+def python_payloads(foods: List[Dict]) -> List[Dict[str, Dict]]:
+    return [
+        {_option_key(o): transform_to_sankey(food, *o) for o in OPTION_SETS}
+        for food in foods
+    ]
+
+
+def batch_payloads(foods: List[Dict]) -> Optional[List[Dict[str, Dict]]]:
+    try:
+        from utils.batch_transformer import transform_to_sankey_batch
+    except ImportError:  # NumPy is optional outside report jobs
+        return None
+    out: List[Dict[str, Dict]] = [{} for _ in foods]
+    for o in OPTION_SETS:
+        for row, payload in zip(out, transform_to_sankey_batch(foods, *o)):
+            row[_option_key(o)] = payload
+    return out
+
+
+def worker_payloads(foods: List[Dict]) -> List[Dict[str, Dict]]:
+    node = shutil.which("node")
+    if node is None:
+        raise RuntimeError("node is not on PATH")
+    script = _NODE_RUNNER % json.dumps(WORKER_PATH.as_uri())
+    proc = subprocess.run(
+        [node, "--input-type=module", "-e", script],
+        input=json.dumps({"foods": foods, "options": OPTION_SETS}),
+        capture_output=True, text=True, check=True,
+    )
+    return [
+        {_option_key(o): payload for o, payload in zip(OPTION_SETS, per_food)}
+        for per_food in json.loads(proc.stdout)
+    ]
+
+
+def diff(engine: str, expected: List[Dict[str, Dict]], actual: List[Dict[str, Dict]], foods: List[Dict]) -> List[str]:
+    problems = []
+    for food, want, got in zip(foods, expected, actual):
+        for key, payload in want.items():
+            # JSON round trip so ints and floats compare by value (5 == 5.0).
+            if json.loads(json.dumps(got.get(key))) != payload:
+                problems.append(f"{engine}: fdcId={food['fdcId']} options={key} ({food['description']})")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["check", "update"])
+    parser.add_argument("--golden", default=str(GOLDEN_PATH))
+    parser.add_argument("--skip-worker", action="store_true", help="do not run the worker under Node")
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        foods = build_cases()
+        golden = {
+            "specVersion": SPEC_VERSION,
+            "foods": foods,
+            "expected": json.loads(json.dumps(python_payloads(foods))),
+        }
+        os.makedirs(os.path.dirname(args.golden), exist_ok=True)
+        with open(args.golden, "w", encoding="utf-8") as fh:
+            json.dump(golden, fh, separators=(",", ":"))
+            fh.write("\n")
+        print(f"wrote {len(foods)} foods x {len(OPTION_SETS)} option sets to {args.golden}")
+
+    with open(args.golden, encoding="utf-8") as fh:
+        golden = json.load(fh)
+    foods, expected = golden["foods"], golden["expected"]
+    if golden.get("specVersion") != SPEC_VERSION:
+        print(f"golden file is for spec version {golden.get('specVersion')}, current is {SPEC_VERSION}; run update", file=sys.stderr)
+        return 1
+
+    problems = diff("python", expected, python_payloads(foods), foods)
+    batch = batch_payloads(foods)
+    if batch is None:
+        print("numpy not installed; skipping the batch engine", file=sys.stderr)
+    else:
+        problems += diff("batch", expected, batch, foods)
+    if not args.skip_worker:
+        problems += diff("worker", expected, worker_payloads(foods), foods)
+
+    for line in problems:
+        print(line)
+    engines = "python, batch" + ("" if args.skip_worker else ", worker")
+    print(f"{len(foods)} foods x {len(OPTION_SETS)} option sets ({engines}): {len(problems)} mismatches")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
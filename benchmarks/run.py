@@ -0,0 +1,133 @@
+"""
+Run the benchmark suite and compare it with a stored baseline.
+
+Usage:
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --threshold 0.2
+    python -m benchmarks.run --only transform --quick
+    python -m benchmarks.run --only throttle
+    python -m benchmarks.run --only wire
+    python -m benchmarks.run --only compare
+    python -m benchmarks.run --only startup
+
+Exits with status 1 when --compare finds a metric that regressed by more than
+the threshold.
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks import bench_api, bench_compare, bench_startup, bench_suggest, bench_throttle, bench_transform, bench_wire
+from benchmarks.corpus import load_corpus
+from utils.log_config import configure_logging
+
+# Metrics compared against the baseline, and whether higher is better.
+COMPARED_METRICS = {
+    "medianUs": False,
+    "rps": True,
+    "p50Ms": False,
+    "p95Ms": False,
+    "p99Ms": False,
+    "errorRate": False,
+}
+# Absolute slack so near-zero metrics (error rates, sub-ms latencies) don't flap.
+ABSOLUTE_SLACK = {"errorRate": 0.02, "p50Ms": 1.0, "p95Ms": 2.0, "p99Ms": 5.0}
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """
+    Return (report lines, regression lines) comparing two result sets.
+    """
+    lines = [f"{'benchmark':<32} {'metric':<10} {'baseline':>12} {'current':>12} {'change':>8}"]
+    regressions = []
+    for name, metrics in sorted(current["results"].items()):
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            lines.append(f"{name:<32} (no baseline)")
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in metrics or metric not in base:
+                continue
+            old, new = base[metric], metrics[metric]
+            change = (new - old) / old if old else 0.0
+            worse = (old - new) if higher_is_better else (new - old)
+            regressed = worse > threshold * abs(old) + ABSOLUTE_SLACK.get(metric, 0.0)
+            marker = "  REGRESSION" if regressed else ""
+            line = f"{name:<32} {metric:<10} {old:>12.3f} {new:>12.3f} {change:>+7.1%}{marker}"
+            lines.append(line)
+            if regressed:
+                regressions.append(line)
+    return lines, regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the transform and API hot paths")
+    parser.add_argument("--only", choices=["transform", "api", "suggest", "throttle", "wire", "compare", "startup"], default=None)
+    parser.add_argument("--corpus", default=None, help="Fixture corpus JSON (default: generated)")
+    parser.add_argument("--quick", action="store_true", help="Shorter runs for a smoke check")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per API scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Stub upstream latency")
+    parser.add_argument("--output", default=None, help="Write results JSON here")
+    parser.add_argument("--save-baseline", default=None)
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args(argv)
+    # Per-request logging would dominate the measurements.
+    configure_logging("ERROR")
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    corpus = load_corpus(args.corpus)
+    results: Dict[str, Dict] = {}
+    if args.only in (None, "transform"):
+        results.update(bench_transform.run(corpus, quick=args.quick))
+    if args.only in (None, "suggest"):
+        results.update(bench_suggest.run(quick=args.quick))
+    if args.only in (None, "api"):
+        results.update(bench_api.run(
+            corpus,
+            requests_per_scenario=args.requests,
+            concurrency=args.concurrency,
+            latency_ms=args.latency_ms,
+            quick=args.quick,
+        ))
+    if args.only in (None, "throttle"):
+        results.update(bench_throttle.run(corpus, quick=args.quick))
+    if args.only in (None, "wire"):
+        results.update(bench_wire.run(corpus, quick=args.quick))
+    if args.only in (None, "compare"):
+        results.update(bench_compare.run(corpus, quick=args.quick))
+    if args.only in (None, "startup"):
+        results.update(bench_startup.run(corpus, quick=args.quick))
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    for name, metrics in sorted(results.items()):
+        summary = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+        print(f"{name}: {summary}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        lines, regressions = compare(report, baseline, args.threshold)
+        print()
+        print("\n".join(lines))
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+Local stand-in for the USDA FoodData Central API that replays a fixture corpus.
+
+Serves GET /food/<id>, POST /foods and GET /foods/search with configurable
+latency, injected 429/5xx responses, a request rate limit answered with 429
+and an outage switch, so the client's retry, backoff, rate limiter and circuit
+breaker paths can be exercised without touching the real API.
+
+Usage:
+    python -m benchmarks.stub_usda --port 8099 --latency-ms 80 --rate-429 0.05
+    python -m benchmarks.stub_usda --port 8099 --max-rps 10 --retry-after 1
+    USDA_BASE_URL=http://127.0.0.1:8099 python main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.corpus import load_corpus
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        rate_429: float = 0.0,
+        rate_5xx: float = 0.0,
+        retry_after: Optional[float] = None,
+        max_rps: Optional[float] = None,
+        seed: int = 1,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        # Requests per second accepted before answering 429, like the real API's key limit.
+        self.max_rps = max_rps
+        # While True every request gets a 503.
+        self.down = False
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {"requests": 0, "429": 0, "5xx": 0, "connections": 0}
+        self._tokens = max_rps or 0.0
+        self._refilled_at = time.monotonic()
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counts[name] += 1
+
+    def roll(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+    def over_limit(self) -> bool:
+        """Take a token from the max_rps bucket (capacity one second); True if none was left."""
+        if not self.max_rps:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_rps, self._tokens + (now - self._refilled_at) * self.max_rps)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return True
+            self._tokens -= 1
+            return False
+
+
+def make_handler(corpus: Dict, config: StubConfig):
+    foods = corpus["foods"]
+    ordered = sorted(foods.values(), key=lambda f: f["fdcId"])
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            # One handler per TCP connection, so this counts connections opened by clients.
+            super().setup()
+            config.count("connections")
+
+        def _send(self, status: int, body, headers: Optional[Dict[str, str]] = None) -> None:
+            raw = json.dumps(body, separators=(",", ":")).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _delay_and_fault(self) -> bool:
+            """Apply latency, then maybe answer with an injected error. Returns True if it did."""
+            config.count("requests")
+            delay = config.latency_ms + (config.rng.uniform(-config.jitter_ms, config.jitter_ms) if config.jitter_ms else 0)
+            if delay > 0:
+                time.sleep(delay / 1000.0)
+            if config.down:
+                config.count("5xx")
+                self._send(503, {"error": "Service Unavailable"})
+                return True
+            roll = config.roll()
+            if roll < config.rate_429 or config.over_limit():
+                config.count("429")
+                headers = {"Retry-After": f"{config.retry_after:g}"} if config.retry_after is not None else None
+                self._send(429, {"error": {"code": "OVER_RATE_LIMIT"}}, headers)
+                return True
+            if roll < config.rate_429 + config.rate_5xx:
+                config.count("5xx")
+                self._send(503, {"error": "Service Unavailable"})
+                return True
+            return False
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            if self._delay_and_fault():
+                return
+            if url.path.startswith("/food/"):
+                food = foods.get(url.path.rsplit("/", 1)[-1])
+                if food is None:
+                    self._send(404, {"error": "Not Found"})
+                else:
+                    self._send(200, food)
+            elif url.path == "/foods/search":
+                query = params.get("query", [""])[0].lower().split()
+                data_types = set(params.get("dataType", []))
+                page_size = int(params.get("pageSize", ["50"])[0])
+                page = int(params.get("pageNumber", ["1"])[0])
+                hits = [
+                    f for f in ordered
+                    if all(word in f["description"].lower() for word in query)
+                    and (not data_types or f.get("dataType") in data_types)
+                ]
+                start = (page - 1) * page_size
+                self._send(200, {
+                    "totalHits": len(hits),
+                    "currentPage": page,
+                    "foods": [
+                        {k: f.get(k) for k in ("fdcId", "description", "dataType", "brandOwner") if k in f}
+                        for f in hits[start:start + page_size]
+                    ],
+                })
+            else:
+                self._send(404, {"error": "Not Found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self._delay_and_fault():
+                return
+            if url.path == "/foods":
+                ids = [str(i) for i in body.get("fdcIds", [])]
+                self._send(200, [foods[i] for i in ids if i in foods])
+            else:
+                self._send(404, {"error": "Not Found"})
+
+    return Handler
+
+
+class StubUSDAServer:
+    """
+    Threaded stub server running in the background; use as a context manager.
+    """
+
+    def __init__(self, corpus: Optional[Dict] = None, config: Optional[StubConfig] = None, port: int = 0):
+        self.corpus = corpus or load_corpus()
+        self.config = config or StubConfig()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(self.corpus, self.config))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self) -> "StubUSDAServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve a USDA FoodData Central stand-in from a fixture corpus")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--corpus", default=None)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--max-rps", type=float, default=None)
+    args = parser.parse_args(argv)
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.rate_429, args.rate_5xx, args.retry_after, args.max_rps)
+    stub = StubUSDAServer(load_corpus(args.corpus), config, port=args.port)
+    print(f"Serving {len(stub.corpus['foods'])} foods on {stub.base_url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
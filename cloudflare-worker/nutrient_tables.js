@@ -0,0 +1,26 @@
+// Generated by `python -m utils.nutrient_spec generate` from utils/nutrient_spec.py.
+// Do not edit by hand.
+
+export const SPEC_VERSION = 2;
+export const SLOT_COUNT = 23;
+
+// USDA nutrient id -> slot
+export const SLOT_BY_ID = new Map([[1003, 1], [1004, 2], [1005, 3], [1007, 4], [1009, 22], [1010, 14], [1011, 15], [1012, 16], [1013, 17], [1014, 18], [1051, 0], [1063, 13], [1075, 19], [1079, 20], [1093, 5], [1257, 9], [1258, 6], [1292, 7], [1293, 8], [2000, 12]]);
+
+// Lowercased nutrient name -> slot, for entries without an id
+export const SLOT_BY_NAME = new Map([["ash", 4], ["carbohydrate, by difference", 3], ["dietary fiber", 21], ["dietary fiber, total", 21], ["fatty acids, total monounsaturated", 7], ["fatty acids, total polyunsaturated", 8], ["fatty acids, total saturated", 6], ["fatty acids, total trans", 9], ["fiber, total dietary", 20], ["fructose", 16], ["galactose", 19], ["glucose", 15], ["lactose", 17], ["maltose", 18], ["protein", 1], ["sodium, na", 5], ["starch", 22], ["sucrose", 14], ["sugars, total", 13], ["sugars, total including nlea", 12], ["sugars, total nlea", 13], ["total lipid (fat)", 2], ["total sugars", 12], ["trans fat", 10], ["trans fatty acids", 11], ["water", 0]]);
+
+// [quantity, first slot, end slot] in preference order
+export const QUANTITY_SLOTS = [["water", 0, 1], ["protein", 1, 2], ["fat", 2, 3], ["carbs", 3, 4], ["ash", 4, 5], ["sodium_mg", 5, 6], ["sat", 6, 7], ["mono", 7, 8], ["poly", 8, 9], ["trans", 9, 12], ["total_sugars", 12, 14], ["sucrose", 14, 15], ["glucose", 15, 16], ["fructose", 16, 17], ["lactose", 17, 18], ["maltose", 18, 19], ["galactose", 19, 20], ["fiber", 20, 22], ["starch", 22, 23]];
+
+// "<reverse><sodium><breakdown>" -> node names and [source, target, value name] links
+export const LAYOUTS = {
+  "000": {"nodes": ["Total", "Water", "Protein", "Fat", "Carbs", "Minerals", "Sugars", "Fiber", "Starch"], "links": [[0, 1, "water"], [0, 2, "protein"], [0, 5, "minerals"], [0, 3, "fat"], [0, 4, "carbs"], [4, 6, "sugars"], [4, 7, "fiber"], [4, 8, "starch"]]},
+  "001": {"nodes": ["Total", "Water", "Protein", "Fat", "Carbs", "Minerals", "Sat.", "Mono", "Poly", "Trans", "Other Fats", "Sugars", "Fiber", "Starch"], "links": [[0, 1, "water"], [0, 2, "protein"], [0, 5, "minerals"], [0, 6, "sat"], [0, 7, "mono"], [0, 8, "poly"], [0, 9, "trans"], [0, 10, "other_fats"], [6, 3, "sat"], [7, 3, "mono"], [8, 3, "poly"], [9, 3, "trans"], [10, 3, "other_fats"], [0, 4, "carbs"], [4, 11, "sugars"], [4, 12, "fiber"], [4, 13, "starch"]]},
+  "010": {"nodes": ["Total", "Water", "Protein", "Fat", "Carbs", "Sodium", "Minerals", "Sugars", "Fiber", "Starch"], "links": [[0, 1, "water"], [0, 2, "protein"], [0, 5, "sodium"], [0, 6, "other_minerals"], [0, 3, "fat"], [0, 4, "carbs"], [4, 7, "sugars"], [4, 8, "fiber"], [4, 9, "starch"]]},
+  "011": {"nodes": ["Total", "Water", "Protein", "Fat", "Carbs", "Sodium", "Minerals", "Sat.", "Mono", "Poly", "Trans", "Other Fats", "Sugars", "Fiber", "Starch"], "links": [[0, 1, "water"], [0, 2, "protein"], [0, 5, "sodium"], [0, 6, "other_minerals"], [0, 7, "sat"], [0, 8, "mono"], [0, 9, "poly"], [0, 10, "trans"], [0, 11, "other_fats"], [7, 3, "sat"], [8, 3, "mono"], [9, 3, "poly"], [10, 3, "trans"], [11, 3, "other_fats"], [0, 4, "carbs"], [4, 12, "sugars"], [4, 13, "fiber"], [4, 14, "starch"]]},
+  "100": {"nodes": ["Total", "Water", "Protein", "Fat", "Carbs", "Minerals", "Sugars", "Fiber", "Starch"], "links": [[3, 0, "fat"], [4, 6, "sugars"], [4, 7, "fiber"], [4, 8, "starch"], [2, 0, "protein"], [6, 0, "sugars"], [7, 0, "fiber"], [8, 0, "starch"], [1, 0, "water"], [5, 0, "minerals"]]},
+  "101": {"nodes": ["Total", "Water", "Protein", "Fat", "Carbs", "Minerals", "Sat.", "Mono", "Poly", "Trans", "Other Fats", "Sugars", "Fiber", "Starch"], "links": [[3, 6, "sat"], [3, 7, "mono"], [3, 8, "poly"], [3, 9, "trans"], [3, 10, "other_fats"], [6, 0, "sat"], [7, 0, "mono"], [8, 0, "poly"], [9, 0, "trans"], [10, 0, "other_fats"], [4, 11, "sugars"], [4, 12, "fiber"], [4, 13, "starch"], [2, 0, "protein"], [11, 0, "sugars"], [12, 0, "fiber"], [13, 0, "starch"], [1, 0, "water"], [5, 0, "minerals"]]},
+  "110": {"nodes": ["Total", "Water", "Protein", "Fat", "Carbs", "Sodium", "Minerals", "Sugars", "Fiber", "Starch"], "links": [[3, 0, "fat"], [4, 7, "sugars"], [4, 8, "fiber"], [4, 9, "starch"], [2, 0, "protein"], [7, 0, "sugars"], [8, 0, "fiber"], [9, 0, "starch"], [1, 0, "water"], [5, 0, "sodium"], [6, 0, "other_minerals"]]},
+  "111": {"nodes": ["Total", "Water", "Protein", "Fat", "Carbs", "Sodium", "Minerals", "Sat.", "Mono", "Poly", "Trans", "Other Fats", "Sugars", "Fiber", "Starch"], "links": [[3, 7, "sat"], [3, 8, "mono"], [3, 9, "poly"], [3, 10, "trans"], [3, 11, "other_fats"], [7, 0, "sat"], [8, 0, "mono"], [9, 0, "poly"], [10, 0, "trans"], [11, 0, "other_fats"], [4, 12, "sugars"], [4, 13, "fiber"], [4, 14, "starch"], [2, 0, "protein"], [12, 0, "sugars"], [13, 0, "fiber"], [14, 0, "starch"], [1, 0, "water"], [5, 0, "sodium"], [6, 0, "other_minerals"]]},
+};
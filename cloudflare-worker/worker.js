@@ -8,6 +8,8 @@
  * - USDA_API_KEY: Your USDA FoodData Central API key
  */
 
+import { LAYOUTS, QUANTITY_SLOTS, SLOT_BY_ID, SLOT_BY_NAME, SLOT_COUNT } from './nutrient_tables.js';
+
 const USDA_BASE_URL = 'https://api.nal.usda.gov/fdc/v1';
 
 // CORS headers for cross-origin requests
@@ -101,6 +103,16 @@ async function handleSearch(url, env) {
 }
 
 async function handleFood(url, path, env) {
+  // Only /api/food/<id> and /api/food/<id>/raw; the page probes for the Flask
+  // app's /bundle and /voronoi routes and falls back to /raw on a 404.
+  const segments = path.replace('/api/food/', '').split('/');
+  if (segments.length > 2 || (segments.length === 2 && segments[1] !== 'raw')) {
+    return new Response(JSON.stringify({ error: 'Not found' }), {
+      status: 404,
+      headers: { ...corsHeaders, 'Content-Type': 'application/json' },
+    });
+  }
+
   // Check if raw data is requested (for treemaps)
   const isRaw = path.endsWith('/raw');
   const foodId = path.replace('/api/food/', '').replace('/raw', '');
@@ -138,211 +150,114 @@ async function handleFood(url, path, env) {
 }
 
 /**
- * Transform USDA food data to Sankey diagram format
- * 
- * Normal hierarchy (Macro → Detail):
- *   Total → Protein (terminal)
- *   Total → Carbs → Sugars/Fiber/Starch
- *   Total → Sat/Mono/Poly/Trans/Other Fats → Fat (terminal)
- *   Total → Water (terminal)
- *   Total → Minerals (terminal)
- * 
- * Reverse hierarchy (Detail → Macro):
- *   Protein → Total
- *   Sugars/Fiber/Starch → Carbs → Total
- *   Fat → Sat/Mono/Poly/Trans/Other Fats → Total
- *   Water → Total
- *   Minerals → Total
+ * Resolve every spec quantity in a single pass over foodNutrients.
+ * Nutrients are matched by USDA id (by lowercased name when an entry has no id);
+ * each candidate takes its first matching entry and a quantity is its first
+ * positive candidate.
  */
-function transformToSankey(foodData, reverseHierarchy = false, showSodium = false, showFatBreakdown = true) {
-  const nutrients = foodData.foodNutrients || [];
-
-  // Helper to get nutrient amount
-  function getNutrient(...names) {
-    for (const name of names) {
-      const nutrient = nutrients.find(n => 
-        n.nutrient?.name?.toLowerCase() === name.toLowerCase()
-      );
-      if (nutrient && nutrient.amount > 0) {
-        return nutrient.amount;
+function resolveQuantities(foodNutrients) {
+  const slots = new Array(SLOT_COUNT).fill(undefined);
+  for (const entry of foodNutrients) {
+    const nutrient = entry.nutrient || {};
+    const slot = nutrient.id != null
+      ? SLOT_BY_ID.get(nutrient.id)
+      : SLOT_BY_NAME.get((nutrient.name || '').toLowerCase());
+    if (slot === undefined) continue;
+    if (slots[slot] === undefined) {
+      slots[slot] = entry.amount || 0;
+    }
+  }
+  const quantities = {};
+  for (const [quantity, start, end] of QUANTITY_SLOTS) {
+    let value = 0;
+    for (let slot = start; slot < end; slot++) {
+      if (slots[slot] > 0) {
+        value = slots[slot];
+        break;
       }
     }
-    return 0;
+    quantities[quantity] = value;
   }
+  return quantities;
+}
 
-  // Get main macronutrients
-  const water = getNutrient('Water');
-  const protein = getNutrient('Protein');
-  const totalFat = getNutrient('Total lipid (fat)');
-  const carbs = getNutrient('Carbohydrate, by difference');
-
-  // Fat breakdown
-  const satFat = getNutrient('Fatty acids, total saturated');
-  const monoFat = getNutrient('Fatty acids, total monounsaturated');
-  const polyFat = getNutrient('Fatty acids, total polyunsaturated');
-  const transFat = getNutrient('Fatty acids, total trans', 'Trans fat', 'Trans fatty acids');
-  const otherFats = Math.max(0, totalFat - satFat - monoFat - polyFat - transFat);
+/**
+ * Link values from resolved quantities. Mirrors derive_values in
+ * utils/nutrient_spec.py operation for operation.
+ */
+function deriveValues(q) {
+  const { water, protein, fat, carbs } = q;
 
-  // Carbs breakdown
   // Use Total Sugars if available, otherwise sum individual sugars
-  let sugars = getNutrient('Total Sugars', 'Sugars, total');
+  let sugars = q.total_sugars;
   if (sugars === 0) {
-    // Fallback: sum individual sugar types
-    const glucose = getNutrient('Glucose');
-    const fructose = getNutrient('Fructose');
-    const sucrose = getNutrient('Sucrose');
-    const maltose = getNutrient('Maltose');
-    const lactose = getNutrient('Lactose');
-    const galactose = getNutrient('Galactose');
-    sugars = glucose + fructose + sucrose + maltose + lactose + galactose;
+    sugars = q.glucose + q.fructose + q.sucrose + q.maltose + q.lactose + q.galactose;
   }
-  const fiber = getNutrient('Fiber, total dietary');
+  const fiber = q.fiber;
   // Use explicit starch if available, otherwise calculate as remainder
-  let starch = getNutrient('Starch');
+  let starch = q.starch;
   if (starch === 0 && carbs > 0) {
     starch = Math.max(0, carbs - sugars - fiber);
   }
 
   // Minerals (Ash or calculated)
-  let minerals = getNutrient('Ash');
+  let minerals = q.ash;
   if (minerals === 0) {
-    minerals = Math.max(0, 100 - water - protein - totalFat - carbs);
-  }
-
-  // Extract sodium (in mg, convert to grams for Sankey)
-  const sodiumMg = getNutrient('Sodium, Na');
-  const sodium = sodiumMg / 1000; // Convert mg to grams
-  const otherMinerals = Math.max(0, minerals - sodium);
-
-  // Log values for debugging
-  console.log('Sankey Data:', {
-    reverseHierarchy, showSodium, showFatBreakdown,
-    water, protein, totalFat, carbs, minerals, sodium, otherMinerals,
-    satFat, monoFat, polyFat, transFat, otherFats,
-    sugars, fiber, starch
-  });
-
-  // Build node names based on options
-  let nodeNames = ["Total", "Water", "Protein", "Fat", "Carbs"];
-  
-  // Add sodium/minerals nodes
-  if (showSodium) {
-    nodeNames.push("Sodium", "Minerals");
-  } else {
-    nodeNames.push("Minerals");
+    minerals = Math.max(0, 100 - water - protein - fat - carbs);
   }
-  
-  // Add fat subtypes only if showFatBreakdown is true
-  if (showFatBreakdown) {
-    nodeNames.push("Sat.", "Mono", "Poly", "Trans", "Other Fats");
-  }
-  
-  // Add carb subtypes
-  nodeNames.push("Sugars", "Fiber", "Starch");
+  // Sodium is reported in mg; convert to grams for the Sankey
+  const sodium = q.sodium_mg / 1000;
+
+  return {
+    water,
+    protein,
+    fat,
+    carbs,
+    minerals,
+    sodium,
+    other_minerals: Math.max(0, minerals - sodium),
+    sat: q.sat,
+    mono: q.mono,
+    poly: q.poly,
+    trans: q.trans,
+    other_fats: Math.max(0, fat - q.sat - q.mono - q.poly - q.trans),
+    sugars,
+    fiber,
+    starch,
+  };
+}
 
-  const nodes = nodeNames.map((name, i) => ({ node: i, name }));
-  const nodeIndex = {};
-  nodeNames.forEach((name, i) => { nodeIndex[name] = i; });
+/**
+ * Transform USDA food data to Sankey diagram format
+ *
+ * Nodes and links come from the generated LAYOUTS table (see utils/nutrient_spec.py).
+ *
+ * Normal hierarchy (Macro → Detail):
+ *   Total → Protein (terminal)
+ *   Total → Carbs → Sugars/Fiber/Starch
+ *   Total → Sat/Mono/Poly/Trans/Other Fats → Fat (terminal)
+ *   Total → Water (terminal)
+ *   Total → Minerals (terminal)
+ *
+ * Reverse hierarchy (Detail → Macro):
+ *   Protein → Total
+ *   Sugars/Fiber/Starch → Carbs → Total
+ *   Fat → Sat/Mono/Poly/Trans/Other Fats → Total
+ *   Water → Total
+ *   Minerals → Total
+ */
+export function transformToSankey(foodData, reverseHierarchy = false, showSodium = false, showFatBreakdown = true) {
+  const layout = LAYOUTS[`${+reverseHierarchy}${+showSodium}${+showFatBreakdown}`];
+  const values = deriveValues(resolveQuantities(foodData.foodNutrients || []));
 
+  const nodes = layout.nodes.map((name, i) => ({ node: i, name }));
   const links = [];
-
-  function addLink(source, target, value) {
-    if (value > 0 && nodeIndex[source] !== undefined && nodeIndex[target] !== undefined) {
-      links.push({ source: nodeIndex[source], target: nodeIndex[target], value });
-    }
-  }
-
-  if (reverseHierarchy) {
-    // Detail → Macro view:
-    // Fat → Sat/Mono/Poly/Trans/Other Fats → Total (if showFatBreakdown)
-    // Fat → Total (if !showFatBreakdown)
-    // Carbs → Sugars/Fiber/Starch → Total
-    // Protein → Total
-    // Water → Total
-    // Minerals (or Sodium + Minerals if showSodium) → Total
-
-    if (showFatBreakdown) {
-      // Fat to subtypes
-      addLink("Fat", "Sat.", satFat);
-      addLink("Fat", "Mono", monoFat);
-      addLink("Fat", "Poly", polyFat);
-      addLink("Fat", "Trans", transFat);
-      addLink("Fat", "Other Fats", otherFats);
-      
-      // Fat subtypes to Total
-      addLink("Sat.", "Total", satFat);
-      addLink("Mono", "Total", monoFat);
-      addLink("Poly", "Total", polyFat);
-      addLink("Trans", "Total", transFat);
-      addLink("Other Fats", "Total", otherFats);
-    } else {
-      // Fat directly to Total
-      addLink("Fat", "Total", totalFat);
-    }
-    
-    // Carbs to subtypes
-    addLink("Carbs", "Sugars", sugars);
-    addLink("Carbs", "Fiber", fiber);
-    addLink("Carbs", "Starch", starch);
-
-    // All sub-nutrients to Total
-    addLink("Protein", "Total", protein);
-    addLink("Sugars", "Total", sugars);
-    addLink("Fiber", "Total", fiber);
-    addLink("Starch", "Total", starch);
-    addLink("Water", "Total", water);
-    
-    // Minerals - conditional on showSodium
-    if (showSodium) {
-      addLink("Sodium", "Total", sodium);
-      addLink("Minerals", "Total", otherMinerals);
-    } else {
-      addLink("Minerals", "Total", minerals);
-    }
-
-  } else {
-    // Normal Macro → Detail view:
-    // Total → Sat/Mono/Poly/Trans/Other Fats → Fat (if showFatBreakdown)
-    // Total → Fat (if !showFatBreakdown)
-    // Total → Carbs → Sugars/Fiber/Starch
-    // Total → Protein/Water/Minerals (terminal)
-
-    // Total to terminal nodes
-    addLink("Total", "Water", water);
-    addLink("Total", "Protein", protein);
-    
-    // Minerals - conditional on showSodium
-    if (showSodium) {
-      addLink("Total", "Sodium", sodium);
-      addLink("Total", "Minerals", otherMinerals);
-    } else {
-      addLink("Total", "Minerals", minerals);
+  for (const [source, target, name] of layout.links) {
+    const value = values[name];
+    if (value > 0) {
+      links.push({ source, target, value });
     }
-
-    if (showFatBreakdown) {
-      // Total to fat subtypes, then subtypes to Fat (terminal)
-      addLink("Total", "Sat.", satFat);
-      addLink("Total", "Mono", monoFat);
-      addLink("Total", "Poly", polyFat);
-      addLink("Total", "Trans", transFat);
-      addLink("Total", "Other Fats", otherFats);
-      addLink("Sat.", "Fat", satFat);
-      addLink("Mono", "Fat", monoFat);
-      addLink("Poly", "Fat", polyFat);
-      addLink("Trans", "Fat", transFat);
-      addLink("Other Fats", "Fat", otherFats);
-    } else {
-      // Total directly to Fat (terminal)
-      addLink("Total", "Fat", totalFat);
-    }
-
-    // Total to Carbs, then Carbs to subtypes
-    addLink("Total", "Carbs", carbs);
-    addLink("Carbs", "Sugars", sugars);
-    addLink("Carbs", "Fiber", fiber);
-    addLink("Carbs", "Starch", starch);
   }
 
   return { nodes, links };
 }
-
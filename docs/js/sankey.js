@@ -69,9 +69,100 @@ function getSelectedDataTypes() {
 
 let currentSearchPage = 1;
 
+// Show a food in every chart and close the results list
+function selectFood(food) {
+    // Remember the current selection
+    currentFoodId = food.fdcId;
+    currentFoodName = food.description;
+
+    // Update Sankey diagram
+    updateSankey(food.fdcId);
+    
+    // Update treemaps if function exists
+    if (typeof window.updateTreemapsForFood === 'function') {
+        window.updateTreemapsForFood(food.fdcId);
+    }
+    
+    // Update graph details with food description
+    updateGraphDetails(food.fdcId, food.description);
+    
+    // Hide search results
+    document.getElementById('searchResults').style.display = 'none';
+    
+    // Clear search input
+    document.getElementById('searchInput').value = '';
+}
+
+// One entry in the results list (used by search and suggestions)
+function createFoodResultButton(food) {
+    const button = document.createElement('button');
+    button.className = 'list-group-item list-group-item-action';
+    button.innerHTML = `
+        <div class="d-flex w-100 justify-content-between">
+            <h6 class="mb-1">${food.description}</h6>
+            <small>${food.dataType}</small>
+        </div>
+        ${food.brandOwner ? `<small class="text-muted">Brand: ${food.brandOwner}</small>` : ''}
+    `;
+    button.addEventListener('click', () => selectFood(food));
+    return button;
+}
+
+/* ------------------------------------------------------------------------
+ * Typeahead: while typing, show matches from /api/suggest, which answers from
+ * the server's local index without a USDA round trip. Enter (or the search
+ * button) still runs the full search. Backends without /api/suggest (such as
+ * the Cloudflare Worker) turn suggestions off after the first failure.
+ * ------------------------------------------------------------------------ */
+const SUGGEST_DEBOUNCE_MS = 120;
+const SUGGEST_MIN_CHARS = 2;
+let suggestTimer = null;
+let suggestController = null;
+let suggestAvailable = true;
+
+function fetchSuggestions() {
+    const query = document.getElementById('searchInput').value.trim();
+    if (!suggestAvailable || query.length < SUGGEST_MIN_CHARS) return;
+    if (suggestController) suggestController.abort();
+    suggestController = new AbortController();
+
+    const dataTypes = getSelectedDataTypes();
+    let url = `${API_BASE_URL}/api/suggest?q=${encodeURIComponent(query)}&limit=8`;
+    if (dataTypes.length > 0) {
+        url += '&dataTypes=' + encodeURIComponent(dataTypes.join(','));
+    }
+    fetch(url, { signal: suggestController.signal })
+        .then(response => {
+            if (response.status === 404) {
+                suggestAvailable = false;
+                return null;
+            }
+            return response.ok ? response.json() : null;
+        })
+        .then(data => {
+            // Ignore late answers for text that has since changed
+            if (!data || !data.results || data.query !== document.getElementById('searchInput').value.trim()) return;
+            if (data.results.length === 0) return;
+            const searchResults = document.getElementById('searchResults');
+            searchResults.innerHTML = '';
+            data.results.forEach(food => searchResults.appendChild(createFoodResultButton(food)));
+            searchResults.style.display = 'block';
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') suggestAvailable = false;
+        });
+}
+
+document.getElementById('searchInput').addEventListener('input', function() {
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(fetchSuggestions, SUGGEST_DEBOUNCE_MS);
+});
+
 function performSearch(queryParam, page = 1) {
     const query = (typeof queryParam === 'string' ? queryParam : document.getElementById('searchInput').value.trim());
     if (!query) return;
+    clearTimeout(suggestTimer);
+    if (suggestController) suggestController.abort();
     lastSearchQuery = query;
     currentSearchPage = page;
 
@@ -119,38 +210,7 @@ function performSearch(queryParam, page = 1) {
             }
 
             data.results.forEach(food => {
-                const button = document.createElement('button');
-                button.className = 'list-group-item list-group-item-action';
-                button.innerHTML = `
-                    <div class="d-flex w-100 justify-content-between">
-                        <h6 class="mb-1">${food.description}</h6>
-                        <small>${food.dataType}</small>
-                    </div>
-                    ${food.brandOwner ? `<small class="text-muted">Brand: ${food.brandOwner}</small>` : ''}
-                `;
-                button.addEventListener('click', () => {
-                    // Remember the current selection
-                    currentFoodId = food.fdcId;
-                    currentFoodName = food.description;
-
-                    // Update Sankey diagram
-                    updateSankey(food.fdcId);
-                    
-                    // Update treemaps if function exists
-                    if (typeof window.updateTreemapsForFood === 'function') {
-                        window.updateTreemapsForFood(food.fdcId);
-                    }
-                    
-                    // Update graph details with food description
-                    updateGraphDetails(food.fdcId, food.description);
-                    
-                    // Hide search results
-                    searchResults.style.display = 'none';
-                    
-                    // Clear search input
-                    document.getElementById('searchInput').value = '';
-                });
-                searchResults.appendChild(button);
+                searchResults.appendChild(createFoodResultButton(food));
             });
 
             // Add "Load More" button if there are more results
@@ -365,7 +425,7 @@ async function updateSankey(foodId) {
 
         // Fetch data from API
         const url = `${API_BASE_URL}/api/food/${foodId}?reverseHierarchy=${reverseHierarchy}&showSodium=${showSodium}&showFatBreakdown=${showFatBreakdown}`;
-        const response = await fetch(url);
+        const response = await fetch(url, { headers: { Accept: SANKEY_ACCEPT } });
         if (!response.ok) {
             let message = `Failed to fetch data (HTTP ${response.status})`;
             try {
@@ -374,7 +434,7 @@ async function updateSankey(foodId) {
             } catch (e) {}
             throw new Error(message);
         }
-        const data = await response.json();
+        const data = await readSankeyResponse(response);
 
         // Debug: Log the data structure
         console.log('=== Sankey Data ===');
@@ -128,6 +128,13 @@ let circlePackShowLabels = true;
 let stackedBarShowSubtypes = true;
 let voronoiShowSubtypes = true;
 let voronoiShowLabels = true;
+// Chart data comes from /api/food/<id>/bundle when the backend serves it; the
+// Cloudflare Worker does not, and the charts then parse /raw here instead.
+let bundleUnsupported = false;
+let currentBundleFoodId = null; // Food whose nutrients came from a bundle
+let chartRequestSeq = 0;        // Drops responses overtaken by a newer request
+let currentVoronoiLayouts = null;   // Server-solved cells, see loadVoronoiLayouts
+let voronoiLayoutsRequested = false;
 
 // Height configurations matching sankey.js
 const treemapHeights = {
@@ -1643,7 +1650,20 @@ function flattenVoronoiItems(data) {
     return items;
 }
 
-function renderCircularVoronoi(containerId, data, title, unit = 'g') {
+// Cells of a server-solved layout (/api/food/<id>/voronoi) moved into this chart's
+// circle, or null when the layout does not hold exactly these items.
+function scaleVoronoiLayout(layout, items, cx, cy, radius) {
+    if (!layout || layout.cells.length !== items.length) return null;
+    if (layout.cells.some((cell, i) => cell.name !== items[i].name)) return null;
+    const k = radius / layout.radius;
+    const origin = layout.size / 2;
+    return layout.cells.map(cell => cell.polygon.map(([x, y]) => ({
+        x: cx + (x - origin) * k,
+        y: cy + (y - origin) * k
+    })));
+}
+
+function renderCircularVoronoi(containerId, data, title, unit = 'g', layout = null) {
     const container = document.getElementById(containerId);
     if (!container) return;
     container.innerHTML = '';
@@ -1680,31 +1700,37 @@ function renderCircularVoronoi(containerId, data, title, unit = 'g') {
 
     const g = svg.append('g');
 
-    const totalValue = Math.max(1e-9, d3.sum(items, d => d.value));
     const circleArea = Math.PI * radius * radius;
-    const targetAreas = items.map(item => (item.value / totalValue) * circleArea);
-
-    // Initial sites on a golden-angle spiral for stable convergence.
-    const golden = Math.PI * (3 - Math.sqrt(5));
-    const sites = items.map((_, i) => {
-        const t = (i + 1) / (items.length + 1);
-        const r = radius * Math.sqrt(t) * 0.85;
-        const a = i * golden;
-        return { x: cx + (r * Math.cos(a)), y: cy + (r * Math.sin(a)) };
-    });
+    const serverCells = scaleVoronoiLayout(layout, items, cx, cy, radius);
+    let cellsData;
+    if (serverCells) {
+        cellsData = items.map((item, i) => ({ ...item, cell: serverCells[i] }));
+    } else {
+        const totalValue = Math.max(1e-9, d3.sum(items, d => d.value));
+        const targetAreas = items.map(item => (item.value / totalValue) * circleArea);
+
+        // Initial sites on a golden-angle spiral for stable convergence.
+        const golden = Math.PI * (3 - Math.sqrt(5));
+        const sites = items.map((_, i) => {
+            const t = (i + 1) / (items.length + 1);
+            const r = radius * Math.sqrt(t) * 0.85;
+            const a = i * golden;
+            return { x: cx + (r * Math.cos(a)), y: cy + (r * Math.sin(a)) };
+        });
 
-    const solved = solveWeightedVoronoi(sites, targetAreas, cx, cy, radius, {
-        maxIterations: 70,
-        centroidStep: 0.42,
-        weightStep: 0.85,
-        boundarySides: 80
-    });
+        const solved = solveWeightedVoronoi(sites, targetAreas, cx, cy, radius, {
+            maxIterations: 70,
+            centroidStep: 0.42,
+            weightStep: 0.85,
+            boundarySides: 80
+        });
 
-    const cellsData = items.map((item, i) => ({
-        ...item,
-        cell: solved.cells[i] || [],
-        site: solved.sites[i] || sites[i]
-    }));
+        cellsData = items.map((item, i) => ({
+            ...item,
+            cell: solved.cells[i] || [],
+            site: solved.sites[i] || sites[i]
+        }));
+    }
 
     const cells = g.selectAll('path')
         .data(cellsData)
@@ -2025,33 +2051,79 @@ function updateCirclePacking() {
     if (vitaminsBtn) vitaminsBtn.disabled = !hasVitamins;
 }
 
+// The layout /api/food/<id>/voronoi solved for a chart variant, as keyed by
+// treemap_hierarchies in utils/chart_bundle.py.
+function voronoiLayoutFor(chart, detailed) {
+    if (!currentVoronoiLayouts || !currentVoronoiLayouts[chart]) return null;
+    let variant = detailed ? 'detailed' : 'summary';
+    if ((chart === 'micronutrients' || chart === 'minerals') && showSodiumSeparately) {
+        variant += '+salt';
+    }
+    return currentVoronoiLayouts[chart][variant] || null;
+}
+
+// Fetch the food's solved Voronoi cells once, the first time the Voronoi tab is
+// drawn, then redraw with them. On failure the charts keep solving here.
+function loadVoronoiLayouts(foodId) {
+    voronoiLayoutsRequested = true;
+    const macroContainer = document.getElementById('voronoiMacroContainer');
+    if (macroContainer) {
+        macroContainer.innerHTML = '<p class="text-center text-muted p-4">Loading...</p>';
+    }
+    fetch(`${API_BASE_URL}/api/food/${foodId}/voronoi`)
+        .then(response => {
+            if (!response.ok) throw new Error('Failed to fetch Voronoi layouts');
+            return response.json();
+        })
+        .then(data => {
+            if (currentBundleFoodId !== foodId) return;
+            currentVoronoiLayouts = data.layouts;
+            updateVoronoiCharts();
+        })
+        .catch(error => {
+            console.error('Voronoi layout error:', error);
+            if (currentBundleFoodId === foodId) {
+                currentVoronoiLayouts = {}; // no layouts: solve each chart here
+                updateVoronoiCharts();
+            }
+        });
+}
+
 function updateVoronoiCharts() {
     if (!currentTreemapData) return;
 
+    if (currentBundleFoodId !== null && !currentVoronoiLayouts) {
+        const panel = document.getElementById('voronoiPanel');
+        if (panel && panel.classList.contains('active') && !voronoiLayoutsRequested) {
+            loadVoronoiLayouts(currentBundleFoodId);
+        }
+        return;
+    }
+
     const { fat, carbs, protein, mineralData, vitaminData } = currentTreemapData;
 
     const macroData = buildMacroTreemapData(currentTreemapData, voronoiShowSubtypes);
-    renderCircularVoronoi('voronoiMacroContainer', macroData, 'Macronutrients', 'g');
+    renderCircularVoronoi('voronoiMacroContainer', macroData, 'Macronutrients', 'g', voronoiLayoutFor('macro', voronoiShowSubtypes));
 
     const hasFat = fat > 0;
     toggleTreemapVisibility('voronoiFatContainer', hasFat);
     if (hasFat) {
         const fatData = buildFatTreemapData(currentTreemapData);
-        renderCircularVoronoi('voronoiFatContainer', fatData, 'Fat Breakdown', 'g');
+        renderCircularVoronoi('voronoiFatContainer', fatData, 'Fat Breakdown', 'g', voronoiLayoutFor('fat', true));
     }
 
     const hasCarbs = carbs > 0;
     toggleTreemapVisibility('voronoiCarbsContainer', hasCarbs);
     if (hasCarbs) {
         const carbsData = buildCarbsTreemapData(currentTreemapData);
-        renderCircularVoronoi('voronoiCarbsContainer', carbsData, 'Carbs Breakdown', 'g');
+        renderCircularVoronoi('voronoiCarbsContainer', carbsData, 'Carbs Breakdown', 'g', voronoiLayoutFor('carbs', true));
     }
 
     const hasProtein = protein > 0;
     toggleTreemapVisibility('voronoiProteinContainer', hasProtein);
     if (hasProtein) {
         const proteinData = buildProteinTreemapData(currentTreemapData, voronoiShowSubtypes);
-        renderCircularVoronoi('voronoiProteinContainer', proteinData, 'Protein Breakdown', 'g');
+        renderCircularVoronoi('voronoiProteinContainer', proteinData, 'Protein Breakdown', 'g', voronoiLayoutFor('protein', voronoiShowSubtypes));
     }
 
     const hasMinerals = mineralData && Object.values(mineralData).some(v => v > 0);
@@ -2065,7 +2137,7 @@ function updateVoronoiCharts() {
     }
     if (hasMicronutrients) {
         const microData = buildMicronutrientsTreemapData(currentTreemapData, voronoiShowSubtypes);
-        renderCircularVoronoi('voronoiMicronutrientsContainer', microData, 'Micronutrients Breakdown', 'mg');
+        renderCircularVoronoi('voronoiMicronutrientsContainer', microData, 'Micronutrients Breakdown', 'mg', voronoiLayoutFor('micronutrients', voronoiShowSubtypes));
     }
 
     const mineralsContainer = document.getElementById('voronoiMineralsContainer');
@@ -2075,7 +2147,7 @@ function updateVoronoiCharts() {
     }
     if (hasMinerals) {
         const mineralsData = buildMineralsTreemapData(currentTreemapData, voronoiShowSubtypes);
-        renderCircularVoronoi('voronoiMineralsContainer', mineralsData, 'Minerals Breakdown', 'mg');
+        renderCircularVoronoi('voronoiMineralsContainer', mineralsData, 'Minerals Breakdown', 'mg', voronoiLayoutFor('minerals', voronoiShowSubtypes));
     }
 
     const vitaminsContainer = document.getElementById('voronoiVitaminsContainer');
@@ -2085,7 +2157,7 @@ function updateVoronoiCharts() {
     }
     if (hasVitamins) {
         const vitaminsData = buildVitaminsTreemapData(currentTreemapData, voronoiShowSubtypes);
-        renderCircularVoronoi('voronoiVitaminsContainer', vitaminsData, 'Vitamins Breakdown', 'mg');
+        renderCircularVoronoi('voronoiVitaminsContainer', vitaminsData, 'Vitamins Breakdown', 'mg', voronoiLayoutFor('vitamins', voronoiShowSubtypes));
     }
 
     const macroBtn = document.getElementById('downloadVoronoiSvg');
@@ -2104,61 +2176,45 @@ function updateVoronoiCharts() {
     if (vitaminsBtn) vitaminsBtn.disabled = !hasVitamins;
 }
 
-// Parse and populate portion sizes from USDA data
-function parseAndPopulatePortions(foodData) {
-    availablePortions = [];
-    
-    // Always include the default 100g option
-    availablePortions.push({
-        description: '100g (default)',
-        gramWeight: 100,
-        multiplier: 1
-    });
-    
-    // Extract foodPortions from USDA data
-    const foodPortions = foodData.foodPortions || [];
-    
-    console.log('Food Portions from API:', foodPortions); // Debug log
-    
-    // Add each available portion
+// Label USDA foodPortions entries, for backends that do not send the server's
+// portion list (the Cloudflare Worker). Mirrors list_portions in utils/data_transformer.py.
+function labelFoodPortions(foodPortions) {
+    const portions = [{ description: '100g (default)', gramWeight: 100 }];
     foodPortions.forEach(portion => {
         if (portion.gramWeight && portion.gramWeight > 0) {
-            let description = '';
-            
-            // Try different fields to build a meaningful description
-            // Priority: portionDescription > modifier > measureUnit.name
+            const grams = Math.round(portion.gramWeight);
+            const amount = portion.amount && portion.amount !== 1 ? portion.amount + ' ' : '';
+            let description;
+            // Priority: portionDescription > modifier > measureUnit.name > measureUnit.abbreviation
             if (portion.portionDescription) {
-                // Use portionDescription if available
-                description = `${portion.portionDescription} (${Math.round(portion.gramWeight)}g)`;
+                description = `${portion.portionDescription} (${grams}g)`;
             } else if (portion.modifier && portion.modifier.trim()) {
-                // Use modifier if available (e.g., "cup, sliced")
-                const amount = portion.amount && portion.amount !== 1 ? portion.amount + ' ' : '';
-                description = `${amount}${portion.modifier} (${Math.round(portion.gramWeight)}g)`;
+                description = `${amount}${portion.modifier} (${grams}g)`;
             } else if (portion.measureUnit?.name) {
-                // Use measure unit name (e.g., "cup", "tablespoon")
-                const amount = portion.amount && portion.amount !== 1 ? portion.amount + ' ' : '';
-                const unit = portion.measureUnit.name;
-                description = `${amount}${unit} (${Math.round(portion.gramWeight)}g)`;
+                description = `${amount}${portion.measureUnit.name} (${grams}g)`;
             } else if (portion.measureUnit?.abbreviation) {
-                // Use abbreviation as fallback
-                const amount = portion.amount && portion.amount !== 1 ? portion.amount + ' ' : '';
-                const unit = portion.measureUnit.abbreviation;
-                description = `${amount}${unit} (${Math.round(portion.gramWeight)}g)`;
+                description = `${amount}${portion.measureUnit.abbreviation} (${grams}g)`;
             } else {
-                // Last resort: use "serving" with gram weight
-                description = `Serving (${Math.round(portion.gramWeight)}g)`;
+                description = `Serving (${grams}g)`;
             }
-            
-            // Clean up the description (remove extra spaces, etc.)
-            description = description.replace(/\s+/g, ' ').trim();
-            
-            availablePortions.push({
-                description: description,
-                gramWeight: portion.gramWeight,
-                multiplier: portion.gramWeight / 100 // Calculate multiplier relative to 100g
-            });
+            portions.push({ description: description.replace(/\s+/g, ' ').trim(), gramWeight: portion.gramWeight });
         }
     });
+    return portions;
+}
+
+// Populate the portion dropdown. The Flask app sends the labelled list as
+// foodData.portions (starting with the 100g default); otherwise label foodPortions here.
+function parseAndPopulatePortions(foodData) {
+    const portions = Array.isArray(foodData.portions)
+        ? foodData.portions
+        : labelFoodPortions(foodData.foodPortions || []);
+    availablePortions = portions.map(portion => ({
+        id: portion.id ?? null,
+        description: portion.description,
+        gramWeight: portion.gramWeight,
+        multiplier: portion.gramWeight / 100 // Calculate multiplier relative to 100g
+    }));
     
     // Populate the dropdown
     const portionSelect = document.getElementById('portionSize');
@@ -2183,14 +2239,47 @@ function parseAndPopulatePortions(foodData) {
     }
 }
 
+// Fetch /api/food/<id>/bundle for a portion id (null for 100g). Resolves to null
+// when the backend has no bundle route, so the caller can fall back to /raw.
+async function fetchChartBundle(foodId, portionId = null) {
+    const query = portionId !== null ? `?portionId=${encodeURIComponent(portionId)}` : '';
+    const response = await fetch(`${API_BASE_URL}/api/food/${foodId}/bundle${query}`);
+    if (response.status === 404) return null;
+    if (!response.ok) throw new Error('Failed to fetch chart bundle');
+    return response.json();
+}
+
 // Handle portion size change
-function handlePortionChange() {
+async function handlePortionChange() {
     const portionSelect = document.getElementById('portionSize');
     if (portionSelect && currentFoodData) {
-        currentPortionMultiplier = parseFloat(portionSelect.value);
+        const multiplier = parseFloat(portionSelect.value);
         
-        // Reparse nutrients with new multiplier
-        currentTreemapData = parseNutrientsFromUSDA(currentFoodData, currentPortionMultiplier);
+        if (currentBundleFoodId !== null) {
+            // The server scales the nutrients; the Voronoi cells do not change with the portion.
+            const portion = availablePortions[portionSelect.selectedIndex];
+            const request = ++chartRequestSeq;
+            let bundle;
+            try {
+                bundle = await fetchChartBundle(currentBundleFoodId, portion ? portion.id : null);
+            } catch (error) {
+                console.error('Chart bundle error:', error);
+            }
+            if (request !== chartRequestSeq) return;
+            if (!bundle) {
+                // Drop the previous portion's charts rather than leave them under the new label.
+                currentTreemapData = null;
+                if (typeof window.updateDRVBarGraphs === 'function') window.updateDRVBarGraphs(null);
+                if (typeof window.updateRadarChartData === 'function') window.updateRadarChartData(null);
+                showChartLoadError();
+                return;
+            }
+            currentTreemapData = bundle.nutrients;
+        } else {
+            // Reparse nutrients with new multiplier
+            currentTreemapData = parseNutrientsFromUSDA(currentFoodData, multiplier);
+        }
+        currentPortionMultiplier = multiplier;
         
         // Update portion info in titles
         updateChartTitles();
@@ -2372,12 +2461,25 @@ function parseNutrientsFromUSDA(foodData, multiplier = 1) {
 
 // Fetch and display treemaps for a food item
 async function fetchAndDisplayTreemaps(foodId) {
+    const request = ++chartRequestSeq;
     try {
-        const response = await fetch(`${API_BASE_URL}/api/food/${foodId}/raw`);
-        if (!response.ok) throw new Error('Failed to fetch food data');
-        
-        const foodData = await response.json();
-        currentFoodData = foodData; // Store raw data for portion changes
+        // The bundle carries the parsed nutrients and the portion list at 100g.
+        const bundle = bundleUnsupported ? null : await fetchChartBundle(foodId);
+        let foodData = bundle;
+        if (!bundle) {
+            const response = await fetch(`${API_BASE_URL}/api/food/${foodId}/raw`, {
+                headers: { Accept: NUTRIENT_VECTOR_ACCEPT }
+            });
+            if (!response.ok) throw new Error('Failed to fetch food data');
+            foodData = await readFoodRecordResponse(response);
+            // The food exists, so the 404 came from a backend without the route.
+            bundleUnsupported = true;
+        }
+        if (request !== chartRequestSeq) return;
+        currentFoodData = foodData; // Store data for portion changes
+        currentBundleFoodId = bundle ? foodId : null;
+        currentVoronoiLayouts = null;
+        voronoiLayoutsRequested = false;
         
         // Parse and populate available portions
         parseAndPopulatePortions(foodData);
@@ -2390,7 +2492,7 @@ async function fetchAndDisplayTreemaps(foodId) {
         }
         
         // Parse nutrients with current multiplier
-        currentTreemapData = parseNutrientsFromUSDA(foodData, currentPortionMultiplier);
+        currentTreemapData = bundle ? bundle.nutrients : parseNutrientsFromUSDA(foodData, currentPortionMultiplier);
         
         // Update titles
         const description = foodData.description || 'Food Item';
@@ -2429,19 +2531,27 @@ async function fetchAndDisplayTreemaps(foodId) {
         }
     } catch (error) {
         console.error('Treemap error:', error);
-        document.getElementById('treemapContainer').innerHTML = 
-            '<p class="text-center text-danger p-4">Failed to load treemap data</p>';
-        const stackedMacroContainer = document.getElementById('stackedBarMacroContainer');
-        if (stackedMacroContainer) {
-            stackedMacroContainer.innerHTML = '<p class="text-center text-danger p-4">Failed to load stacked bar data</p>';
-        }
-        const circlePackContainer = document.getElementById('circlePackMacroContainer');
-        if (circlePackContainer) {
-            circlePackContainer.innerHTML = '<p class="text-center text-danger p-4">Failed to load circle packing data</p>';
-        }
-        const voronoiContainer = document.getElementById('voronoiMacroContainer');
-        if (voronoiContainer) {
-            voronoiContainer.innerHTML = '<p class="text-center text-danger p-4">Failed to load voronoi data</p>';
+        showChartLoadError();
+    }
+}
+
+// Empty every chart and put an error message in the first chart of each tab.
+function showChartLoadError() {
+    document.querySelectorAll(
+        '.treemap-container, .stackedbar-container, .circlepack-container, .voronoi-container, .drv-bars-container, .radar-chart-container'
+    ).forEach(container => { container.innerHTML = ''; });
+    const messages = {
+        treemapContainer: 'Failed to load treemap data',
+        stackedBarMacroContainer: 'Failed to load stacked bar data',
+        circlePackMacroContainer: 'Failed to load circle packing data',
+        voronoiMacroContainer: 'Failed to load voronoi data',
+        drvMacros: 'Failed to load % DRV data',
+        radarChartContainer: 'Failed to load radar chart data'
+    };
+    for (const [id, message] of Object.entries(messages)) {
+        const container = document.getElementById(id);
+        if (container) {
+            container.innerHTML = `<p class="text-center text-danger p-4">${message}</p>`;
         }
     }
 }
@@ -0,0 +1,96 @@
+/* ========================================================================
+ * COMPACT WIRE FORMATS
+ * Decoders for the compact /api/food payloads served by the Flask app
+ * (layouts documented in utils/wire_format.py). Each reader also accepts a
+ * plain JSON response, so backends that ignore the Accept header (such as
+ * the Cloudflare Worker) keep working.
+ * Dependencies: none
+ * ======================================================================== */
+const SANKEY_COLUMNAR_MIMETYPE = 'application/x-sankey-columnar';
+const NUTRIENT_VECTOR_MIMETYPE = 'application/x-nutrient-vector+json';
+const SANKEY_ACCEPT = `${SANKEY_COLUMNAR_MIMETYPE}, application/json;q=0.9`;
+const NUTRIENT_VECTOR_ACCEPT = `${NUTRIENT_VECTOR_MIMETYPE}, application/json;q=0.9`;
+
+const SANKEY_MAGIC = 'SNK1';
+const SANKEY_HEADER_BYTES = 12;
+const wireTextDecoder = new TextDecoder('utf-8');
+
+function pad4(size) {
+    return (4 - (size % 4)) % 4;
+}
+
+// Rebuild {nodes, links} from a columnar Sankey buffer
+function decodeSankeyColumnar(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== SANKEY_MAGIC) throw new Error(`Not a columnar Sankey payload (magic ${magic})`);
+    const nodeCount = view.getUint16(4, true);
+    const linkCount = view.getUint16(6, true);
+    const namesSize = view.getUint32(8, true);
+
+    let offset = SANKEY_HEADER_BYTES;
+    const names = nodeCount ? wireTextDecoder.decode(new Uint8Array(buffer, offset, namesSize)).split('\n') : [];
+    offset += namesSize + pad4(namesSize);
+
+    // Typed-array views need aligned offsets, which the layout guarantees on
+    // little-endian hosts; DataView covers the rest.
+    const littleEndian = new Uint8Array(new Uint16Array([1]).buffer)[0] === 1;
+    let sources, targets, values;
+    if (littleEndian) {
+        sources = new Uint16Array(buffer, offset, linkCount);
+        targets = new Uint16Array(buffer, offset + 2 * linkCount, linkCount);
+        values = new Float32Array(buffer, offset + 4 * linkCount + pad4(4 * linkCount), linkCount);
+    } else {
+        sources = new Array(linkCount);
+        targets = new Array(linkCount);
+        values = new Array(linkCount);
+        const valuesOffset = offset + 4 * linkCount + pad4(4 * linkCount);
+        for (let i = 0; i < linkCount; i++) {
+            sources[i] = view.getUint16(offset + 2 * i, true);
+            targets[i] = view.getUint16(offset + 2 * (linkCount + i), true);
+            values[i] = view.getFloat32(valuesOffset + 4 * i, true);
+        }
+    }
+
+    const nodes = names.map((name, i) => ({ node: i, name }));
+    const links = new Array(linkCount);
+    for (let i = 0; i < linkCount; i++) {
+        links[i] = { source: sources[i], target: targets[i], value: values[i] };
+    }
+    return { nodes, links };
+}
+
+// Rebuild a USDA-shaped record (foodNutrients entries) from a nutrient vector
+function expandNutrientVector(vector) {
+    const foodNutrients = vector.names.map((name, i) => {
+        const nutrient = { name };
+        if (vector.ids[i] !== null && vector.ids[i] !== undefined) nutrient.id = vector.ids[i];
+        return { nutrient, amount: vector.amounts[i] };
+    });
+    return {
+        fdcId: vector.fdcId,
+        description: vector.description,
+        dataType: vector.dataType,
+        foodPortions: vector.foodPortions,
+        portions: vector.portions,
+        foodNutrients
+    };
+}
+
+function responseMimetype(response) {
+    return (response.headers.get('Content-Type') || '').split(';')[0].trim();
+}
+
+// Read a /api/food response as {nodes, links}, columnar or JSON
+async function readSankeyResponse(response) {
+    if (responseMimetype(response) === SANKEY_COLUMNAR_MIMETYPE) {
+        return decodeSankeyColumnar(await response.arrayBuffer());
+    }
+    return response.json();
+}
+
+// Read a /api/food/<id>/raw response as a USDA-shaped record, vector or full JSON
+async function readFoodRecordResponse(response) {
+    const data = await response.json();
+    return data && data.format === 'nutrient-vector' ? expandNutrientVector(data) : data;
+}
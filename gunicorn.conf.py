@@ -0,0 +1,27 @@
+"""
+gunicorn settings; `gunicorn app:app` reads this file from the working directory.
+
+By default the master imports the app and runs app.warm_start() before forking
+any worker. Workers then start in milliseconds and share the imported modules,
+nutrient tables and local-index-backed indexes copy-on-write, instead of each
+rebuilding them. The SQLite tiers, the async client and the sampling profiler
+already reopen or restart per process after fork.
+
+GUNICORN_PRELOAD=0 makes every worker import the app itself. Use it when code
+should reload on HUP, which a preloaded master cannot do.
+"""
+import gc
+import os
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").lower() not in ("0", "false", "no")
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app import warm_start
+
+    warm_start()
+    # Objects created so far live as long as the master. Freezing them keeps the
+    # workers' garbage collections from writing to, and so copying, their pages.
+    gc.freeze()
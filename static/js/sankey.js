@@ -114,6 +114,7 @@ const nodeColor = {
     "Fiber": "#CC9A2E",
     "Starch": "#CC9A2E",
     "Minerals": "#9370DB",
+    "Sodium": "#9370DB",
 };
 
 // Base link colors - we'll look up both directions
@@ -123,6 +124,7 @@ const linkColorBase = {
     "Total-Carbs": "#CC9A2E",
     "Total-Fat": "#B22222",
     "Total-Minerals": "#9370DB",
+    "Total-Sodium": "#9370DB",
     "Fat-Mono": "#B22222",
     "Fat-Sat.": "#B22222",
     "Fat-Poly": "#B22222",
@@ -132,6 +134,10 @@ const linkColorBase = {
     "Poly-Fatty Acids": "#B22222",
     "Trans-Fatty Acids": "#8B0000",
     "Fat-Other Fats": "#B22222", 
+    "Total-Sat.": "#B22222",
+    "Total-Mono": "#B22222",
+    "Total-Poly": "#B22222",
+    "Total-Trans": "#8B0000",
     "Carbs-Starch": "#CC9A2E", 
     "Carbs-Sugars": "#CC9A2E", 
     "Carbs-Fiber": "#CC9A2E",
@@ -0,0 +1,37 @@
+import json
+import os
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture(scope="session")
+def sample_foods():
+    """The SR Legacy records in fixtures/fdc_sample.json, by fdcId."""
+    with open(os.path.join(FIXTURES, "fdc_sample.json"), encoding="utf-8") as fh:
+        return {food["fdcId"]: food for food in json.load(fh)["SRLegacyFoods"]}
+
+
+@pytest.fixture
+def client(monkeypatch, sample_foods):
+    """
+    Flask test client whose USDA lookups are served from sample_foods, with an
+    empty payload store.
+    """
+    import app as app_module
+    from utils.payload_store import PayloadStore
+
+    def get_food_data(food_id, request_id=None):
+        try:
+            return sample_foods[int(str(food_id).strip())]
+        except (KeyError, ValueError):
+            return {"error": f"USDA food {food_id} not found", "status": 404}
+
+    def get_foods_data(food_ids, request_id=None):
+        return {str(food_id).strip(): get_food_data(food_id) for food_id in food_ids}
+
+    monkeypatch.setattr(app_module, "get_food_data", get_food_data)
+    monkeypatch.setattr(app_module, "get_foods_data", get_foods_data)
+    monkeypatch.setattr(app_module, "payload_store", PayloadStore())
+    return app_module.app.test_client()
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+ALMONDS = 170567
+
+
+@pytest.mark.parametrize("portion", ["nan", "NaN", "inf", "-inf", "1e400", "0", "-5", "abc"])
+@pytest.mark.parametrize("path", [f"/api/food/{ALMONDS}", f"/api/food/{ALMONDS}/bundle", "/api/export?q=almond"])
+def test_invalid_portions_are_rejected(client, path, portion):
+    sep = "&" if "?" in path else "?"
+    response = client.get(f"{path}{sep}portion={portion}")
+    assert response.status_code == 400
+    assert "portion" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("path", ["/api/foods", "/api/compare"])
+@pytest.mark.parametrize("portion", ["nan", "inf", {str(ALMONDS): "nan"}, {str(ALMONDS): 1e400}])
+def test_batch_routes_reject_non_finite_portions(client, path, portion):
+    response = client.post(path, json={"ids": [ALMONDS], "portion": portion})
+    assert response.status_code == 400
+
+
+def test_finite_portion_scales_the_payload(client):
+    response = client.get(f"/api/food/{ALMONDS}?portion=28.5")
+    assert response.status_code == 200
+    # Strict JSON: no NaN or Infinity literals.
+    body = json.loads(response.get_data(as_text=True), parse_constant=pytest.fail)
+    full = client.get(f"/api/food/{ALMONDS}").get_json()
+    assert body["links"][0]["value"] == pytest.approx(full["links"][0]["value"] * 0.285, rel=1e-3)
+
+
+@pytest.mark.parametrize("path", ["/api/foods", "/api/compare"])
+def test_batch_routes_share_request_parsing(client, path):
+    import app
+
+    assert client.get(path).status_code == 400
+    assert client.post(path, json={"ids": "170567"}).status_code == 400
+    too_many = max(app.MAX_BATCH_FOODS, app.MAX_COMPARE_FOODS) + 1
+    assert client.post(path, json={"ids": list(range(too_many))}).status_code == 400
+
+    by_get = client.get(f"{path}?ids=170567, 171705&portion=28&neighbors=0").get_json()
+    by_post = client.post(path, json={"ids": ["170567", 171705], "portion": {"170567": 28}, "neighbors": 0}).get_json()
+    assert [food["portion"] for food in by_get["foods"]] == [28.0, 28.0]
+    assert [food["portion"] for food in by_post["foods"]] == [28.0, 100.0]
+
+
+def test_compare_drops_repeated_ids(client):
+    body = client.get("/api/compare?ids=170567,170567,171705&neighbors=0").get_json()
+    assert [food["fdcId"] for food in body["foods"]] == [170567, 171705]
@@ -0,0 +1,73 @@
+import itertools
+import random
+
+import pytest
+
+from benchmarks.corpus import generate_food
+from benchmarks.golden_transform import edge_cases
+from utils.batch_transformer import ID_TO_SLOT, transform_to_sankey_batch
+from utils.data_transformer import transform_to_sankey
+
+# (reverse_hierarchy, show_sodium, show_fat_breakdown)
+OPTION_SETS = list(itertools.product((False, True), repeat=3))
+
+
+def _entry(nutrient_id, name, amount):
+    nutrient = {"name": name}
+    if nutrient_id is not None:
+        nutrient["id"] = nutrient_id
+    return {"nutrient": nutrient, "amount": amount}
+
+
+def _foods():
+    foods = edge_cases()
+    foods += [
+        {"fdcId": 20, "description": "No foodNutrients key"},
+        {"fdcId": 21, "description": "foodNutrients is None", "foodNutrients": None},
+        {"fdcId": 22, "description": "Ids outside the spec", "foodNutrients": [
+            _entry(1003, "Protein", 4.5),
+            _entry(1234, "Not in the spec", 50),
+            _entry(len(ID_TO_SLOT) + 10, "Past the end of the slot table", 60),
+            _entry(10 ** 9, "Huge id", 70),
+            _entry(1004, "Total lipid (fat)", 2.5),
+        ]},
+        {"fdcId": 23, "description": "Duplicate ids across slots", "foodNutrients": [
+            _entry(1004, "Total lipid (fat)", 0), _entry(1004, "Total lipid (fat)", 9),
+            _entry(1093, "Sodium, Na", 100), _entry(1093, "Sodium, Na", 900), _entry(1007, "Ash", 1.2),
+            _entry(1051, "Water", 60), _entry(1051, "Water", 1),
+        ]},
+        {"fdcId": 24, "description": "Entry without a nutrient", "foodNutrients": [
+            {"amount": 3}, _entry(1003, "Protein", 7), {"nutrient": None, "amount": 1},
+        ]},
+    ]
+    rng = random.Random(3)
+    foods += [generate_food(rng, 190000 + i, large=i % 3 == 0) for i in range(9)]
+    return foods
+
+
+FOODS = _foods()
+
+
+@pytest.mark.parametrize("options", OPTION_SETS, ids=lambda o: "".join(str(int(x)) for x in o))
+def test_batch_matches_the_single_food_transform(options):
+    batch = transform_to_sankey_batch(FOODS, *options)
+    assert len(batch) == len(FOODS)
+    for food, payload in zip(FOODS, batch):
+        assert payload == transform_to_sankey(food, *options), food["description"]
+
+
+def test_each_food_is_transformed_on_its_own():
+    # Slots must not leak between rows: a food alone and inside a batch agree.
+    alone = transform_to_sankey_batch([FOODS[-1]])
+    assert transform_to_sankey_batch(FOODS)[-1] == alone[0]
+
+
+def test_empty_batch():
+    assert transform_to_sankey_batch([]) == []
+    assert transform_to_sankey_batch([{"foodNutrients": []}]) == [transform_to_sankey({"foodNutrients": []})]
+
+
+def test_payloads_do_not_share_node_dicts():
+    first, second = transform_to_sankey_batch(FOODS[:2])
+    first["nodes"][0]["name"] = "changed"
+    assert second["nodes"][0]["name"] != "changed"
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+
+import pytest
+
+from utils.cache import LRUCache, SQLiteCache, TieredCache, _Entry
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def _fetcher(*values):
+    calls = []
+    values = list(values)
+
+    def fetch():
+        calls.append(1)
+        return values.pop(0) if len(values) > 1 else values[0]
+
+    fetch.calls = calls
+    return fetch
+
+
+def test_fresh_entry_is_served_without_fetching(clock):
+    cache = TieredCache(clock=clock)
+    fetch = _fetcher({"v": 1}, {"v": 2})
+    assert cache.get_or_fetch("k", fetch, ttl=60) == {"v": 1}
+    clock.now += 59
+    assert cache.get_or_fetch("k", fetch, ttl=60) == {"v": 1}
+    assert len(fetch.calls) == 1
+    assert cache.snapshot()["hits"] == 1
+
+
+def test_expired_entry_is_refetched(clock):
+    cache = TieredCache(clock=clock)
+    fetch = _fetcher({"v": 1}, {"v": 2})
+    cache.get_or_fetch("k", fetch, ttl=60)
+    clock.now += 61
+    assert cache.get_or_fetch("k", fetch, ttl=60) == {"v": 2}
+    assert cache.snapshot()["misses"] == 2
+
+
+def test_negative_entries_use_negative_ttl_and_other_errors_are_not_cached(clock):
+    cache = TieredCache(clock=clock)
+    missing = _fetcher({"error": "not found", "status": 404})
+    cache.get_or_fetch("404", missing, ttl=3600, negative_ttl=10)
+    cache.get_or_fetch("404", missing, ttl=3600, negative_ttl=10)
+    assert len(missing.calls) == 1
+    clock.now += 11
+    cache.get_or_fetch("404", missing, ttl=3600, negative_ttl=10)
+    assert len(missing.calls) == 2
+
+    failing = _fetcher({"error": "upstream", "status": 503})
+    cache.get_or_fetch("503", failing, ttl=3600, negative_ttl=10)
+    cache.get_or_fetch("503", failing, ttl=3600, negative_ttl=10)
+    assert len(failing.calls) == 2
+
+
+def test_stale_entry_is_served_while_one_background_refresh_runs(clock):
+    cache = TieredCache(clock=clock)
+    cache.get_or_fetch("k", lambda: {"v": 1}, ttl=60, stale_ttl=600)
+    clock.now += 120
+
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch():
+        calls.append(1)
+        release.wait(5)
+        return {"v": 2}
+
+    # Both reads get the stale copy; only the first starts a refresh.
+    assert cache.get_or_fetch("k", slow_fetch, ttl=60, stale_ttl=600) == {"v": 1}
+    assert cache.get_or_fetch("k", slow_fetch, ttl=60, stale_ttl=600) == {"v": 1}
+    release.set()
+    deadline = time.monotonic() + 5
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(calls) == 1
+    assert cache.peek("k") == {"v": 2}
+    stats = cache.snapshot()
+    assert stats["staleHits"] == 2 and stats["refreshes"] == 1
+
+
+def test_failed_refresh_keeps_the_stale_copy(clock):
+    cache = TieredCache(clock=clock)
+    cache.get_or_fetch("k", lambda: {"v": 1}, ttl=60, stale_ttl=600)
+    clock.now += 120
+    cache._refreshing.add("k")
+    cache._refresh("k", lambda: {"error": "upstream", "status": 503}, 60, 600, 0)
+    assert cache.peek("k") == {"v": 1}
+    assert not cache._refreshing
+
+
+def test_peek_include_expired_returns_entries_past_the_stale_window(clock):
+    cache = TieredCache(clock=clock)
+    cache.put("k", {"v": 1}, ttl=60, stale_ttl=60)
+    clock.now += 200
+    assert cache.peek("k") is None
+    assert cache.peek("k", include_expired=True) == {"v": 1}
+
+
+def test_lru_evicts_least_recently_used_by_size():
+    lru = LRUCache(max_bytes=30)
+    for key in ("a", "b", "c"):
+        lru.set(key, _Entry(key, 10, 0, 60, 0))
+    lru.get("a")
+    lru.set("d", _Entry("d", 10, 0, 60, 0))
+    assert lru.get("b") is None
+    assert all(lru.get(key) is not None for key in ("a", "c", "d"))
+    assert lru.current_bytes == 30 and lru.evictions == 1
+
+
+def test_lru_skips_values_larger_than_the_budget():
+    lru = LRUCache(max_bytes=30)
+    lru.set("a", _Entry("a", 10, 0, 60, 0))
+    lru.set("big", _Entry("big", 31, 0, 60, 0))
+    assert lru.get("big") is None and lru.get("a") is not None
+
+
+def test_disk_tier_serves_entries_evicted_from_memory(clock, db_path):
+    cache = TieredCache(max_bytes=1, disk_path=db_path, clock=clock)
+    cache.put("k", {"v": 1}, ttl=60)
+    assert len(cache.memory) == 0
+    assert cache.peek("k") == {"v": 1}
+    assert cache.snapshot()["diskHits"] == 1
+
+
+def test_invalidate_and_clear_reach_the_disk_tier(clock, db_path):
+    cache = TieredCache(disk_path=db_path, clock=clock)
+    cache.put("a", {"v": 1}, ttl=60)
+    cache.put("b", {"v": 2}, ttl=60)
+    cache.invalidate("a")
+    assert cache.peek("a") is None
+    assert cache.peek("b") == {"v": 2}
+    cache.clear()
+    assert cache.peek("b") is None
+    assert cache.disk.get("b") is None
+
+
+def test_expired_disk_rows_are_purged_every_nth_write(clock, db_path):
+    cache = TieredCache(disk_path=db_path, purge_every=3, clock=clock)
+    cache.put("old", {"v": 1}, ttl=10)
+    clock.now += 100
+    cache.put("new1", {"v": 2}, ttl=10)
+    assert cache.disk.get("old") is not None
+    cache.put("new2", {"v": 3}, ttl=10)
+    assert cache.disk.get("old") is None
+    assert cache.disk.get("new1") is not None
+    assert cache.snapshot()["purged"] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_sqlite_connection_is_reopened_after_fork(db_path):
+    disk = SQLiteCache(db_path)
+    disk.set("parent", b'{"v":1}', 0, 60, 0)
+    parent_conn = disk._conn()
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            if disk._conn() is not parent_conn and disk.get("parent") is not None:
+                disk.set("child", b'{"v":2}', 0, 60, 0)
+                code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert disk._conn() is parent_conn
+    assert disk.get("child") is not None
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from utils.chart_bundle import build_chart_bundle, build_voronoi_bundle, parse_nutrients, treemap_hierarchies
+
+DOCS_JS = os.path.join(os.path.dirname(__file__), "..", "docs", "js")
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "fdc_sample.json")
+
+
+@pytest.fixture(scope="module")
+def food():
+    with open(FIXTURE, encoding="utf-8") as fh:
+        foods = json.load(fh)["SRLegacyFoods"]
+    return next(food for food in foods if food["fdcId"] == 170567)
+
+
+def test_bundle_carries_only_what_the_page_reads(food):
+    bundle = build_chart_bundle(food, portion=28.0)
+    assert set(bundle) == {"fdcId", "description", "dataType", "portion", "portions", "nutrients"}
+    assert bundle["nutrients"]["protein"] == pytest.approx(21.15 * 0.28)
+    assert bundle["portions"][0]["id"] is None
+
+
+def test_voronoi_layouts_cover_every_hierarchy_at_100g(food):
+    layouts = build_voronoi_bundle(food)["layouts"]
+    treemaps = treemap_hierarchies(parse_nutrients(food))
+    assert {chart: set(variants) for chart, variants in layouts.items()} == {
+        chart: set(variants) for chart, variants in treemaps.items()
+    }
+    cells = layouts["macro"]["detailed"]["cells"]
+    assert [cell["value"] for cell in cells] == sorted((cell["value"] for cell in cells), reverse=True)
+    assert sum(cell["share"] for cell in cells) == pytest.approx(1, abs=0.02)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_client_items_match_the_server_cells(food):
+    # renderCircularVoronoi only uses the server's cells when its own items carry
+    # the same names in the same order.
+    nutrients = parse_nutrients(food)
+    script = """
+const fs = require('fs');
+const vm = require('vm');
+// Enough of the page for treemap.js to load; only its builders are called.
+const ctx = {
+    console,
+    document: { getElementById: () => null, addEventListener() {}, querySelectorAll: () => [] },
+    window: { addEventListener() {} },
+};
+vm.createContext(ctx);
+const source = ['config.js', 'treemap.js'].map(name => fs.readFileSync(process.argv[1] + '/' + name, 'utf8')).join('\\n');
+// Top-level let/const are not context properties; var is.
+vm.runInContext(source.replace(/^(let|const) /mg, 'var '), ctx);
+const n = JSON.parse(process.argv[2]);
+const out = {};
+for (const salt of [false, true]) {
+    ctx.showSodiumSeparately = salt;
+    for (const detailed of [false, true]) {
+        const suffix = salt ? '+salt' : '';
+        const charts = {
+            macro: ctx.buildMacroTreemapData(n, detailed),
+            fat: ctx.buildFatTreemapData(n),
+            carbs: ctx.buildCarbsTreemapData(n),
+            protein: ctx.buildProteinTreemapData(n, detailed),
+            micronutrients: ctx.buildMicronutrientsTreemapData(n, detailed),
+            minerals: ctx.buildMineralsTreemapData(n, detailed),
+            vitamins: ctx.buildVitaminsTreemapData(n, detailed),
+        };
+        for (const [chart, data] of Object.entries(charts)) {
+            const variant = (chart === 'fat' || chart === 'carbs') ? 'detailed'
+                : (detailed ? 'detailed' : 'summary') + (chart === 'micronutrients' || chart === 'minerals' ? suffix : '');
+            out[chart + '/' + variant] = ctx.flattenVoronoiItems(data).sort((a, b) => b.value - a.value).map(item => item.name);
+        }
+    }
+}
+console.log(JSON.stringify(out));
+"""
+    proc = subprocess.run(
+        ["node", "-e", script, DOCS_JS, json.dumps(nutrients)], capture_output=True, text=True, check=True,
+    )
+    layouts = build_voronoi_bundle(food)["layouts"]
+    for key, names in json.loads(proc.stdout).items():
+        chart, variant = key.split("/")
+        layout = layouts[chart][variant]
+        assert ([cell["name"] for cell in layout["cells"]] if layout else []) == names, key
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_failed_portion_refetch_replaces_the_charts_with_an_error():
+    script = """
+const fs = require('fs');
+const vm = require('vm');
+const elements = {};
+const element = id => (elements[id] = elements[id] || { id, innerHTML: 'old chart', value: '0.28', selectedIndex: 1 });
+const cleared = [];
+const ctx = {
+    console: { error() {}, log() {} },
+    document: {
+        getElementById: element,
+        addEventListener() {},
+        querySelectorAll: () => ['fatTreemapContainer', 'drvVitamins'].map(id => { cleared.push(id); return element(id); }),
+    },
+    window: { addEventListener() {}, updateDRVBarGraphs: n => { ctx.drv = n; }, updateRadarChartData: n => { ctx.radar = n; } },
+    fetch: async () => ({ status: 500, ok: false }),
+};
+vm.createContext(ctx);
+const source = ['config.js', 'treemap.js'].map(name => fs.readFileSync(process.argv[1] + '/' + name, 'utf8')).join('\\n');
+vm.runInContext(source.replace(/^(let|const) /mg, 'var '), ctx);
+vm.runInContext("currentFoodData = { description: 'Almonds' }; currentBundleFoodId = 170567; currentTreemapData = { protein: 21 }; availablePortions = [{ id: null }, { id: 7 }];", ctx);
+ctx.handlePortionChange().then(() => {
+    console.log(JSON.stringify({
+        data: vm.runInContext('currentTreemapData', ctx),
+        drv: ctx.drv, radar: ctx.radar, cleared,
+        treemap: elements.treemapContainer.innerHTML, fat: elements.fatTreemapContainer.innerHTML,
+    }));
+});
+"""
+    proc = subprocess.run(["node", "-e", script, DOCS_JS], capture_output=True, text=True, check=True)
+    state = json.loads(proc.stdout)
+    assert state["data"] is None and state["drv"] is None and state["radar"] is None
+    assert "Failed to load treemap data" in state["treemap"]
+    assert state["fat"] == "" and state["cleared"] == ["fatTreemapContainer", "drvVitamins"]
@@ -0,0 +1,198 @@
+import os
+import subprocess
+import sys
+from array import array
+
+import numpy as np
+import pytest
+
+from benchmarks.golden_transform import build_cases
+from utils import compare, usda_api
+from utils.compare import VECTOR_FIELDS, NeighborIndex, compare_foods, vector_matrix
+from utils.data_transformer import transform_to_sankey
+from utils.nutrient_spec import derive_values, resolve_quantities
+from utils.typeahead import TypeaheadIndex
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+FOODS = build_cases()
+ALMONDS, ALMOND_BUTTER, APPLE = 170567, 171705, 169910
+
+
+def _links(payload, food=None):
+    # {(source, target): value} of a Sankey, or of one food's column in a comparison.
+    if food is None:
+        return {(link["source"], link["target"]): link["value"] for link in payload["links"]}
+    return {(link["source"], link["target"]): link["values"][food] for link in payload["links"] if link["values"][food] > 0}
+
+
+def test_vectors_follow_vector_fields():
+    matrix = vector_matrix(FOODS)
+    assert matrix.shape == (len(FOODS), len(VECTOR_FIELDS))
+    for food, row in zip(FOODS, matrix):
+        values = derive_values(resolve_quantities(food.get("foodNutrients") or []))
+        assert row.tolist() == pytest.approx([values[name] for name in VECTOR_FIELDS])
+    assert vector_matrix([]).shape == (0, len(VECTOR_FIELDS))
+
+
+@pytest.mark.parametrize("options", [(False, False, True), (True, True, False), (False, True, True)])
+def test_comparison_links_match_each_food_sankey(options):
+    foods = FOODS[:8]
+    portions = [None, 28.0] * 4
+    comparison = compare_foods(foods, portions, *options)
+    assert comparison["nodes"] == transform_to_sankey(foods[0], *options)["nodes"]
+    for i, (food, portion) in enumerate(zip(foods, portions)):
+        expected = {key: value for key, value in _links(transform_to_sankey(food, *options, portion=portion)).items() if value > 0}
+        assert _links(comparison, i) == pytest.approx(expected)
+    for link in comparison["links"]:
+        assert link["deltas"] == pytest.approx([value - link["values"][0] for value in link["values"]])
+
+
+def test_distances_are_measured_per_100g_from_the_first_food():
+    vectors = vector_matrix(FOODS[:5])
+    comparison = compare_foods(FOODS[:5], portions=[500.0, None, 10.0, None, None])
+    assert comparison["distances"][0] == 0
+    assert comparison["distances"] == pytest.approx(np.linalg.norm(vectors - vectors[0], axis=1).tolist())
+
+
+def test_merged_sankey_keeps_a_total_node_per_food():
+    foods = FOODS[:3]
+    comparison = compare_foods(foods)
+    merged = comparison["merged"]
+    names = [node["name"] for node in merged["nodes"]]
+    assert names[:3] == [food["description"] for food in foods] and "Total" not in names
+    for i in range(3):
+        assert sum(link["value"] for link in merged["links"] if link["source"] == i) == pytest.approx(
+            sum(link["values"][i] for link in comparison["links"] if link["source"] == 0)
+        )
+
+
+def test_empty_comparison():
+    comparison = compare_foods([])
+    assert comparison["links"] == [] and comparison["distances"] == []
+
+
+def _brute_force(vectors, query, ids, limit, exclude=()):
+    distances = np.linalg.norm(vectors - query, axis=1)
+    order = sorted((d, fdc_id) for d, fdc_id in zip(distances, ids) if fdc_id not in exclude)
+    return [fdc_id for _, fdc_id in order[:limit]]
+
+
+def test_nearest_matches_a_brute_force_ranking():
+    foods = [dict(food, fdcId=1000 + i) for i, food in enumerate(FOODS) if food.get("foodNutrients")]
+    index = NeighborIndex()
+    assert index.add_many(foods) == len(foods)
+    vectors = vector_matrix(foods).astype(np.float64)
+    ids = [food["fdcId"] for food in foods]
+    queries = vector_matrix(FOODS[:6])
+    for limit in (1, 3, len(foods) + 5):
+        results = index.nearest(queries, limit=limit, exclude=[1000, 1003])
+        for query, matches in zip(queries, results):
+            assert [m["fdcId"] for m in matches] == _brute_force(vectors, query, ids, limit, {1000, 1003})
+            assert [m["distance"] for m in matches] == sorted(m["distance"] for m in matches)
+            expected = np.linalg.norm(vectors - query, axis=1)
+            for match in matches:
+                assert match["distance"] == pytest.approx(expected[ids.index(match["fdcId"])], rel=1e-4, abs=1e-3)
+
+
+def test_index_keeps_first_copy_and_caps_entries(monkeypatch):
+    monkeypatch.setattr(compare, "INITIAL_CAPACITY", 2)
+    index = NeighborIndex(max_entries=5)
+    foods = [dict(food, fdcId=2000 + i) for i, food in enumerate(FOODS[:7]) if food.get("foodNutrients")]
+    assert index.add_many(foods[:3] + [{"fdcId": "x"}, {"fdcId": 3000, "foodNutrients": []}]) == 3
+    assert index.add_many(foods[:3]) == 0
+    assert index.add_many(foods) == 2
+    assert len(index) == 5
+    only = index.nearest(vector_matrix(foods[:1]), limit=10)[0]
+    assert sorted(m["fdcId"] for m in only) == [food["fdcId"] for food in foods[:5]]
+    assert only[0]["fdcId"] == foods[0]["fdcId"] and only[0]["distance"] == pytest.approx(0, abs=1e-3)
+
+
+def test_empty_index_and_zero_limit():
+    index = NeighborIndex()
+    query = vector_matrix(FOODS[:2])
+    assert index.nearest(query) == [[], []]
+    index.add_many(FOODS[5:9])
+    assert index.nearest(query, limit=0) == [[], []]
+
+
+def test_loader_fills_the_index_from_packed_vectors(sample_foods):
+    def loader():
+        for food in sample_foods.values():
+            entries = [e for e in food["foodNutrients"] if e.get("nutrient", {}).get("id") is not None]
+            yield (
+                food["fdcId"], food["description"], food.get("dataType"),
+                array("i", (e["nutrient"]["id"] for e in entries)), array("d", (e.get("amount") or 0 for e in entries)),
+            )
+
+    index = NeighborIndex(loader=loader)
+    index.preload()
+    assert len(index) == len(sample_foods)
+    almonds = sample_foods[ALMONDS]
+    matches = index.nearest(vector_matrix([almonds]), limit=2, exclude=[ALMONDS])[0]
+    assert [m["fdcId"] for m in matches] == [ALMOND_BUTTER, APPLE]
+    assert matches[0]["description"] == sample_foods[ALMOND_BUTTER]["description"]
+    # Records added later are checked against the loaded ids.
+    assert index.add_many(sample_foods.values()) == 0
+
+
+def test_compare_route(client, monkeypatch, sample_foods):
+    index = NeighborIndex()
+    index.add_many(sample_foods.values())
+    monkeypatch.setattr(usda_api, "neighbor_index", index)
+    response = client.post("/api/compare", json={"ids": [ALMONDS, APPLE, 1], "portion": {str(ALMONDS): 28}, "neighbors": 1})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [food["fdcId"] for food in body["foods"]] == [ALMONDS, APPLE]
+    assert [food["portion"] for food in body["foods"]] == [28.0, 100.0]
+    assert body["foods"][0]["distance"] == 0 and body["foods"][1]["distance"] > 0
+    assert [[m["fdcId"] for m in food["similar"]] for food in body["foods"]] == [[ALMOND_BUTTER], [ALMOND_BUTTER]]
+    assert body["errors"] == [{"fdcId": "1", "error": "USDA food 1 not found", "status": 404}]
+    assert body["nodes"] == transform_to_sankey(sample_foods[ALMONDS])["nodes"]
+
+
+@pytest.mark.parametrize("query", ["ids=", f"ids={ALMONDS}&neighbors=many", f"ids={ALMONDS}&portion=nan"])
+def test_compare_route_rejects_bad_parameters(client, query):
+    assert client.get(f"/api/compare?{query}").status_code == 400
+
+
+def test_lookups_leave_the_neighbor_index_alone(monkeypatch, sample_foods):
+    monkeypatch.setattr(usda_api, "local_index", None)
+    monkeypatch.setattr(usda_api, "neighbor_index", None)
+    monkeypatch.setattr(usda_api, "suggest_index", TypeaheadIndex())
+    monkeypatch.setattr(usda_api, "USE_ASYNC_CLIENT", False)
+    monkeypatch.setattr(usda_api, "response_cache", usda_api.TieredCache())
+    monkeypatch.setattr(usda_api, "_get_food_data", lambda food_id, request_id=None: sample_foods[int(food_id)])
+    monkeypatch.setattr(usda_api, "_get_foods_batch", lambda ids, request_id=None: {i: sample_foods[int(i)] for i in ids})
+
+    # Before /api/compare nothing creates the index.
+    usda_api.get_food_data(str(ALMONDS))
+    usda_api.get_foods_data([str(APPLE)])
+    assert usda_api.neighbor_index is None
+
+    usda_api.similar_foods([sample_foods[ALMONDS]])
+    index = usda_api.neighbor_index
+    assert index is not None and len(index) == 0
+    # Cache hits and exports do not add to it; fresh fetches do.
+    usda_api.get_food_data(str(ALMONDS))
+    usda_api.get_foods_data([str(APPLE)])
+    usda_api.get_foods_data([str(ALMOND_BUTTER)], index=False)
+    assert len(index) == 0
+    monkeypatch.setattr(usda_api, "response_cache", usda_api.TieredCache())
+    usda_api.get_food_data(str(ALMONDS))
+    usda_api.get_foods_data([str(APPLE)])
+    assert len(index) == 2
+
+
+def test_food_routes_do_not_import_numpy():
+    script = """
+import sys
+import app
+from utils import usda_api
+usda_api._get_food_data = lambda food_id, request_id=None: {"fdcId": 1, "description": "x", "foodNutrients": []}
+client = app.app.test_client()
+assert client.get("/api/food/1").status_code == 200
+print("numpy" in sys.modules, usda_api.neighbor_index is None)
+"""
+    env = {**os.environ, "FOOD_INDEX_PATH": "", "USDA_CACHE_DB": "", "USDA_ASYNC_CLIENT": "", "PAYLOAD_STORE_DIR": ""}
+    proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert proc.stdout.split() == ["False", "True"]
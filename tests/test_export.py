@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from utils import export
+
+FDC_IDS = list(range(1000, 1000 + 7 * 35, 7))  # 35 foods, 5 per page
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    pages = []
+
+    def search_foods(query, page_size=10, page=1, **kwargs):
+        assert kwargs["sort_by"] == "fdcId"
+        pages.append(page)
+        hits = FDC_IDS[(page - 1) * page_size:page * page_size]
+        return {
+            "results": [{"fdcId": fdc_id, "description": f"food {fdc_id}"} for fdc_id in hits],
+            "totalPages": (len(FDC_IDS) + page_size - 1) // page_size,
+            "currentPage": page,
+        }
+
+    def get_foods_data(ids, request_id=None, index=True):
+        # Exports must not grow the in-memory indexes.
+        assert index is False
+        return {str(fdc_id): {"fdcId": fdc_id, "foodNutrients": []} for fdc_id in ids}
+
+    monkeypatch.setattr(export, "search_foods", search_foods)
+    monkeypatch.setattr(export, "get_foods_data", get_foods_data)
+    return pages
+
+
+def _export(resume_after=None):
+    records = export.iter_export_records("apple", resume_after=resume_after, page_size=5)
+    return [json.loads(line)["fdcId"] for line in export.iter_ndjson(records)]
+
+
+def _resume_page(resume_after):
+    return export.find_resume_page("apple", resume_after, page_size=5)
+
+
+def test_full_export_pages_through_every_hit(upstream):
+    assert _export() == FDC_IDS
+    assert upstream == [1, 2, 3, 4, 5, 6, 7]
+
+
+@pytest.mark.parametrize("position", [0, 3, 4, 5, 17, 33, 34])
+def test_resume_continues_after_the_last_written_id(upstream, position):
+    resume_after = FDC_IDS[position]
+    assert _export(resume_after) == FDC_IDS[position + 1:]
+
+
+def test_resume_page_is_found_by_binary_search(upstream):
+    assert _resume_page(FDC_IDS[0] - 1) == 1
+    assert _resume_page(FDC_IDS[4]) == 2
+    assert _resume_page(FDC_IDS[30]) == 7
+    assert _resume_page(FDC_IDS[-1]) == 8
+    upstream.clear()
+    _resume_page(FDC_IDS[30])
+    assert len(upstream) <= 4
+
+
+def test_resume_does_not_refetch_earlier_pages(upstream):
+    _export(FDC_IDS[27])
+    # Pages before the one holding the next id are only touched by the search.
+    assert upstream[-2:] == [6, 7]
+    assert upstream.count(1) == 1
+
+
+def test_last_exported_id_skips_a_partial_last_line(tmp_path):
+    path = tmp_path / "out.ndjson"
+    path.write_text('{"fdcId": 1}\n{"fdcId": 2}\n{"fdcId": 3, "sank')
+    export._truncate_partial_line(str(path))
+    assert export.last_exported_id(str(path)) == 2
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from utils import usda_api
+from utils.cache import TieredCache
+from utils.food_index import FoodIndex, ingest, open_index
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+JSON_DUMP = os.path.join(FIXTURES, "fdc_sample.json")
+CSV_DUMP = os.path.join(FIXTURES, "fdc_csv")
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("index") / "foods.sqlite3")
+    assert ingest([JSON_DUMP, CSV_DUMP], path) == 5
+    return FoodIndex(path)
+
+
+def _ids(result):
+    return [hit["fdcId"] for hit in result["results"]]
+
+
+def test_ingest_skips_unknown_csv_data_types(index):
+    assert index.get_food(2345003) is None
+    assert index.data_types() == {"SR Legacy", "Foundation", "Branded"}
+
+
+def test_get_food_from_json_dump(index):
+    food = index.get_food(170567)
+    assert food["description"] == "Nuts, almonds"
+    assert food["dataType"] == "SR Legacy"
+    assert "brandOwner" not in food
+    # Nutrients without an amount are dropped at ingest.
+    assert [(n["nutrient"]["id"], n["amount"]) for n in food["foodNutrients"]] == [
+        (1003, 21.15), (1004, 49.93), (1005, 21.55), (1093, 1.0),
+    ]
+    assert food["foodNutrients"][0]["nutrient"] == {"id": 1003, "name": "Protein", "number": "203", "unitName": "g"}
+    assert [p["gramWeight"] for p in food["foodPortions"]] == [143.0, 28.0]
+    assert food["foodPortions"][0]["modifier"] == "cup, whole"
+
+
+def test_get_food_from_csv_dump(index):
+    food = index.get_food(2345001)
+    assert food["dataType"] == "Foundation"
+    assert food["publicationDate"] == "2023-04-20"
+    assert {n["nutrient"]["id"]: n["amount"] for n in food["foodNutrients"]} == {1003: 20.4, 1004: 52.5, 1005: 19.3}
+    # Portions follow seq_num, with the measure unit name resolved.
+    assert [(p["id"], p["measureUnit"]["name"], p["gramWeight"]) for p in food["foodPortions"]] == [
+        (300001, "cup", 138.0), (300002, "oz", 28.35),
+    ]
+    branded = index.get_food(2345002)
+    assert branded["brandOwner"] == "Blue Grove Farms"
+    assert [n["nutrient"]["id"] for n in branded["foodNutrients"]] == [1003, 1004, 1093]
+
+
+def test_get_food_missing(index):
+    assert index.get_food(1) is None
+
+
+def test_search_matches_every_word_and_the_last_as_prefix(index):
+    assert set(_ids(index.search("almond"))) == {170567, 171705, 2345001, 2345002}
+    assert _ids(index.search("almond butt")) == [171705]
+    assert _ids(index.search("appl")) == [169910]
+    assert _ids(index.search("kiwi")) == []
+    assert index.search("  ")["totalPages"] == 0
+
+
+def test_search_matches_brand_owner(index):
+    assert _ids(index.search("blue grove")) == [2345002]
+
+
+def test_search_filters_by_data_type_and_pages_in_fdc_id_order(index):
+    assert set(_ids(index.search("almond", data_types=["Foundation", "Branded"]))) == {2345001, 2345002}
+    first = index.search("almond", page_size=3, page=1, sort_by="fdcId")
+    second = index.search("almond", page_size=3, page=2, sort_by="fdcId")
+    assert _ids(first) == [170567, 171705, 2345001]
+    assert _ids(second) == [2345002]
+    assert first["totalPages"] == 2 and second["currentPage"] == 2
+
+
+def test_iter_summaries_lists_branded_foods_last(index):
+    assert [row[0] for row in index.iter_summaries()] == [169910, 170567, 171705, 2345001, 2345002]
+    assert len(list(index.iter_summaries(limit=2))) == 2
+
+
+def test_open_index_missing_path(tmp_path):
+    assert open_index(None) is None
+    assert open_index(str(tmp_path / "missing.sqlite3")) is None
+
+
+@pytest.fixture
+def live_search(monkeypatch):
+    calls = []
+
+    def fake_search(query, **kwargs):
+        calls.append(kwargs.get("data_types"))
+        return {"results": [{"fdcId": 999, "description": "live"}], "totalPages": 1, "currentPage": 1}
+
+    monkeypatch.setattr(usda_api, "_search_foods", fake_search)
+    monkeypatch.setattr(usda_api, "USE_ASYNC_CLIENT", False)
+    monkeypatch.setattr(usda_api, "response_cache", TieredCache())
+    return calls
+
+
+def test_search_foods_uses_the_index_when_it_covers_the_data_types(index, monkeypatch, live_search):
+    monkeypatch.setattr(usda_api, "local_index", index)
+    result = usda_api.search_foods("almond butter", data_types=["SR Legacy"])
+    assert _ids(result) == [171705]
+    assert live_search == []
+
+
+def test_search_foods_falls_back_when_the_index_misses_a_data_type(index, monkeypatch, live_search):
+    monkeypatch.setattr(usda_api, "local_index", index)
+    # The defaults include Survey (FNDDS), which the fixture index does not hold.
+    assert _ids(usda_api.search_foods("almond")) == [999]
+    assert _ids(usda_api.search_foods("almond", data_types=["Foundation", "Experimental"])) == [999]
+    assert len(live_search) == 2
+
+
+def test_search_foods_falls_back_when_the_index_has_no_hits(index, monkeypatch, live_search):
+    monkeypatch.setattr(usda_api, "local_index", index)
+    assert _ids(usda_api.search_foods("kiwi", data_types=["Foundation"])) == [999]
+    assert live_search == [["Foundation"]]
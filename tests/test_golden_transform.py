@@ -0,0 +1,40 @@
+import json
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.golden_transform import GOLDEN_PATH, ROOT, batch_payloads, diff, python_payloads, worker_payloads
+from utils.nutrient_spec import SPEC_VERSION
+
+
+@pytest.fixture(scope="module")
+def golden():
+    with open(GOLDEN_PATH, encoding="utf-8") as fh:
+        golden = json.load(fh)
+    assert golden["specVersion"] == SPEC_VERSION, "golden file is stale; run `python -m benchmarks.golden_transform update`"
+    return golden
+
+
+def test_transform_matches_the_golden_file(golden):
+    foods = golden["foods"]
+    assert diff("python", golden["expected"], python_payloads(foods), foods) == []
+
+
+def test_batch_engine_matches_the_golden_file(golden):
+    foods = golden["foods"]
+    assert diff("batch", golden["expected"], batch_payloads(foods), foods) == []
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_worker_matches_the_golden_file(golden):
+    foods = golden["foods"]
+    assert diff("worker", golden["expected"], worker_payloads(foods), foods) == []
+
+
+def test_worker_tables_are_generated_from_the_spec():
+    proc = subprocess.run(
+        [sys.executable, "-m", "utils.nutrient_spec", "check"], cwd=ROOT, capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,43 @@
+import logging
+import sys
+
+from utils.log_config import LogfmtFormatter, _quote
+
+
+def _record(msg, *args, exc_info=None):
+    return logging.LogRecord("app", logging.WARNING, __file__, 1, msg, args, exc_info)
+
+
+def test_quote_leaves_bare_words_alone():
+    assert _quote("ok") == "ok"
+    assert _quote("status=404") == '"status=404"'
+    assert _quote("") == '""'
+
+
+def test_quote_escapes_backslashes_quotes_and_newlines():
+    assert _quote('say "hi"') == '"say \\"hi\\""'
+    assert _quote("a\\b c") == '"a\\\\b c"'
+    assert _quote("one\ntwo") == '"one\\ntwo"'
+
+
+def test_request_id_prefix_becomes_its_own_field():
+    line = LogfmtFormatter().format(_record("[%s] /api/food error id=%s", "abc123", 7))
+    assert " level=WARNING logger=app request_id=abc123 " in line
+    assert line.endswith(' msg="/api/food error id=7"')
+    assert "T" in line.split(" ")[0] and line.split(" ")[0].startswith("ts=")
+
+
+def test_missing_request_id_is_dropped():
+    line = LogfmtFormatter().format(_record("[None] warming"))
+    assert "request_id" not in line
+    assert line.endswith(" msg=warming")
+
+
+def test_exceptions_stay_on_one_line():
+    try:
+        raise ValueError('bad "value"')
+    except ValueError:
+        line = LogfmtFormatter().format(_record("failed", exc_info=sys.exc_info()))
+    assert "\n" not in line
+    assert line.split(" exc=", 1)[1].startswith('"Traceback')
+    assert 'ValueError: bad \\"value\\""' in line
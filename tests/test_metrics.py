@@ -0,0 +1,101 @@
+import os
+import re
+import subprocess
+import sys
+
+from utils import metrics
+from utils.metrics import CallbackMetric, Counter, Histogram, Registry
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+def test_counters_render_with_help_type_and_escaped_labels():
+    registry = Registry()
+    plain = Counter("jobs_total", "Jobs run.", registry=registry)
+    labelled = Counter("errors_total", "Errors, by kind.", ("kind",), registry=registry)
+    labelled.inc(kind='bad "quote"\\ok\nline')
+    labelled.inc(2.5, kind="timeout")
+    assert registry.render() == (
+        "# HELP jobs_total Jobs run.\n"
+        "# TYPE jobs_total counter\n"
+        "jobs_total 0\n"
+        "# HELP errors_total Errors, by kind.\n"
+        "# TYPE errors_total counter\n"
+        'errors_total{kind="bad \\"quote\\"\\\\ok\\nline"} 1\n'
+        'errors_total{kind="timeout"} 2.5\n'
+    )
+    assert plain.value() == 0 and labelled.value(kind="timeout") == 2.5
+
+
+def test_histogram_buckets_are_cumulative_with_inf_sum_and_count():
+    registry = Registry()
+    histogram = Histogram("latency_seconds", "Latency.", ("route",), buckets=(0.5, 0.1), registry=registry)
+    for value in (0.05, 0.1, 0.3, 7):
+        histogram.observe(value, route="/a")
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE latency_seconds histogram"
+    assert lines[2:] == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="0.5"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 7.45',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+    assert histogram.count(route="/a") == 4 and histogram.count(route="/b") == 0
+
+
+def test_callback_metrics_are_read_at_render_time():
+    registry = Registry()
+    stats = {"hits": 1}
+    CallbackMetric("store_total", "Store events.", ("event",), lambda: stats.items(), kind="counter", registry=registry)
+    CallbackMetric("pair", "Label tuples.", ("a", "b"), lambda: [(("x", 1), 2)], registry=registry)
+    stats["hits"] = 3
+    # A bare string is one label value, not a sequence of characters.
+    assert registry.render().splitlines()[1:] == [
+        "# TYPE store_total counter",
+        'store_total{event="hits"} 3',
+        "# HELP pair Label tuples.",
+        "# TYPE pair gauge",
+        'pair{a="x",b="1"} 2',
+    ]
+
+
+def test_server_timing_lists_phases_then_total_in_milliseconds():
+    assert metrics.server_timing({"fetch": 0.01234, "transform": 0.0005}, 0.02) == (
+        "fetch;dur=12.3, transform;dur=0.5, total;dur=20.0"
+    )
+    assert metrics.server_timing({}, 0.001) == "total;dur=1.0"
+
+
+def test_timed_adds_to_the_current_request_phases():
+    phases = metrics.start_request()
+    histogram = Histogram("block_seconds", "Block.", registry=None)
+    with metrics.timed(histogram, phase="fetch"):
+        pass
+    with metrics.timed(phase="fetch"):
+        pass
+    assert list(phases) == ["fetch"] and phases["fetch"] >= 0
+    assert histogram.count() == 1
+
+
+def test_food_responses_carry_server_timing(client):
+    response = client.get("/api/food/170567")
+    assert response.status_code == 200
+    entries = response.headers["Server-Timing"].split(", ")
+    assert entries[0].startswith("fetch;dur=")
+    assert entries[-1].startswith("total;dur=")
+    assert all(re.fullmatch(r"[a-z_]+;dur=\d+\.\d", entry) for entry in entries)
+
+
+def test_debug_routes_need_their_own_flags():
+    # /debug/profile stays unregistered while only the profiler is on.
+    script = "import app; print(sorted(r.rule for r in app.app.url_map.iter_rules() if r.rule in ('/metrics', '/debug/profile')))"
+
+    def run(**flags):
+        env = {**os.environ, "PROFILER_INTERVAL_MS": "10", "METRICS_ENABLED": "", "PROFILE_ENDPOINT_ENABLED": "", **flags}
+        proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        return proc.stdout.strip().splitlines()[-1]
+
+    assert run() == "[]"
+    assert run(METRICS_ENABLED="1") == "['/metrics']"
+    assert run(PROFILE_ENDPOINT_ENABLED="true") == "['/debug/profile']"
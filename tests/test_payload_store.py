@@ -0,0 +1,93 @@
+import os
+import time
+
+import pytest
+
+import app as app_module
+from utils.payload_store import PayloadStore, food_revision, payload_key
+
+FOOD = {
+    "fdcId": 170567,
+    "description": "Nuts, almonds",
+    "publicationDate": "4/1/2019",
+    "foodNutrients": [
+        {"nutrient": {"id": 1003, "name": "Protein", "unitName": "g"}, "amount": 21.15},
+        {"nutrient": {"id": 1004, "name": "Total lipid (fat)", "unitName": "g"}, "amount": 49.93},
+    ],
+    "foodPortions": [],
+}
+
+
+def test_food_revision_uses_dates_and_falls_back_to_a_hash():
+    assert food_revision(FOOD) == "170567@4/1/2019//"
+    undated = dict(FOOD, publicationDate=None)
+    assert food_revision(undated).startswith("170567#")
+    assert food_revision(undated) != food_revision(dict(undated, description="Almonds"))
+
+
+def test_payloads_are_built_once_and_stored_in_every_encoding(tmp_path):
+    store = PayloadStore(directory=str(tmp_path))
+    builds = []
+    key = payload_key(FOOD, "sankey", (1,))
+    first = store.get_or_build(key, lambda: builds.append(1) or {"a": 1})
+    second = store.get_or_build(key, lambda: builds.append(1) or {"a": 1})
+    assert first is second and builds == [1]
+    assert {"identity", "gzip"} <= set(first.paths)
+    with open(first.paths["identity"], "rb") as fh:
+        assert fh.read() == b'{"a":1}'
+
+
+def _put(store, name, size, mtime):
+    stored = store.get_or_build(name * 64, lambda: os.urandom(size))
+    for path in stored.paths.values():
+        os.utime(path, (mtime, mtime))
+    return stored
+
+
+def test_disk_tier_prunes_oldest_payloads_first(tmp_path):
+    store = PayloadStore(directory=str(tmp_path), max_disk_bytes=10_000)
+    now = time.time()
+    # Random bytes do not compress, so each payload takes a little over 2x its size.
+    old = _put(store, "a", 2000, now - 300)
+    middle = _put(store, "b", 2000, now - 200)
+    assert store.stats["pruned"] == 0
+    _put(store, "c", 2000, now - 100)
+    assert store.stats["pruned"] == 2
+    assert not os.path.exists(old.paths["identity"])
+    assert not os.path.exists(middle.paths["identity"])
+    assert sum(size for _, size, _ in store._scan().values()) <= 10_000 * 0.8
+
+
+def test_entries_whose_files_were_pruned_elsewhere_are_rebuilt(tmp_path):
+    store = PayloadStore(directory=str(tmp_path))
+    builds = []
+    stored = store.get_or_build("k" * 64, lambda: builds.append(1) or {"a": 1})
+    for path in stored.paths.values():
+        os.remove(path)
+    rebuilt = store.get_or_build("k" * 64, lambda: builds.append(1) or {"a": 1})
+    assert builds == [1, 1]
+    assert os.path.exists(rebuilt.paths["identity"])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, "get_food_data", lambda food_id, request_id=None: FOOD)
+    monkeypatch.setattr(app_module, "payload_store", PayloadStore())
+    return app_module.app.test_client()
+
+
+def test_not_modified_carries_the_etag_of_the_selected_encoding(client):
+    plain = client.get("/api/food/170567", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/api/food/170567", headers={"Accept-Encoding": "gzip"})
+    assert plain.status_code == gzipped.status_code == 200
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert plain.get_etag()[0] != gzipped.get_etag()[0]
+
+    again = client.get("/api/food/170567", headers={"Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == gzipped.headers["ETag"]
+
+    # A tag for another encoding does not match the representation a 200 would send.
+    switched = client.get("/api/food/170567", headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["ETag"]})
+    assert switched.status_code == 200
+    assert switched.headers["ETag"] == gzipped.headers["ETag"]
@@ -0,0 +1,51 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from utils.data_transformer import list_portions
+from utils.wire_format import nutrient_vector
+
+TREEMAP_JS = os.path.join(os.path.dirname(__file__), "..", "docs", "js", "treemap.js")
+
+FOOD = {
+    "fdcId": 1,
+    "foodNutrients": [],
+    "foodPortions": [
+        {"id": 11, "gramWeight": 28.5, "amount": 1.0, "modifier": "oz"},
+        {"id": 12, "gramWeight": 0.5, "amount": 0.5, "measureUnit": {"name": "tsp"}},
+        {"id": 13, "gramWeight": 2.5, "amount": 2.0, "measureUnit": {"abbreviation": "pc"}},
+        {"id": 14, "gramWeight": 240.49, "portionDescription": "1  cup "},
+        {"id": 15, "gramWeight": 3.5},
+        {"id": 16, "gramWeight": 0},
+    ],
+}
+
+
+def test_labels_round_halves_up_like_math_round():
+    assert [p["description"] for p in list_portions(FOOD)] == [
+        "100g (default)",
+        "oz (29g)",
+        "0.5 tsp (1g)",
+        "2 pc (3g)",
+        "1 cup (240g)",
+        "Serving (4g)",
+    ]
+    assert [p["id"] for p in list_portions(FOOD)] == [None, 11, 12, 13, 14, 15]
+
+
+def test_nutrient_vector_carries_the_portion_list():
+    assert nutrient_vector(FOOD)["portions"] == list_portions(FOOD)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_client_fallback_labels_match_the_server():
+    source = open(TREEMAP_JS, encoding="utf-8").read()
+    function = re.search(r"^function labelFoodPortions\(.*?^}\n", source, re.S | re.M).group(0)
+    script = f"{function}\nconsole.log(JSON.stringify(labelFoodPortions({json.dumps(FOOD['foodPortions'])})));"
+    proc = subprocess.run(["node", "-e", script], capture_output=True, text=True, check=True)
+    client = json.loads(proc.stdout)
+    assert client == [{"description": p["description"], "gramWeight": p["gramWeight"]} for p in list_portions(FOOD)]
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+from utils import typeahead, usda_api
+from utils.typeahead import TypeaheadIndex
+
+FOODS = [
+    {"fdcId": 1, "description": "Chicken breast, roasted", "dataType": "SR Legacy"},
+    {"fdcId": 2, "description": "Chicken", "dataType": "Foundation"},
+    {"fdcId": 3, "description": "Soup, chicken noodle", "dataType": "Survey (FNDDS)"},
+    {"fdcId": 4, "description": "Chickpeas, canned", "dataType": "SR Legacy"},
+    {"fdcId": 5, "description": "Broccoli, raw", "dataType": "Foundation"},
+    {"fdcId": 6, "description": "Noodle bowl", "dataType": "Branded", "brandOwner": "Chick Foods Inc."},
+]
+
+
+def _ids(results):
+    return [item["fdcId"] for item in results]
+
+
+def _sealed(monkeypatch, foods):
+    # Shrink the buffer so every add_many call seals its foods into a segment.
+    monkeypatch.setattr(typeahead, "BUFFER_SIZE", 1)
+    index = TypeaheadIndex()
+    index.add_many(foods)
+    assert not index._buffer
+    return index
+
+
+@pytest.fixture(params=["buffer", "segment"])
+def index(request, monkeypatch):
+    if request.param == "buffer":
+        index = TypeaheadIndex()
+        index.add_many(FOODS)
+        assert len(index._buffer) == len(FOODS)
+        return index
+    return _sealed(monkeypatch, FOODS)
+
+
+def test_prefix_matches_rank_leading_words_then_shorter_descriptions(index):
+    # Descriptions starting with the word come first; the brand owner also matches.
+    assert _ids(index.suggest("chick")) == [2, 4, 1, 6, 3]
+    assert _ids(index.suggest("chick", limit=2)) == [2, 4]
+    assert _ids(index.suggest("noodle chi")) == [6, 3]
+
+
+def test_fuzzy_fallback_for_misspelled_words(index):
+    assert _ids(index.suggest("brocoli")) == [5]
+    assert _ids(index.suggest("chiken breast")) == [1]
+    # A prefix match outranks a fuzzy one.
+    index.add_many([{"fdcId": 7, "description": "Brocolini, a long description", "dataType": "Foundation"}])
+    assert _ids(index.suggest("brocoli"))[0] == 7
+
+
+def test_short_unknown_words_do_not_fuzzy_match(index):
+    assert index.suggest("zz") == []
+    assert index.suggest("chicken zq") == []
+
+
+def test_data_type_filter(index):
+    assert _ids(index.suggest("chick", data_types=["SR Legacy"])) == [4, 1]
+    assert _ids(index.suggest("chick", data_types=["Branded", "Foundation"])) == [2, 6]
+    assert _ids(index.suggest("chick", data_types=["Unknown"])) == [2, 4, 1, 6, 3]
+
+
+def test_result_shape(index):
+    assert index.suggest("noodle bowl") == [
+        {"fdcId": 6, "description": "Noodle bowl", "dataType": "Branded", "brandOwner": "Chick Foods Inc."}
+    ]
+
+
+def test_full_buffer_is_sealed_and_equal_segments_merge(monkeypatch):
+    monkeypatch.setattr(typeahead, "BUFFER_SIZE", 3)
+    index = TypeaheadIndex()
+    index.add_many(FOODS[:2])
+    assert len(index._buffer) == 2 and index._segments == ()
+    index.add_many(FOODS[2:3])
+    assert index._buffer == [] and [len(s) for s in index._segments] == [3]
+    index.add_many(FOODS[3:])
+    deadline = time.monotonic() + 5
+    while (index._merging or len(index._segments) > 1) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [len(s) for s in index._segments] == [6]
+    assert _ids(index.suggest("chick")) == [2, 4, 1, 6, 3]
+
+
+def test_known_foods_are_not_added_twice(index):
+    generation = index.generation
+    assert index.add_many(FOODS) == 0
+    assert index.add_many([{"fdcId": "x"}, {"fdcId": 8}]) == 0
+    assert index.generation == generation
+
+
+def test_new_foods_invalidate_cached_results(index):
+    assert _ids(index.suggest("kale")) == []
+    index.add_many([{"fdcId": 9, "description": "Kale, raw", "dataType": "Foundation"}])
+    assert _ids(index.suggest("kale")) == [9]
+
+
+def test_suggest_route(client, monkeypatch):
+    index = TypeaheadIndex()
+    index.add_many(FOODS)
+    monkeypatch.setattr(usda_api, "suggest_index", index)
+    response = client.get("/api/suggest?q=chick&limit=2&dataTypes=SR%20Legacy")
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "query": "chick",
+        "results": [
+            {"fdcId": 4, "description": "Chickpeas, canned", "dataType": "SR Legacy", "brandOwner": ""},
+            {"fdcId": 1, "description": "Chicken breast, roasted", "dataType": "SR Legacy", "brandOwner": ""},
+        ],
+    }
+    assert _ids(client.get("/api/suggest?q=brocoli").get_json()["results"]) == [5]
+
+
+@pytest.mark.parametrize("query", ["q=", "q=%20", "q=chick&limit=many", "q=chick&limit=2.5"])
+def test_suggest_route_rejects_bad_parameters(client, query):
+    response = client.get(f"/api/suggest?{query}")
+    assert response.status_code == 400
+    assert "requestId" in response.get_json()
@@ -0,0 +1,209 @@
+import os
+
+import pytest
+
+from utils.upstream_guard import (
+    ADJUST_INTERVAL_SECONDS,
+    RATE_INCREASE,
+    UpstreamGuard,
+    UpstreamUnavailable,
+    parse_retry_after,
+)
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def _guard(clock, **kwargs):
+    options = dict(rate=10, burst=2, failure_threshold=3, cooldown=30, max_wait=5, probe_timeout=10)
+    options.update(kwargs)
+    return UpstreamGuard(options.pop("rate"), options.pop("burst"), clock=clock, **options)
+
+
+def test_bucket_spends_the_burst_then_spaces_requests_at_the_rate(clock):
+    guard = _guard(clock)
+    assert guard.acquire() == 0
+    assert guard.acquire() == 0
+    assert guard.acquire() == pytest.approx(0.1)
+    clock.now += 1
+    assert guard.acquire() == 0
+
+
+def test_a_wait_past_max_wait_fails_fast_without_reserving(clock):
+    guard = _guard(clock, rate=0.1, burst=1, max_wait=5)
+    guard.acquire()
+    with pytest.raises(UpstreamUnavailable) as exc:
+        guard.acquire()
+    assert exc.value.reason == "rate_limited"
+    assert exc.value.retry_after == pytest.approx(10)
+    assert guard.snapshot()["tokens"] == pytest.approx(0)
+
+
+def test_429_halves_the_rate_once_per_interval(clock):
+    guard = _guard(clock, rate=16, burst=16)
+    guard.record(429)
+    assert guard.snapshot()["rate"] == 8
+    assert guard.snapshot()["tokens"] <= 0
+    # The rest of the same burst of 429s does not count again.
+    guard.record(429)
+    assert guard.snapshot()["rate"] == 8
+    clock.now += ADJUST_INTERVAL_SECONDS
+    guard.record(429)
+    assert guard.snapshot()["rate"] == 4
+
+
+def test_rate_never_drops_below_min_rate(clock):
+    guard = _guard(clock, rate=16, burst=16, min_rate=5)
+    for _ in range(4):
+        guard.record(429)
+        clock.now += ADJUST_INTERVAL_SECONDS
+    assert guard.snapshot()["rate"] == 5
+
+
+def test_successes_restore_the_rate_step_by_step(clock):
+    guard = _guard(clock, rate=20, burst=20)
+    guard.record(429)
+    clock.now += ADJUST_INTERVAL_SECONDS
+    guard.record(200)
+    guard.record(200)
+    assert guard.snapshot()["rate"] == pytest.approx(10 + 20 * RATE_INCREASE)
+    for _ in range(50):
+        clock.now += ADJUST_INTERVAL_SECONDS
+        guard.record(200)
+    assert guard.snapshot()["rate"] == 20
+
+
+def test_retry_after_blocks_every_caller(clock):
+    guard = _guard(clock, rate=0, burst=0)
+    guard.record(429, retry_after=3)
+    assert guard.acquire() == pytest.approx(3)
+    clock.now += 2
+    assert guard.acquire() == pytest.approx(1)
+    guard.record(429, retry_after=10)
+    with pytest.raises(UpstreamUnavailable) as exc:
+        guard.acquire()
+    assert exc.value.reason == "rate_limited"
+    clock.now += 10
+    assert guard.acquire() == 0
+
+
+def test_429s_do_not_trip_the_breaker(clock):
+    guard = _guard(clock, rate=0, burst=0, failure_threshold=1)
+    guard.record(429)
+    assert guard.snapshot()["open"] == 0
+    assert guard.acquire() == 0
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    guard = _guard(clock)
+    guard.record(503)
+    guard.record(None)
+    guard.record(200)  # a success resets the count
+    guard.record(500)
+    guard.record(502)
+    assert guard.snapshot()["open"] == 0
+    guard.record(None)
+    assert guard.snapshot()["open"] == 1
+    with pytest.raises(UpstreamUnavailable) as exc:
+        guard.acquire()
+    assert exc.value.reason == "circuit_open"
+    assert exc.value.retry_after == pytest.approx(30)
+
+
+def _open(guard, clock):
+    for _ in range(guard.failure_threshold):
+        guard.record(503)
+    clock.now += guard.cooldown
+
+
+def test_half_open_lets_one_probe_through_and_its_success_closes(clock):
+    guard = _guard(clock)
+    _open(guard, clock)
+    assert guard.acquire() == 0
+    with pytest.raises(UpstreamUnavailable) as exc:
+        guard.acquire()
+    assert exc.value.reason == "circuit_half_open"
+    guard.record(200)
+    assert guard.snapshot()["open"] == 0
+    assert guard.acquire() == 0
+
+
+def test_a_failed_probe_reopens_for_a_full_cooldown(clock):
+    guard = _guard(clock)
+    _open(guard, clock)
+    guard.acquire()
+    guard.record(503)
+    clock.now += guard.cooldown - 1
+    with pytest.raises(UpstreamUnavailable) as exc:
+        guard.acquire()
+    assert exc.value.reason == "circuit_open"
+    clock.now += 1
+    assert guard.acquire() == 0
+
+
+def test_a_lost_probe_is_replaced_after_probe_timeout(clock):
+    guard = _guard(clock)
+    _open(guard, clock)
+    guard.acquire()
+    clock.now += guard.probe_timeout
+    assert guard.acquire() == 0
+
+
+def test_disabled_breaker_never_opens(clock):
+    guard = _guard(clock, failure_threshold=0)
+    for _ in range(10):
+        guard.record(None)
+    assert guard.acquire() == 0
+
+
+def test_guards_on_one_file_share_state(clock, tmp_path):
+    path = str(tmp_path / "guard")
+    first = _guard(clock, path=path)
+    second = _guard(clock, path=path)
+    first.acquire()
+    first.acquire()
+    assert second.acquire() == pytest.approx(0.1)
+    _open(first, clock)
+    clock.now -= first.cooldown
+    with pytest.raises(UpstreamUnavailable):
+        second.acquire()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_locks_its_own_descriptor_and_shares_state(clock, tmp_path):
+    guard = _guard(clock, path=str(tmp_path / "guard"))
+    guard.acquire()
+    parent_fd = guard._state._fd
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            guard.record(429, retry_after=4)
+            if guard._state._pid == os.getpid():
+                code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert guard._state._fd == parent_fd
+    assert guard.snapshot()["blockedSeconds"] == pytest.approx(4)
+    assert guard.acquire() == pytest.approx(4)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("-1") == 0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480.0) == 10
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
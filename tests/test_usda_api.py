@@ -0,0 +1,74 @@
+import pytest
+
+from utils import metrics, usda_api
+from utils.cache import TieredCache
+from utils.typeahead import TypeaheadIndex
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, body):
+        self._body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._body
+
+
+class NoNeighbors:
+    def add_many(self, foods):
+        return 0
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    Replaces the POST /foods call: answers with a record for every requested id
+    except 404, and records each batch sent.
+    """
+    batches = []
+
+    def request(method, url, *, params, json_body=None, request_id=None, **kwargs):
+        batches.append(json_body["fdcIds"])
+        metrics.record_phase("upstream", 0.25)
+        return FakeResponse([{"fdcId": fdc_id, "description": f"food {fdc_id}"} for fdc_id in json_body["fdcIds"] if fdc_id != 404])
+
+    monkeypatch.setattr(usda_api, "_request_with_retries", request)
+    monkeypatch.setattr(usda_api, "local_index", None)
+    monkeypatch.setattr(usda_api, "response_cache", TieredCache())
+    monkeypatch.setattr(usda_api, "suggest_index", TypeaheadIndex())
+    monkeypatch.setattr(usda_api, "_neighbors", NoNeighbors)
+    return batches
+
+
+def test_batch_matches_ids_with_leading_zeros(upstream):
+    foods = usda_api.get_foods_data(["0123", "456", "404"], request_id="r1")
+    assert upstream == [[123, 456, 404]]
+    assert foods["0123"]["fdcId"] == 123
+    assert foods["456"]["description"] == "food 456"
+    assert foods["404"]["status"] == 404
+
+
+def test_batch_rejects_non_numeric_ids_without_calling_upstream(upstream):
+    foods = usda_api.get_foods_data(["abc", " 12 "], request_id="r1")
+    assert foods["abc"]["status"] == 400
+    assert foods["12"]["fdcId"] == 12
+    assert upstream == [[12]]
+
+
+def test_batch_splits_into_chunks_and_serves_repeats_from_cache(upstream):
+    ids = [str(i) for i in range(1, usda_api.BATCH_SIZE * 2 + 2)]
+    foods = usda_api.get_foods_data(ids)
+    assert sorted(len(batch) for batch in upstream) == [1, usda_api.BATCH_SIZE, usda_api.BATCH_SIZE]
+    assert all(foods[i]["fdcId"] == int(i) for i in ids)
+    usda_api.get_foods_data(ids[:5])
+    assert len(upstream) == 3
+
+
+def test_batch_phases_reach_the_request_context(upstream):
+    phases = metrics.start_request()
+    usda_api.get_foods_data([str(i) for i in range(1, usda_api.BATCH_SIZE + 2)])
+    assert phases["upstream"] == pytest.approx(0.5)
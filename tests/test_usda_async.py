@@ -0,0 +1,159 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from benchmarks.stub_usda import StubUSDAServer
+from utils import usda_api
+from utils.upstream_guard import UpstreamGuard
+from utils.usda_async import AsyncUSDAClient
+
+
+@pytest.fixture(autouse=True)
+def open_guard(monkeypatch):
+    # No rate limit or breaker, so tests only see the client's own limits.
+    monkeypatch.setattr(usda_api, "upstream_guard", UpstreamGuard(rate=0, burst=0, failure_threshold=0))
+
+
+class Upstream:
+    """
+    MockTransport handler that answers /food/<id> after `delay` seconds and
+    records calls and the peak number of requests in flight.
+    """
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request.url.path)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        fdc_id = int(request.url.path.rsplit("/", 1)[-1])
+        return httpx.Response(200, json={"fdcId": fdc_id, "description": f"food {fdc_id}"})
+
+
+def _client(upstream: Upstream, **kwargs) -> AsyncUSDAClient:
+    return AsyncUSDAClient("http://usda.test", "key", transport=httpx.MockTransport(upstream), **kwargs)
+
+
+def test_concurrency_is_capped():
+    upstream = Upstream()
+
+    async def main():
+        client = _client(upstream, max_concurrency=3)
+        results = await asyncio.gather(*(client.get_food_data(str(i)) for i in range(12)))
+        await client.aclose()
+        return results
+
+    results = asyncio.run(main())
+    assert [r["fdcId"] for r in results] == list(range(12))
+    assert len(upstream.calls) == 12
+    assert upstream.peak == 3
+
+
+def test_identical_requests_share_one_upstream_call():
+    upstream = Upstream()
+
+    async def main():
+        client = _client(upstream)
+        results = await asyncio.gather(*(client.get_food_data(" 42") for _ in range(5)), client.get_food_data("43"))
+        inflight = dict(client._inflight)
+        await client.aclose()
+        return results, inflight
+
+    results, inflight = asyncio.run(main())
+    assert [r["fdcId"] for r in results] == [42] * 5 + [43]
+    assert sorted(upstream.calls) == ["/food/42", "/food/43"]
+    assert inflight == {}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_request():
+    upstream = Upstream(delay=0.05)
+
+    async def main():
+        client = _client(upstream)
+        first = asyncio.ensure_future(client.get_food_data("7"))
+        second = asyncio.ensure_future(client.get_food_data("7"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        result = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await client.aclose()
+        return result
+
+    assert asyncio.run(main())["fdcId"] == 7
+    assert upstream.calls == ["/food/7"]
+
+
+def test_request_finishes_after_every_caller_is_cancelled():
+    upstream = Upstream(delay=0.05)
+
+    async def main():
+        client = _client(upstream)
+        caller = asyncio.ensure_future(client.get_food_data("9"))
+        await asyncio.sleep(0.01)
+        task = client._inflight["food:9"]
+        caller.cancel()
+        result = await task
+        await asyncio.sleep(0)
+        inflight = dict(client._inflight)
+        await client.aclose()
+        return result, inflight
+
+    result, inflight = asyncio.run(main())
+    assert result["fdcId"] == 9
+    assert inflight == {}
+
+
+def test_guard_calls_run_off_the_event_loop(monkeypatch):
+    threads = []
+
+    class RecordingGuard(UpstreamGuard):
+        def acquire(self):
+            threads.append(threading.current_thread())
+            return super().acquire()
+
+        def record(self, status, retry_after=None):
+            threads.append(threading.current_thread())
+            super().record(status, retry_after)
+
+    monkeypatch.setattr(usda_api, "upstream_guard", RecordingGuard(rate=0, burst=0, failure_threshold=0))
+    upstream = Upstream(delay=0)
+
+    async def main():
+        client = _client(upstream)
+        await client.get_food_data("1")
+        await client.aclose()
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(main())
+    assert len(threads) == 2
+    assert all(thread is not loop_thread for thread in threads)
+
+
+def test_connections_are_pooled_against_the_stub_server():
+    with StubUSDAServer() as stub:
+        fdc_ids = [str(fdc_id) for fdc_id in list(stub.corpus["foods"])[:6]] * 4
+
+        async def main():
+            client = AsyncUSDAClient(stub.base_url, "key", max_concurrency=4, max_connections=2)
+            first = await asyncio.gather(*(client.get_food_data(fdc_id) for fdc_id in fdc_ids))
+            second = await asyncio.gather(*(client.search_foods("apple", page=page) for page in (1, 2, 3)))
+            await client.aclose()
+            return first, second
+
+        foods, searches = asyncio.run(main())
+        assert all("error" not in food for food in foods)
+        assert all("results" in search for search in searches)
+        counts = stub.config.counts
+    assert counts["requests"] >= 9
+    assert counts["connections"] <= 2
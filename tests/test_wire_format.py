@@ -0,0 +1,157 @@
+import base64
+import json
+import os
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+from benchmarks.golden_transform import GOLDEN_PATH
+from utils.chart_bundle import parse_nutrients
+from utils.data_transformer import transform_to_sankey
+from utils.wire_format import (
+    NUTRIENT_VECTOR_FORMAT,
+    NUTRIENT_VECTOR_MIMETYPE,
+    SANKEY_COLUMNAR_MIMETYPE,
+    decode_sankey_columnar,
+    encode_sankey_columnar,
+    expand_nutrient_vector,
+    nutrient_vector,
+)
+
+WIRE_JS = os.path.join(os.path.dirname(__file__), "..", "docs", "js", "wire.js")
+ALMONDS = 170567
+
+
+def _float32(value):
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+def _golden_payloads():
+    with open(GOLDEN_PATH, encoding="utf-8") as fh:
+        foods = json.load(fh)["foods"]
+    return [transform_to_sankey(food, portion=28.35) for food in foods]
+
+
+PAYLOADS = _golden_payloads() + [
+    {"nodes": [], "links": []},
+    {
+        "nodes": [{"node": 0, "name": "Vitamin B-12 (µg)"}, {"node": 1, "name": "Ünïcode"}, {"node": 2, "name": "x"}],
+        "links": [{"source": 0, "target": 1, "value": 0.1}, {"source": 2, "target": 1, "value": 1e-7}],
+    },
+]
+
+
+@pytest.mark.parametrize("payload", PAYLOADS, ids=range(len(PAYLOADS)))
+def test_columnar_layout_and_round_trip(payload):
+    raw = encode_sankey_columnar(payload)
+    magic, node_count, link_count, names_size = struct.unpack_from("<4sHHI", raw)
+    names = "\n".join(node["name"] for node in payload["nodes"]).encode("utf-8")
+    assert (magic, node_count, link_count, names_size) == (b"SNK1", len(payload["nodes"]), len(payload["links"]), len(names))
+
+    # Each column starts on a 4-byte boundary and the buffer ends with the values.
+    names_end = 12 + names_size
+    sources_at = names_end + -names_end % 4
+    values_at = sources_at + 4 * link_count + -(4 * link_count) % 4
+    assert raw[12:names_end] == names
+    assert set(raw[names_end:sources_at]) <= {0}
+    assert len(raw) == values_at + 4 * link_count
+    assert list(struct.unpack_from(f"<{link_count}H", raw, sources_at)) == [link["source"] for link in payload["links"]]
+    assert list(struct.unpack_from(f"<{link_count}H", raw, sources_at + 2 * link_count)) == [link["target"] for link in payload["links"]]
+
+    decoded = decode_sankey_columnar(raw)
+    assert [node["name"] for node in decoded["nodes"]] == [node["name"] for node in payload["nodes"]]
+    assert [node["node"] for node in decoded["nodes"]] == list(range(len(payload["nodes"])))
+    for got, want in zip(decoded["links"], payload["links"], strict=True):
+        assert (got["source"], got["target"]) == (want["source"], want["target"])
+        assert got["value"] == _float32(want["value"])
+        assert got["value"] == pytest.approx(want["value"], rel=1e-6)
+
+
+def test_decode_rejects_other_payloads():
+    with pytest.raises(ValueError):
+        decode_sankey_columnar(b"JSON" + bytes(8))
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs node")
+def test_client_decoder_reads_the_same_payload():
+    payload = PAYLOADS[-1]
+    script = (
+        open(WIRE_JS, encoding="utf-8").read()
+        + "\nconst bytes = Buffer.from(process.argv[1], 'base64');"
+        + "\nconst buffer = bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.length);"
+        + "\nconsole.log(JSON.stringify(decodeSankeyColumnar(buffer)));"
+    )
+    raw = encode_sankey_columnar(payload)
+    proc = subprocess.run(
+        ["node", "-e", script, base64.b64encode(raw).decode("ascii")], capture_output=True, text=True, check=True,
+    )
+    assert json.loads(proc.stdout) == decode_sankey_columnar(raw)
+
+
+def test_nutrient_vector_keeps_only_chart_nutrients(sample_foods):
+    food = sample_foods[ALMONDS]
+    vector = nutrient_vector(food)
+    assert vector["format"] == NUTRIENT_VECTOR_FORMAT
+    assert len(vector["ids"]) == len(vector["names"]) == len(vector["amounts"]) < len(food["foodNutrients"])
+    assert all(key in {"id", "gramWeight", "amount", "modifier", "portionDescription", "measureUnit"}
+               for portion in vector["foodPortions"] for key in portion)
+
+
+def test_expanded_vector_charts_like_the_full_record(sample_foods):
+    for food in sample_foods.values():
+        expanded = expand_nutrient_vector(json.loads(json.dumps(nutrient_vector(food))))
+        assert expanded["fdcId"] == food["fdcId"]
+        assert transform_to_sankey(expanded) == transform_to_sankey(food)
+        assert parse_nutrients(expanded) == parse_nutrients(food)
+
+
+def test_food_route_serves_columnar_when_accepted(client):
+    json_response = client.get(f"/api/food/{ALMONDS}")
+    response = client.get(f"/api/food/{ALMONDS}", headers={"Accept": SANKEY_COLUMNAR_MIMETYPE})
+    assert response.status_code == 200
+    assert response.mimetype == SANKEY_COLUMNAR_MIMETYPE
+    assert "Accept" in response.headers["Vary"]
+    assert response.data[:4] == b"SNK1"
+    decoded = decode_sankey_columnar(response.data)
+    expected = json_response.get_json()
+    assert [node["name"] for node in decoded["nodes"]] == [node["name"] for node in expected["nodes"]]
+    assert [link["value"] for link in decoded["links"]] == [_float32(link["value"]) for link in expected["links"]]
+    # The two representations carry different tags.
+    assert response.headers["ETag"] != json_response.headers["ETag"]
+    revalidated = client.get(
+        f"/api/food/{ALMONDS}", headers={"Accept": SANKEY_COLUMNAR_MIMETYPE, "If-None-Match": json_response.headers["ETag"]},
+    )
+    assert revalidated.status_code == 200
+
+
+@pytest.mark.parametrize("accept", [None, "*/*", "application/json", f"{SANKEY_COLUMNAR_MIMETYPE};q=0.5, application/json"])
+def test_food_route_falls_back_to_json(client, accept):
+    response = client.get(f"/api/food/{ALMONDS}", headers={"Accept": accept} if accept else {})
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert "Accept" in response.headers["Vary"]
+    assert set(response.get_json()) >= {"nodes", "links"}
+
+
+def test_all_portions_stay_json(client):
+    response = client.get(f"/api/food/{ALMONDS}?portions=all", headers={"Accept": SANKEY_COLUMNAR_MIMETYPE})
+    assert response.mimetype == "application/json"
+
+
+def test_raw_route_serves_the_record_or_the_vector(client, sample_foods):
+    food = sample_foods[ALMONDS]
+    record = client.get(f"/api/food/{ALMONDS}/raw")
+    assert record.mimetype == "application/json"
+    assert "Accept" in record.headers["Vary"]
+    assert record.get_json() == food
+
+    vector = client.get(f"/api/food/{ALMONDS}/raw", headers={"Accept": f"{NUTRIENT_VECTOR_MIMETYPE}, application/json;q=0.9"})
+    assert vector.mimetype == NUTRIENT_VECTOR_MIMETYPE
+    assert "Accept" in vector.headers["Vary"]
+    assert vector.get_json(force=True) == json.loads(json.dumps(nutrient_vector(food)))
+    assert len(vector.data) < len(record.data)
+
+    missing = client.get("/api/food/1/raw", headers={"Accept": NUTRIENT_VECTOR_MIMETYPE})
+    assert missing.status_code == 404
@@ -0,0 +1,159 @@
+"""
+Batch variant of data_transformer.transform_to_sankey for report jobs that
+build Sankey payloads for thousands of foods at once.
+
+The nutrient ids of every food in the batch are pulled into one flat array
+(the per-entry loop runs in C through map/itemgetter) and mapped to
+nutrient_spec slots through a dense id -> slot table; the amounts of the first
+entry per slot are scattered into a NumPy matrix (one column per slot). Quantities and derived values are then
+computed as column operations for the whole batch, and the per-food payloads
+are emitted from the resulting link-value matrix. Output is identical to
+calling transform_to_sankey on each food with the same display options.
+"""
+from operator import itemgetter
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from utils.nutrient_spec import QUANTITY_SLOTS, SLOT_BY_ID, SLOT_BY_NAME, SLOT_COUNT, layout
+
+# Dense id -> slot table (-1 for ids outside the spec); nutrient ids are small.
+ID_TO_SLOT = np.full(max(SLOT_BY_ID) + 1, -1, dtype=np.int64)
+ID_TO_SLOT[list(SLOT_BY_ID)] = list(SLOT_BY_ID.values())
+
+_nutrient = itemgetter("nutrient")
+_nutrient_id = itemgetter("id")
+
+
+def _entry_ids(entries) -> List:
+    try:
+        return list(map(_nutrient_id, map(_nutrient, entries)))
+    except (KeyError, TypeError):
+        # An entry without a nutrient dict or id; same result as resolve_slots' .get() chain.
+        return [(entry.get("nutrient") or {}).get("id") for entry in entries]
+
+
+def extract_slot_matrix(foods: List[Dict]) -> np.ndarray:
+    """
+    Return an (N, SLOT_COUNT) float64 matrix of the first matching amount per
+    slot, as nutrient_spec.resolve_slots computes it for each food.
+    """
+    counts = []
+    ids: List = []
+    entries_flat: List[Dict] = []
+    # (flat position, slot) for entries without an id, which are matched by name.
+    named = []
+    for food in foods:
+        entries = food.get("foodNutrients") or ()
+        food_ids = _entry_ids(entries)
+        if None in food_ids:
+            for i, (entry, nutrient_id) in enumerate(zip(entries, food_ids)):
+                if nutrient_id is None:
+                    slot = SLOT_BY_NAME.get(((entry.get("nutrient") or {}).get("name") or "").lower())
+                    if slot is not None:
+                        named.append((len(ids) + i, slot))
+            food_ids = [-1 if nutrient_id is None else nutrient_id for nutrient_id in food_ids]
+        counts.append(len(food_ids))
+        ids.extend(food_ids)
+        entries_flat.extend(entries)
+
+    matrix = np.zeros((len(foods), SLOT_COUNT), dtype=np.float64)
+    if not ids:
+        return matrix
+    ids = np.array(ids, dtype=np.int64)
+    in_table = (ids >= 0) & (ids < len(ID_TO_SLOT))
+    slots = np.where(in_table, ID_TO_SLOT[np.where(in_table, ids, 0)], -1)
+    if named:
+        positions, named_slots = zip(*named)
+        slots[list(positions)] = named_slots
+
+    matched = np.flatnonzero(slots >= 0)
+    rows = np.repeat(np.arange(len(foods)), counts)
+    cells = rows[matched] * SLOT_COUNT + slots[matched]
+    # The first entry for a slot wins (np.unique returns first occurrences), and
+    # only those entries' amounts are read.
+    cells, first = np.unique(cells, return_index=True)
+    matrix.reshape(-1)[cells] = [entries_flat[p].get("amount") or 0.0 for p in matched[first].tolist()]
+    return matrix
+
+
+def resolve_quantities(slots: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Column form of nutrient_spec.resolve_quantities: the first positive candidate slot.
+    """
+    quantities = {}
+    for quantity, start, end in QUANTITY_SLOTS:
+        value = np.zeros(slots.shape[0])
+        found = np.zeros(slots.shape[0], dtype=bool)
+        for slot in range(start, end):
+            column = slots[:, slot]
+            take = ~found & (column > 0)
+            value = np.where(take, column, value)
+            found |= take
+        quantities[quantity] = value
+    return quantities
+
+
+def derive_values(q: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Column form of nutrient_spec.derive_values, with the same operation order.
+    """
+    water, protein, fat, carbs = q["water"], q["protein"], q["fat"], q["carbs"]
+
+    summed_sugars = q["glucose"] + q["fructose"] + q["sucrose"] + q["maltose"] + q["lactose"] + q["galactose"]
+    sugars = np.where(q["total_sugars"] == 0, summed_sugars, q["total_sugars"])
+    fiber = q["fiber"]
+    starch = np.where((q["starch"] == 0) & (carbs > 0), np.maximum(0.0, carbs - sugars - fiber), q["starch"])
+
+    minerals = np.where(q["ash"] == 0, np.maximum(0.0, 100 - water - protein - fat - carbs), q["ash"])
+    sodium = q["sodium_mg"] / 1000
+
+    return {
+        "water": water, "protein": protein, "fat": fat, "carbs": carbs,
+        "minerals": minerals, "sodium": sodium, "other_minerals": np.maximum(0.0, minerals - sodium),
+        "sat": q["sat"], "mono": q["mono"], "poly": q["poly"], "trans": q["trans"],
+        "other_fats": np.maximum(0.0, fat - q["sat"] - q["mono"] - q["poly"] - q["trans"]),
+        "sugars": sugars, "fiber": fiber, "starch": starch,
+    }
+
+
+def transform_to_sankey_batch(
+    foods: Iterable[Dict],
+    reverse_hierarchy: bool = False,
+    show_sodium: bool = False,
+    show_fat_breakdown: bool = True,
+) -> List[Dict]:
+    """
+    Transform many USDA food records into Sankey payloads in one pass.
+
+    Args:
+        foods: USDA food data dictionaries
+        reverse_hierarchy, show_sodium, show_fat_breakdown: Same meaning as in
+            transform_to_sankey, applied to every food
+
+    Returns:
+        A list of {"nodes", "links"} dictionaries in input order.
+    """
+    foods = list(foods)
+    if not foods:
+        return []
+    values = derive_values(resolve_quantities(extract_slot_matrix(foods)))
+
+    node_names, link_spec = layout(reverse_hierarchy, show_sodium, show_fat_breakdown)
+    endpoints = [(source, target) for source, target, _ in link_spec]
+    link_values = np.column_stack([values[name] for _, _, name in link_spec]).tolist()
+
+    # Every payload gets its own copy of the (identical) node list.
+    nodes = [{"node": i, "name": name} for i, name in enumerate(node_names)]
+    copy_node = dict.copy
+    results = []
+    for row in link_values:
+        results.append({
+            "nodes": list(map(copy_node, nodes)),
+            "links": [
+                {"source": source, "target": target, "value": value}
+                for (source, target), value in zip(endpoints, row)
+                if value > 0
+            ],
+        })
+    return results
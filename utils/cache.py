@@ -0,0 +1,329 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default in-process budget; each gunicorn worker gets its own LRU tier.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Each process deletes expired rows from the SQLite tier once per this many writes.
+PURGE_EVERY_WRITES = 1000
+
+
+class _Entry:
+    __slots__ = ("value", "size", "stored_at", "ttl", "stale_ttl")
+
+    def __init__(self, value: Any, size: int, stored_at: float, ttl: float, stale_ttl: float):
+        self.value = value
+        self.size = size
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+    def state(self, now: float) -> str:
+        age = now - self.stored_at
+        if age < self.ttl:
+            return "fresh"
+        if age < self.ttl + self.stale_ttl:
+            return "stale"
+        return "expired"
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by the serialized size of its values.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: _Entry) -> None:
+        if entry.size > self.max_bytes:
+            # A single oversized value would flush the whole cache; skip it.
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.size
+            self._data[key] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes and self._data:
+                _, evicted = self._data.popitem(last=False)
+                self.current_bytes -= evicted.size
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    On-disk cache tier shared by every worker process on the host.
+    Connections are opened lazily per process and thread, so the object is safe
+    to create before gunicorn forks.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL, "
+                "ttl REAL NOT NULL, stale_ttl REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float, float, float]]:
+        row = self._conn().execute(
+            "SELECT value, stored_at, ttl, stale_ttl FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        return row
+
+    def set(self, key: str, value: bytes, stored_at: float, ttl: float, stale_ttl: float) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries (key, value, stored_at, ttl, stale_ttl) VALUES (?, ?, ?, ?, ?)",
+            (key, value, stored_at, ttl, stale_ttl),
+        )
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM entries")
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        cur = self._conn().execute("DELETE FROM entries WHERE stored_at + ttl + stale_ttl < ?", (now,))
+        return cur.rowcount
+
+
+class TieredCache:
+    """
+    Two-tier response cache: an in-process LRU in front of an optional shared
+    SQLite tier.
+
+    Entries are fresh for `ttl` seconds, then served stale for up to `stale_ttl`
+    more seconds while a single background refresh runs. Error results carrying
+    a 404 status are cached for `negative_ttl` seconds; other errors are never
+    cached. Expired rows are deleted from the SQLite tier every
+    `purge_every` writes.
+
+    Cached values are handed out as stored, not copied: callers must treat them
+    as read-only.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        disk_path: Optional[str] = None,
+        *,
+        purge_every: int = PURGE_EVERY_WRITES,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.memory = LRUCache(max_bytes)
+        self.disk = SQLiteCache(disk_path) if disk_path else None
+        self.purge_every = purge_every
+        self._clock = clock
+        self._disk_writes = 0
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "staleHits": 0,
+            "negativeHits": 0,
+            "diskHits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refreshErrors": 0,
+            "expiredHits": 0,
+            "purged": 0,
+        }
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["evictions"] = self.memory.evictions
+        stats["entries"] = len(self.memory)
+        stats["bytes"] = self.memory.current_bytes
+        return stats
+
+    def _lookup(self, key: str, now: float, include_expired: bool = False) -> Optional[_Entry]:
+        entry = self.memory.get(key)
+        if entry is not None and (include_expired or entry.state(now) != "expired"):
+            return entry
+        if self.disk is None:
+            return None
+        try:
+            row = self.disk.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache disk tier read failed for {key}: {str(e)}")
+            return None
+        if row is None:
+            return None
+        raw, stored_at, ttl, stale_ttl = row
+        entry = _Entry(json.loads(raw), len(raw), stored_at, ttl, stale_ttl)
+        if entry.state(now) == "expired" and not include_expired:
+            return None
+        self._count("diskHits")
+        self.memory.set(key, entry)
+        return entry
+
+    def _store(self, key: str, value: Any, ttl: float, stale_ttl: float) -> None:
+        raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        now = self._clock()
+        self.memory.set(key, _Entry(value, len(raw), now, ttl, stale_ttl))
+        if self.disk is not None:
+            try:
+                self.disk.set(key, raw, now, ttl, stale_ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"Cache disk tier write failed for {key}: {str(e)}")
+                return
+            with self._lock:
+                self._disk_writes += 1
+                purge = self.purge_every > 0 and self._disk_writes % self.purge_every == 0
+            if purge:
+                self._purge(now)
+
+    def _purge(self, now: float) -> None:
+        try:
+            purged = self.disk.purge_expired(now)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache disk tier purge failed: {str(e)}")
+            return
+        with self._lock:
+            self.stats["purged"] += purged
+
+    def _store_result(self, key: str, value: Any, ttl: float, stale_ttl: float, negative_ttl: float) -> None:
+        if isinstance(value, dict) and "error" in value:
+            if value.get("status") == 404 and negative_ttl > 0:
+                self._store(key, value, negative_ttl, 0)
+            return
+        self._store(key, value, ttl, stale_ttl)
+
+    def _refresh(self, key: str, fetch: Callable[[], Any], ttl: float, stale_ttl: float, negative_ttl: float) -> None:
+        try:
+            value = fetch()
+            # Keep serving the stale copy rather than replacing it with a transient error.
+            if not (isinstance(value, dict) and "error" in value and value.get("status") != 404):
+                self._store_result(key, value, ttl, stale_ttl, negative_ttl)
+        except Exception as e:
+            self._count("refreshErrors")
+            logger.warning(f"Background refresh failed for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Any],
+        *,
+        ttl: float,
+        stale_ttl: float = 0,
+        negative_ttl: float = 0,
+    ) -> Any:
+        now = self._clock()
+        entry = self._lookup(key, now)
+        if entry is not None:
+            state = entry.state(now)
+            if isinstance(entry.value, dict) and "error" in entry.value:
+                self._count("negativeHits")
+            elif state == "fresh":
+                self._count("hits")
+            else:
+                self._count("staleHits")
+                with self._lock:
+                    start = key not in self._refreshing
+                    if start:
+                        self._refreshing.add(key)
+                        self.stats["refreshes"] += 1
+                if start:
+                    threading.Thread(
+                        target=self._refresh,
+                        args=(key, fetch, ttl, stale_ttl, negative_ttl),
+                        daemon=True,
+                    ).start()
+            return entry.value
+
+        self._count("misses")
+        value = fetch()
+        self._store_result(key, value, ttl, stale_ttl, negative_ttl)
+        return value
+
+    def peek(self, key: str, include_expired: bool = False) -> Optional[Any]:
+        """
+        Return the cached value (fresh, stale or negative) without fetching, or None.
+        include_expired also returns entries past their stale window that have
+        not been evicted yet, for use while upstream is down.
+        """
+        now = self._clock()
+        entry = self._lookup(key, now, include_expired)
+        if entry is None:
+            return None
+        self._count("expiredHits" if entry.state(now) == "expired" else "hits")
+        return entry.value
+
+    def put(self, key: str, value: Any, *, ttl: float, stale_ttl: float = 0, negative_ttl: float = 0) -> None:
+        """
+        Store a value fetched outside get_or_fetch, e.g. by a batch request.
+        """
+        self._store_result(key, value, ttl, stale_ttl, negative_ttl)
+
+    def _disk_call(self, action: str, fn: Callable[[], None]) -> None:
+        if self.disk is None:
+            return
+        try:
+            fn()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache disk tier {action} failed: {str(e)}")
+
+    def invalidate(self, key: str) -> None:
+        """
+        Drop a key from both tiers, so it is refetched on next use.
+        """
+        self.memory.delete(key)
+        self._disk_call("delete", lambda: self.disk.delete(key))
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self._disk_call("clear", lambda: self.disk.clear())
@@ -0,0 +1,445 @@
+"""
+Chart data for one food, computed on the server. The chart bundle carries what
+docs/js reads: the nutrients in the shape of parseNutrientsFromUSDA, scaled to
+the portion, and the labelled portion list; the page builds each chart from
+those. The weighted Voronoi cells are built separately (build_voronoi_bundle):
+solving them is most of the cost, they do not depend on the portion, and the
+client only needs them for one tab.
+
+The hierarchy builders that feed the Voronoi layouts are ports of
+build*TreemapData in docs/js/treemap.js; keep them in step when the client
+changes. Macronutrients come from utils/nutrient_spec.py, so the treemaps agree
+with the Sankey. Nodes carry no colours: the client looks them up by "colorKey",
+or by "name" when there is no colorKey.
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from utils.data_transformer import list_portions
+from utils.nutrient_spec import compile_slots, derive_values, resolve_quantities
+
+# Bump when the bundle layout or any builder changes, so stored bundles are rebuilt.
+BUNDLE_VERSION = 3
+
+# Reference box for the Voronoi layouts; the client scales them to its own size.
+VORONOI_SIZE = 400
+# Solved layouts kept per process, keyed by the cell values at the 100g basis.
+VORONOI_CACHE_ENTRIES = 1024
+
+# (client key, USDA nutrient id, name) in the order of parseNutrientsFromUSDA.
+MINERALS: List[Tuple[str, int, str]] = [
+    ("sodium", 1093, "Sodium, Na"),
+    ("potassium", 1092, "Potassium, K"),
+    ("chloride", 1088, "Chloride, Cl"),
+    ("calcium", 1087, "Calcium, Ca"),
+    ("phosphorus", 1091, "Phosphorus, P"),
+    ("magnesium", 1090, "Magnesium, Mg"),
+    ("iron", 1089, "Iron, Fe"),
+    ("copper", 1098, "Copper, Cu"),
+    ("chromium", 1096, "Chromium, Cr"),
+    ("manganese", 1101, "Manganese, Mn"),
+    ("molybdenum", 1102, "Molybdenum, Mo"),
+    ("zinc", 1095, "Zinc, Zn"),
+    ("selenium", 1103, "Selenium, Se"),
+    ("iodine", 1100, "Iodine, I"),
+]
+VITAMINS: List[Tuple[str, int, str]] = [
+    ("thiamin", 1165, "Thiamin"),
+    ("riboflavin", 1166, "Riboflavin"),
+    ("niacin", 1167, "Niacin"),
+    ("pantothenicAcid", 1170, "Pantothenic acid"),
+    ("vitaminB6", 1175, "Vitamin B-6"),
+    ("biotin", 1176, "Biotin"),
+    ("folate", 1177, "Folate, total"),
+    ("vitaminB12", 1178, "Vitamin B-12"),
+    ("choline", 1180, "Choline, total"),
+    ("vitaminA", 1106, "Vitamin A, RAE"),
+    ("vitaminC", 1162, "Vitamin C, total ascorbic acid"),
+    ("vitaminD", 1114, "Vitamin D (D2 + D3)"),
+    ("vitaminE", 1109, "Vitamin E (alpha-tocopherol)"),
+    ("vitaminK", 1185, "Vitamin K (phylloquinone)"),
+]
+AMINO_ACIDS: List[Tuple[str, int]] = [
+    ("Tryptophan", 1210), ("Threonine", 1211), ("Isoleucine", 1212), ("Leucine", 1213),
+    ("Lysine", 1214), ("Methionine", 1215), ("Cystine", 1216), ("Phenylalanine", 1217),
+    ("Tyrosine", 1218), ("Valine", 1219), ("Arginine", 1220), ("Histidine", 1221),
+    ("Alanine", 1222), ("Aspartic acid", 1223), ("Glutamic acid", 1224), ("Glycine", 1225),
+    ("Proline", 1226), ("Serine", 1227),
+]
+ESSENTIAL_AMINO_ACIDS = {
+    "Histidine", "Isoleucine", "Leucine", "Lysine", "Methionine",
+    "Phenylalanine", "Threonine", "Tryptophan", "Valine",
+}
+CONDITIONAL_AMINO_ACIDS = {"Arginine", "Cystine", "Tyrosine", "Glycine", "Proline"}
+
+# Matched with the same id-then-name rules as the Sankey quantities.
+MICRONUTRIENT_TABLES = compile_slots(
+    [(key, [(nutrient_id, [name])]) for key, nutrient_id, name in MINERALS + VITAMINS]
+    + [(name, [(nutrient_id, [name])]) for name, nutrient_id in AMINO_ACIDS]
+)
+
+# Charts whose hierarchy depends on the "show sodium separately" toggle.
+SALT_CHARTS = ("micronutrients", "minerals")
+
+
+def _round(value: float) -> float:
+    return round(value, 6)
+
+
+def parse_nutrients(food_data: Dict, portion: Optional[float] = None) -> Dict:
+    """
+    Nutrients for one portion in the shape of parseNutrientsFromUSDA:
+    macros and subtypes in g, mineralData and vitaminData in the USDA units
+    (mg or µg), aminoAcids in g keyed by name (only those reported).
+    """
+    food_nutrients = food_data.get("foodNutrients") or []
+    values = derive_values(resolve_quantities(food_nutrients))
+    micro = resolve_quantities(food_nutrients, MICRONUTRIENT_TABLES)
+    scale = portion / 100.0 if portion else 1.0
+
+    def scaled(value: float) -> float:
+        return _round(value * scale)
+
+    return {
+        "water": scaled(values["water"]),
+        "protein": scaled(values["protein"]),
+        "fat": scaled(values["fat"]),
+        "carbs": scaled(values["carbs"]),
+        "minerals": scaled(values["minerals"]),
+        "satFat": scaled(values["sat"]),
+        "monoFat": scaled(values["mono"]),
+        "polyFat": scaled(values["poly"]),
+        "transFat": scaled(values["trans"]),
+        "otherFat": scaled(values["other_fats"]),
+        "sugars": scaled(values["sugars"]),
+        "fiber": scaled(values["fiber"]),
+        "starch": scaled(values["starch"]),
+        "aminoAcids": {name: scaled(micro[name]) for name, _ in AMINO_ACIDS if micro[name] > 0},
+        "mineralData": {key: scaled(micro[key]) for key, _, _ in MINERALS},
+        "vitaminData": {key: scaled(micro[key]) for key, _, _ in VITAMINS},
+    }
+
+
+def _leaf(name: str, value: float, color_key: Optional[str] = None) -> Dict:
+    node = {"name": name, "value": _round(value)}
+    if color_key is not None:
+        node["colorKey"] = color_key
+    return node
+
+
+def _group(name: str, children: List[Dict], color_key: Optional[str] = None) -> Dict:
+    node = {"name": name, "children": children}
+    if color_key is not None:
+        node["colorKey"] = color_key
+    return node
+
+
+def _total(children: List[Dict]) -> float:
+    return sum(child["value"] for child in children)
+
+
+def _by_value(children: List[Dict]) -> List[Dict]:
+    return sorted(children, key=lambda child: child["value"], reverse=True)
+
+
+def _amino_acid_groups(amino_acids: Dict[str, float]) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    essential, conditional, non_essential = [], [], []
+    for name, value in amino_acids.items():
+        if value > 0:
+            if name in ESSENTIAL_AMINO_ACIDS:
+                essential.append(_leaf(name, value))
+            elif name in CONDITIONAL_AMINO_ACIDS:
+                conditional.append(_leaf(name, value))
+            else:
+                non_essential.append(_leaf(name, value))
+    return essential, conditional, non_essential
+
+
+def macro_hierarchy(n: Dict, detailed: bool) -> Dict:
+    """buildMacroTreemapData"""
+    children = []
+    if n["water"] > 0:
+        children.append(_leaf("Water", n["water"]))
+
+    if n["protein"] > 0:
+        amino_groups = []
+        if detailed and n["aminoAcids"]:
+            for name, members in zip(("Essential", "Conditional", "Non-Essential"), _amino_acid_groups(n["aminoAcids"])):
+                total = _total(members)
+                if total > 0:
+                    amino_groups.append(_leaf(name, total))
+        children.append(_group("Protein", amino_groups) if amino_groups else _leaf("Protein", n["protein"]))
+
+    if n["fat"] > 0:
+        fat_children = []
+        if detailed:
+            for name, key in (("Sat.", "satFat"), ("Mono", "monoFat"), ("Poly", "polyFat"), ("Trans", "transFat"), ("Other Fats", "otherFat")):
+                if n[key] > 0:
+                    fat_children.append(_leaf(name, n[key]))
+        children.append(_group("Fat", fat_children) if fat_children else _leaf("Fat", n["fat"]))
+
+    if n["carbs"] > 0:
+        carb_children = []
+        if detailed:
+            for name, key in (("Sugars", "sugars"), ("Fiber", "fiber"), ("Starch", "starch")):
+                if n[key] > 0:
+                    carb_children.append(_leaf(name, n[key]))
+        children.append(_group("Carbs", carb_children) if carb_children else _leaf("Carbs", n["carbs"]))
+
+    if n["minerals"] > 0:
+        sodium_mg = n["mineralData"]["sodium"]
+        if detailed and sodium_mg > 0:
+            # Sodium is reported in mg; the macro charts work in grams
+            sodium = sodium_mg / 1000
+            mineral_children = [_leaf("Sodium", sodium)]
+            other = max(0, n["minerals"] - sodium)
+            if other > 0:
+                mineral_children.append(_leaf("Other Minerals", other, "Minerals"))
+            children.append(_group("Minerals", mineral_children))
+        else:
+            children.append(_leaf("Minerals", n["minerals"]))
+
+    return _group("Nutrients", children)
+
+
+def fat_hierarchy(n: Dict) -> Dict:
+    """buildFatTreemapData"""
+    children = []
+    for name, key, color_key in (
+        ("Saturated", "satFat", "Sat."),
+        ("Monounsaturated", "monoFat", "Mono"),
+        ("Polyunsaturated", "polyFat", "Poly"),
+        ("Trans Fat", "transFat", "Trans"),
+        ("Other", "otherFat", "Other Fats"),
+    ):
+        if n[key] > 0:
+            children.append(_leaf(name, n[key], color_key))
+    return _group("Fat", children)
+
+
+def carbs_hierarchy(n: Dict) -> Dict:
+    """buildCarbsTreemapData"""
+    children = [_leaf(name, n[key]) for name, key in (("Sugars", "sugars"), ("Fiber", "fiber"), ("Starch", "starch")) if n[key] > 0]
+    return _group("Carbs", children)
+
+
+def _leaves(data: Dict[str, float], entries) -> List[Dict]:
+    """Leaves for (name, key, divisor) entries with a positive amount."""
+    return [_leaf(name, data[key] / divisor) for name, key, divisor in entries if data[key] > 0]
+
+
+def minerals_hierarchy(n: Dict, detailed: bool, salt: bool) -> Dict:
+    """buildMineralsTreemapData; salt plays the part of showSodiumSeparately."""
+    m = n["mineralData"]
+    if not any(value > 0 for value in m.values()):
+        return _group("Minerals", [])
+
+    groups = [
+        ("Hydration & Nerves", _leaves(m, ([] if salt else [("Sodium", "sodium", 1)]) + [("Potassium", "potassium", 1), ("Chloride", "chloride", 1)])),
+        ("Bones & Structure", _leaves(m, [("Calcium", "calcium", 1), ("Phosphorus", "phosphorus", 1), ("Magnesium", "magnesium", 1)])),
+        ("Energy & Circulation", _leaves(m, [("Iron", "iron", 1), ("Copper", "copper", 1), ("Chromium", "chromium", 1), ("Manganese", "manganese", 1), ("Molybdenum", "molybdenum", 1)])),
+        ("Growth & Defense", _leaves(m, [("Zinc", "zinc", 1), ("Selenium", "selenium", 1), ("Iodine", "iodine", 1)])),
+    ]
+    children = []
+    if salt and m["sodium"] > 0:
+        children.append(_leaf("Salt", m["sodium"], "Sodium"))
+    for name, members in groups:
+        if detailed:
+            if members:
+                children.append(_group(name, _by_value(members)))
+        elif _total(members) > 0:
+            children.append(_leaf(name, _total(members)))
+    return _group("Minerals", children)
+
+
+# Vitamins reported in µg are divided by 1000 so every vitamin leaf is in mg.
+_ENERGY_VITAMINS = [
+    ("Thiamin (B1)", "thiamin", 1), ("Riboflavin (B2)", "riboflavin", 1), ("Niacin (B3)", "niacin", 1),
+    ("Pantothenic (B5)", "pantothenicAcid", 1), ("Vitamin B-6", "vitaminB6", 1), ("Biotin", "biotin", 1000),
+    ("Folate (B9)", "folate", 1000), ("Vitamin B-12", "vitaminB12", 1000), ("Choline", "choline", 1),
+]
+_GROWTH_VITAMINS = [
+    ("Vitamin A", "vitaminA", 1000), ("Vitamin C", "vitaminC", 1), ("Vitamin D", "vitaminD", 1000),
+    ("Vitamin E", "vitaminE", 1), ("Vitamin K", "vitaminK", 1000),
+]
+
+
+def vitamins_hierarchy(n: Dict, detailed: bool) -> Dict:
+    """buildVitaminsTreemapData"""
+    v = n["vitaminData"]
+    if not any(value > 0 for value in v.values()):
+        return _group("Vitamins", [])
+
+    children = []
+    for name, members in (
+        ("Energy & Metabolism", _leaves(v, _ENERGY_VITAMINS)),
+        ("Growth & Regulation", _leaves(v, _GROWTH_VITAMINS)),
+    ):
+        if detailed:
+            if members:
+                children.append(_group(name, _by_value(members)))
+        elif _total(members) > 0:
+            children.append(_leaf(name, _total(members)))
+    return _group("Vitamins", children)
+
+
+def micronutrients_hierarchy(n: Dict, detailed: bool, salt: bool) -> Dict:
+    """buildMicronutrientsTreemapData; salt plays the part of showSodiumSeparately."""
+    m, v = n["mineralData"], n["vitaminData"]
+    electrolytes = _leaves(m, ([] if salt else [("Sodium", "sodium", 1)]) + [("Potassium", "potassium", 1)])
+    macro_minerals = _leaves(m, [("Calcium", "calcium", 1), ("Phosphorus", "phosphorus", 1), ("Magnesium", "magnesium", 1)])
+    trace_minerals = _leaves(m, [("Iron", "iron", 1), ("Zinc", "zinc", 1), ("Copper", "copper", 1), ("Manganese", "manganese", 1), ("Selenium", "selenium", 1)])
+    water_soluble = _leaves(v, [
+        ("Vitamin C", "vitaminC", 1), ("Thiamin (B1)", "thiamin", 1), ("Riboflavin (B2)", "riboflavin", 1),
+        ("Niacin (B3)", "niacin", 1), ("Pantothenic (B5)", "pantothenicAcid", 1), ("Vitamin B-6", "vitaminB6", 1),
+        ("Folate (B9)", "folate", 1000), ("Vitamin B-12", "vitaminB12", 1000), ("Choline", "choline", 1),
+    ])
+    fat_soluble = _leaves(v, [("Vitamin A", "vitaminA", 1000), ("Vitamin D", "vitaminD", 1000), ("Vitamin E", "vitaminE", 1), ("Vitamin K", "vitaminK", 1000)])
+
+    children = []
+    if salt and m["sodium"] > 0:
+        children.append(_leaf("Salt", m["sodium"], "Sodium"))
+    if not detailed:
+        mineral_total = _total(electrolytes) + _total(macro_minerals) + _total(trace_minerals)
+        vitamin_total = _total(water_soluble) + _total(fat_soluble)
+        if mineral_total > 0:
+            children.append(_leaf("Minerals", mineral_total))
+        if vitamin_total > 0:
+            children.append(_leaf("Vitamins", vitamin_total))
+    else:
+        for name, members, color_key in (
+            ("Electrolytes", electrolytes, None),
+            ("Macro Minerals", macro_minerals, None),
+            ("Trace Minerals", trace_minerals, None),
+            ("Water-Soluble Vits", water_soluble, "Water-Soluble"),
+            ("Fat-Soluble Vits", fat_soluble, "Fat-Soluble"),
+        ):
+            if members:
+                children.append(_group(name, _by_value(members), color_key))
+    return _group("Micronutrients", children)
+
+
+def protein_hierarchy(n: Dict, detailed: bool) -> Dict:
+    """buildProteinTreemapData"""
+    children = []
+    if n["aminoAcids"]:
+        for name, members in zip(("Essential", "Conditional", "Non-Essential"), _amino_acid_groups(n["aminoAcids"])):
+            if detailed:
+                if members:
+                    children.append(_group(name, _by_value(members)))
+            elif _total(members) > 0:
+                children.append(_leaf(name, _total(members)))
+    if not children and n["protein"] > 0:
+        children.append(_leaf("Total Protein", n["protein"], "Protein"))
+    return _group("Protein", children)
+
+
+def treemap_hierarchies(n: Dict) -> Dict[str, Dict[str, Dict]]:
+    """
+    chart -> variant -> hierarchy. Variants are "summary" and "detailed" (the
+    subtypes toggle), with a "+salt" suffix for the charts in SALT_CHARTS when
+    sodium is shown separately. Fat and carbs have a single "detailed" variant.
+    """
+    charts = {
+        "macro": {"summary": macro_hierarchy(n, False), "detailed": macro_hierarchy(n, True)},
+        "fat": {"detailed": fat_hierarchy(n)},
+        "carbs": {"detailed": carbs_hierarchy(n)},
+        "protein": {"summary": protein_hierarchy(n, False), "detailed": protein_hierarchy(n, True)},
+        "micronutrients": {},
+        "minerals": {},
+        "vitamins": {"summary": vitamins_hierarchy(n, False), "detailed": vitamins_hierarchy(n, True)},
+    }
+    for salt in (False, True):
+        suffix = "+salt" if salt else ""
+        for detailed in (False, True):
+            variant = ("detailed" if detailed else "summary") + suffix
+            charts["micronutrients"][variant] = micronutrients_hierarchy(n, detailed, salt)
+            charts["minerals"][variant] = minerals_hierarchy(n, detailed, salt)
+    return charts
+
+
+def voronoi_items(hierarchy: Dict) -> List[Dict]:
+    """
+    flattenVoronoiItems: one item per positive leaf two levels deep, tagged with
+    its top-level group, sorted largest first as renderCircularVoronoi does.
+    """
+    items = []
+    for child in hierarchy["children"]:
+        for node in child.get("children") or [child]:
+            if node.get("value", 0) > 0:
+                item = {"name": node["name"], "value": node["value"], "group": child["name"]}
+                if "colorKey" in node:
+                    item["colorKey"] = node["colorKey"]
+                items.append(item)
+    return sorted(items, key=lambda item: item["value"], reverse=True)
+
+
+@lru_cache(maxsize=VORONOI_CACHE_ENTRIES)
+def _solve_voronoi(values: Tuple[float, ...], size: float) -> Optional[Dict]:
+    # Imported here so NumPy loads with the first bundle, not with the app.
+    from utils.voronoi import circular_voronoi
+
+    return circular_voronoi(values, size)
+
+
+def voronoi_layouts(
+    treemaps: Dict[str, Dict[str, Dict]],
+    size: float = VORONOI_SIZE,
+) -> Dict[str, Dict[str, Optional[Dict]]]:
+    """
+    chart -> variant -> {"size", "radius", "cells"} for every treemap hierarchy,
+    each cell being a voronoi_items entry plus its polygon, centroid and share.
+    Variants with the same values share one solve.
+    """
+    layouts: Dict[str, Dict[str, Optional[Dict]]] = {}
+    for chart, variants in treemaps.items():
+        layouts[chart] = {}
+        for variant, hierarchy in variants.items():
+            items = voronoi_items(hierarchy)
+            layout = _solve_voronoi(tuple(item["value"] for item in items), size)
+            if layout is None:
+                layouts[chart][variant] = None
+                continue
+            layouts[chart][variant] = {
+                "size": layout["size"],
+                "radius": layout["radius"],
+                "cells": [dict(item, **cell) for item, cell in zip(items, layout["cells"])],
+            }
+    return layouts
+
+
+def build_chart_bundle(food_data: Dict, portion: Optional[float] = None) -> Dict:
+    """
+    Chart bundle for one food and portion.
+
+    Args:
+        food_data: USDA food data dictionary
+        portion: Portion weight in grams; None for the USDA 100g basis
+
+    Returns:
+        {"fdcId", "description", "dataType", "portion", "portions", "nutrients"}
+    """
+    return {
+        "fdcId": food_data.get("fdcId"),
+        "description": food_data.get("description"),
+        "dataType": food_data.get("dataType"),
+        "portion": portion,
+        "portions": list_portions(food_data),
+        "nutrients": parse_nutrients(food_data, portion),
+    }
+
+
+def build_voronoi_bundle(food_data: Dict) -> Dict:
+    """
+    Solved Voronoi layouts for every treemap hierarchy of a food.
+
+    Cells only depend on relative values, so the layouts are solved on the 100g
+    basis and serve every portion; the cells' values are per 100g.
+
+    Returns:
+        {"fdcId", "layouts": chart -> variant -> {"size", "radius", "cells"} or None}
+    """
+    return {
+        "fdcId": food_data.get("fdcId"),
+        "layouts": voronoi_layouts(treemap_hierarchies(parse_nutrients(food_data))),
+    }
@@ -0,0 +1,282 @@
+"""
+Side-by-side comparison of foods over the Sankey node set, and a
+nearest-neighbour index for "most similar foods".
+
+A food's comparison vector is its Sankey link values per 100 g (VECTOR_FIELDS:
+the derived values of the full forward layout). Vectors for a whole request are
+computed in one pass with the column functions of utils.batch_transformer.
+
+NeighborIndex holds the vector of every food the server has seen, plus the local
+food index when one is configured, in one float32 matrix. A lookup is a
+matrix-vector product and an argpartition: exact, and a few milliseconds at
+several hundred thousand foods, so no approximate index is needed.
+"""
+import logging
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from utils.batch_transformer import derive_values, extract_slot_matrix, resolve_quantities
+from utils.nutrient_spec import SLOT_BY_ID, SLOT_COUNT, layout
+
+logger = logging.getLogger(__name__)
+
+# Value names of the full forward layout (sodium split out, fat broken down), in link order.
+VECTOR_FIELDS: Tuple[str, ...] = tuple(dict.fromkeys(name for _, _, name in layout(False, True, True)[1]))
+INITIAL_CAPACITY = 1024
+# Foods converted per chunk while loading the local food index.
+LOAD_CHUNK = 8192
+
+
+def _values(slots: np.ndarray) -> Dict[str, np.ndarray]:
+    return derive_values(resolve_quantities(slots))
+
+
+def vector_matrix(foods: Sequence[Dict]) -> np.ndarray:
+    """
+    (N, len(VECTOR_FIELDS)) matrix of per-100 g comparison vectors.
+    """
+    values = _values(extract_slot_matrix(list(foods)))
+    return np.column_stack([values[name] for name in VECTOR_FIELDS]).reshape(len(foods), len(VECTOR_FIELDS))
+
+
+def _slot_row(nutrient_ids: Iterable[int], amounts: Iterable[float]) -> List[float]:
+    # resolve_slots for packed (id, amount) vectors, whose entries all carry ids.
+    row: List[Optional[float]] = [None] * SLOT_COUNT
+    for nutrient_id, amount in zip(nutrient_ids, amounts):
+        slot = SLOT_BY_ID.get(nutrient_id)
+        if slot is not None and row[slot] is None:
+            row[slot] = amount or 0.0
+    return [0.0 if amount is None else amount for amount in row]
+
+
+def merged_sankey(labels: List[str], node_names: List[str], link_spec, link_values: np.ndarray) -> Dict:
+    """
+    One Sankey with a node per food in place of "Total": links touching Total
+    are kept per food, every other link is summed over the foods.
+    """
+    total = node_names.index("Total")
+    shared = [i for i in range(len(node_names)) if i != total]
+    position = {old: len(labels) + k for k, old in enumerate(shared)}
+    summed = link_values.sum(axis=0)
+    links = []
+    for j, (source, target, _) in enumerate(link_spec):
+        if total in (source, target):
+            for f in range(len(labels)):
+                value = float(link_values[f, j])
+                if value > 0:
+                    links.append({
+                        "source": f if source == total else position[source],
+                        "target": f if target == total else position[target],
+                        "value": value,
+                    })
+        elif summed[j] > 0:
+            links.append({"source": position[source], "target": position[target], "value": float(summed[j])})
+    names = labels + [node_names[i] for i in shared]
+    return {"nodes": [{"node": i, "name": name} for i, name in enumerate(names)], "links": links}
+
+
+def compare_foods(
+    foods: Sequence[Dict],
+    portions: Optional[Sequence[Optional[float]]] = None,
+    reverse_hierarchy: bool = False,
+    show_sodium: bool = False,
+    show_fat_breakdown: bool = True,
+) -> Dict:
+    """
+    Align foods on one Sankey layout and diff them against the first.
+
+    Returns:
+        nodes:     the layout's nodes, shared by every food
+        links:     [{"source", "target", "values", "deltas"}], one value per food
+                   (scaled to its portion) and its difference from the first food;
+                   links that are zero for every food are left out
+        distances: Euclidean distance of each food's per-100 g vector from the first
+        merged:    merged_sankey of all foods, labelled by description
+    """
+    foods = list(foods)
+    node_names, link_spec = layout(reverse_hierarchy, show_sodium, show_fat_breakdown)
+    nodes = [{"node": i, "name": name} for i, name in enumerate(node_names)]
+    if not foods:
+        return {"nodes": nodes, "links": [], "distances": [], "merged": {"nodes": [], "links": []}}
+    values = _values(extract_slot_matrix(foods))
+    scale = np.array([p / 100.0 if p else 1.0 for p in (portions or [None] * len(foods))])
+    link_values = np.column_stack([values[name] for _, _, name in link_spec]) * scale[:, None]
+    deltas = link_values - link_values[0]
+    vectors = np.column_stack([values[name] for name in VECTOR_FIELDS])
+    distances = np.sqrt(((vectors - vectors[0]) ** 2).sum(axis=1))
+
+    present = (link_values > 0).any(axis=0)
+    links = [
+        {"source": source, "target": target, "values": link_values[:, j].tolist(), "deltas": deltas[:, j].tolist()}
+        for j, (source, target, _) in enumerate(link_spec)
+        if present[j]
+    ]
+    labels = [food.get("description") or str(food.get("fdcId", "")) for food in foods]
+    return {
+        "nodes": nodes,
+        "links": links,
+        "distances": distances.tolist(),
+        "merged": merged_sankey(labels, node_names, link_spec, link_values),
+    }
+
+
+class NeighborIndex:
+    def __init__(
+        self,
+        loader: Optional[Callable[[], Iterable[Tuple[int, str, str, array, array]]]] = None,
+        max_entries: int = 500_000,
+    ):
+        """
+        Args:
+            loader: Yields (fdcId, description, dataType, nutrient ids, amounts) to
+                bulk-load in the background, e.g. FoodIndex.iter_vectors
+            max_entries: Foods kept; later foods are not indexed
+        """
+        self.max_entries = max_entries
+        # One row per field, so a lookup multiplies against contiguous rows.
+        self._vectors = np.zeros((len(VECTOR_FIELDS), INITIAL_CAPACITY), dtype=np.float32)
+        self._norms = np.zeros(INITIAL_CAPACITY, dtype=np.float32)
+        self._ids = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._summaries: List[Tuple[str, str]] = []
+        self._known: Set[int] = set()
+        self._count = 0
+        self._lock = threading.Lock()
+        self._loader = loader
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _start_load(self) -> None:
+        # Same pattern as TypeaheadIndex: load once in the background and serve
+        # what is indexed so far in the meantime.
+        with self._lock:
+            loader, self._loader = self._loader, None
+        if loader is not None:
+            threading.Thread(target=self._load, args=(loader,), name="neighbors-load", daemon=True).start()
+
+    def preload(self) -> None:
+        """
+        Run the pending bulk load now, in the calling thread.
+        """
+        with self._lock:
+            loader, self._loader = self._loader, None
+        if loader is not None:
+            self._load(loader)
+
+    def _load(self, loader: Callable[[], Iterable[Tuple[int, str, str, array, array]]]) -> None:
+        loaded = 0
+        try:
+            ids, summaries, rows = [], [], []
+            for fdc_id, description, data_type, nutrient_ids, amounts in loader():
+                ids.append(fdc_id)
+                summaries.append((description or "", data_type or ""))
+                rows.append(_slot_row(nutrient_ids, amounts))
+                if len(rows) >= LOAD_CHUNK:
+                    loaded += self._append_slots(ids, summaries, rows)
+                    ids, summaries, rows = [], [], []
+            loaded += self._append_slots(ids, summaries, rows)
+        except Exception as e:
+            logger.warning(f"Neighbor index load from the local food index failed: {str(e)}")
+            return
+        logger.info(f"Neighbor index loaded {loaded} foods from the local food index")
+
+    def _append_slots(self, ids: List[int], summaries: List[Tuple[str, str]], rows: List[List[float]]) -> int:
+        if not rows:
+            return 0
+        values = _values(np.array(rows, dtype=np.float64))
+        return self._append(ids, summaries, np.column_stack([values[name] for name in VECTOR_FIELDS]))
+
+    def _append(self, ids: List[int], summaries: List[Tuple[str, str]], vectors: np.ndarray) -> int:
+        added = 0
+        with self._lock:
+            for fdc_id, summary, vector in zip(ids, summaries, vectors):
+                if fdc_id in self._known or self._count >= self.max_entries:
+                    continue
+                if self._count == len(self._ids):
+                    self._grow()
+                row = self._count
+                self._vectors[:, row] = vector
+                self._norms[row] = float(np.dot(self._vectors[:, row], self._vectors[:, row]))
+                self._ids[row] = fdc_id
+                self._summaries.append(summary)
+                self._known.add(fdc_id)
+                self._count = row + 1
+                added += 1
+        return added
+
+    def _grow(self) -> None:
+        # New arrays rather than resizing in place, so readers holding the old
+        # ones keep a consistent view.
+        capacity = 2 * len(self._ids)
+        vectors = np.zeros((self._vectors.shape[0], capacity), dtype=np.float32)
+        vectors[:, :self._count] = self._vectors[:, :self._count]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:self._count] = self._norms[:self._count]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._count] = self._ids[:self._count]
+        self._vectors, self._norms, self._ids = vectors, norms, ids
+
+    def add_many(self, foods: Iterable[Dict]) -> int:
+        """
+        Index food records (with foodNutrients) not seen before. Returns how many were added.
+        """
+        if self._loader is not None:
+            self._start_load()
+        new = []
+        for food in foods:
+            try:
+                fdc_id = int(food["fdcId"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if fdc_id not in self._known and food.get("foodNutrients"):
+                new.append((fdc_id, food))
+        if not new:
+            return 0
+        vectors = vector_matrix([food for _, food in new])
+        summaries = [(food.get("description") or "", food.get("dataType") or "") for _, food in new]
+        return self._append([fdc_id for fdc_id, _ in new], summaries, vectors)
+
+    def nearest(self, vectors: np.ndarray, limit: int = 5, exclude: Iterable[int] = ()) -> List[List[Dict]]:
+        """
+        The `limit` indexed foods closest to each row of `vectors` (per-100 g
+        comparison vectors), nearest first, skipping fdcIds in `exclude`.
+        Items are {"fdcId", "description", "dataType", "distance"}.
+        """
+        if self._loader is not None:
+            self._start_load()
+        with self._lock:
+            count = self._count
+            matrix, norms, ids, summaries = self._vectors[:, :count], self._norms[:count], self._ids[:count], self._summaries
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, matrix.shape[0])
+        if count == 0 or limit <= 0:
+            return [[] for _ in range(len(queries))]
+        exclude = {int(fdc_id) for fdc_id in exclude}
+        want = min(count, limit + len(exclude))
+        # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, for every query at once.
+        squared = queries @ matrix
+        squared *= -2.0
+        squared += norms
+        squared += (queries * queries).sum(axis=1)[:, None]
+        results = []
+        for row in squared:
+            top = np.argpartition(row, want - 1)[:want] if want < count else np.arange(count)
+            top = top[np.argsort(row[top], kind="stable")]
+            matches = []
+            for position in top:
+                fdc_id = int(ids[position])
+                if fdc_id in exclude:
+                    continue
+                description, data_type = summaries[position]
+                matches.append({
+                    "fdcId": fdc_id,
+                    "description": description,
+                    "dataType": data_type,
+                    "distance": float(np.sqrt(max(row[position], 0.0))),
+                })
+                if len(matches) == limit:
+                    break
+            results.append(matches)
+        return results
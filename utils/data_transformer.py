@@ -1,159 +1,137 @@
-from typing import Dict, List
+import math
+from typing import Dict, List, Optional
 
-def transform_to_sankey(food_data: Dict, reverse_hierarchy: bool = False) -> Dict:
+from utils.nutrient_spec import derive_values, layout, resolve_quantities
+
+
+def transform_to_sankey(
+    food_data: Dict,
+    reverse_hierarchy: bool = False,
+    show_sodium: bool = False,
+    show_fat_breakdown: bool = True,
+    portion: Optional[float] = None,
+) -> Dict:
     """
-    Transform USDA food data into Sankey diagram format with detailed nutrient breakdown
-    
+    Transform USDA food data into Sankey diagram format with detailed nutrient breakdown.
+    Nodes, links and nutrient matching come from utils/nutrient_spec.py, which also
+    generates the tables the Cloudflare worker uses, so both return the same payload.
+
+    Normal hierarchy (macro -> detail):
+        Total -> Water / Protein / Minerals (and Sodium)
+        Total -> Sat./Mono/Poly/Trans/Other Fats -> Fat (Total -> Fat without the breakdown)
+        Total -> Carbs -> Sugars/Fiber/Starch
+    Reverse hierarchy (detail -> macro):
+        Fat -> Sat./Mono/Poly/Trans/Other Fats -> Total (Fat -> Total without the breakdown)
+        Carbs -> Sugars/Fiber/Starch -> Total
+        Protein / Water / Minerals (and Sodium) -> Total
+
     Args:
         food_data: USDA food data dictionary
         reverse_hierarchy: If True, flow goes from subtypes → macros (detail first, aggregate at end)
                           If False (default), flow goes from macros → subtypes (aggregate first)
+        show_sodium: If True, split Sodium out of Minerals into its own node
+        show_fat_breakdown: If False, Fat is a single node without saturated/mono/poly/trans subtypes
+        portion: Portion weight in grams; link values are scaled from the USDA 100g basis
     """
-    nodes = []
-    links = []
-    node_index = {}
-    current_node = 0
-
-    # Initialize nodes (Amino Acids removed - it's 1:1 with Protein)
-    node_names = [
-        "Total", "Water", "Minerals", "Protein",
-        "Fat", "Sat.", "Mono", "Poly", "Trans", "Other Fats", "Fatty Acids",
-        "Carbs", "Sugars", "Fiber", "Starch"
-    ]
-    
-    for name in node_names:
-        nodes.append({"node": current_node, "name": name})
-        node_index[name] = current_node
-        current_node += 1
+    node_names, link_spec = layout(reverse_hierarchy, show_sodium, show_fat_breakdown)
+    values = derive_values(resolve_quantities(food_data.get("foodNutrients") or []))
+    scale = portion / 100.0 if portion else 1.0
 
-    # Helper function to find nutrient amount
-    def get_nutrient_amount(nutrient_names: List[str]) -> float:
-        """
-        Sum the amount for any nutrient whose name matches one of the provided aliases.
-        Avoid double-counting by scanning the nutrient list once and matching against a set.
-        """
-        aliases = {n.lower() for n in nutrient_names}
-        amount = 0.0
-        for nutrient in food_data.get("foodNutrients", []):
-            name = nutrient.get("nutrient", {}).get("name", "").lower()
-            if name in aliases:
-                amount += nutrient.get("amount", 0) or 0.0
-        return amount
-
-    # Helper to add link (respects reverse_hierarchy by swapping source/target)
-    def add_link(source_name: str, target_name: str, value: float):
+    links = []
+    for source, target, name in link_spec:
+        value = values[name]
         if value > 0:
-            if reverse_hierarchy:
-                links.append({"source": node_index[target_name], "target": node_index[source_name], "value": value})
-            else:
-                links.append({"source": node_index[source_name], "target": node_index[target_name], "value": value})
-
-    # Get all nutrient values
-    water = get_nutrient_amount(["Water"])
-    protein = get_nutrient_amount(["Protein"])
-    fat = get_nutrient_amount(["Total lipid (fat)"])
-    carbs = get_nutrient_amount(["Carbohydrate, by difference"])
-    
-    # Minerals/Ash - if not available, calculate as remainder of 100g
-    ash_value = get_nutrient_amount(["Ash"])
-    if ash_value > 0:
-        minerals = ash_value
-    else:
-        # Calculate as remainder: 100 - (water + protein + fat + carbs)
-        total_macros = water + protein + fat + carbs
-        minerals = max(0, 100 - total_macros) if total_macros < 100 else 0
+            if scale != 1.0:
+                value *= scale
+            links.append({"source": source, "target": target, "value": value})
 
-    # Fat subtypes
-    sat_fat = get_nutrient_amount(["Fatty acids, total saturated"]) or (fat * 0.42 if fat > 0 else 0)
-    mono_fat = get_nutrient_amount(["Fatty acids, total monounsaturated"]) or (fat * 0.45 if fat > 0 else 0)
-    poly_fat = get_nutrient_amount(["Fatty acids, total polyunsaturated"]) or (fat * 0.07 if fat > 0 else 0)
-    trans_fat = get_nutrient_amount(["Fatty acids, total trans", "Trans fat", "Trans fatty acids"])
-    other_fat = fat - (sat_fat + mono_fat + poly_fat + trans_fat) if fat > 0 else 0
+    return {
+        "nodes": [{"node": i, "name": name} for i, name in enumerate(node_names)],
+        "links": links
+    }
 
-    # Carb subtypes
-    sugars = get_nutrient_amount([
-        "Sugars, total including NLEA",
-        "Sugars, total",
-        "Total Sugars",
-        "Sugars, total NLEA"
-    ]) or (carbs * 0.1 if carbs > 0 else 0)
-    fiber = get_nutrient_amount([
-        "Fiber, total dietary",
-        "Dietary fiber, total",
-        "Dietary Fiber"
-    ]) or (carbs * 0.05 if carbs > 0 else 0)
-    starch = carbs - (sugars + fiber) if carbs > 0 else 0
 
-    if reverse_hierarchy:
-        # Reverse hierarchy: Total → subtypes → macros
-        # Total feeds directly into the most detailed level
-        
-        # Water stays simple (no subtypes)
-        add_link("Total", "Water", water)
-        
-        # Minerals stays simple
-        add_link("Total", "Minerals", minerals)
-        
-        # Protein goes directly to Total (no Amino Acids layer)
-        add_link("Total", "Protein", protein)
-        
-        # Fat: Total → Fatty Acids → (Sat/Mono/Poly/Trans) → Fat
-        # Also Total → Other Fats → Fat
-        fatty_acids_total = sat_fat + mono_fat + poly_fat + trans_fat
-        add_link("Total", "Fatty Acids", fatty_acids_total)
-        add_link("Total", "Other Fats", other_fat)
-        
-        add_link("Fatty Acids", "Sat.", sat_fat)
-        add_link("Fatty Acids", "Mono", mono_fat)
-        add_link("Fatty Acids", "Poly", poly_fat)
-        add_link("Fatty Acids", "Trans", trans_fat)
-        
-        add_link("Sat.", "Fat", sat_fat)
-        add_link("Mono", "Fat", mono_fat)
-        add_link("Poly", "Fat", poly_fat)
-        add_link("Trans", "Fat", trans_fat)
-        add_link("Other Fats", "Fat", other_fat)
-        
-        # Carbs: Total → (Sugars/Fiber/Starch) → Carbs
-        add_link("Total", "Sugars", sugars)
-        add_link("Total", "Fiber", fiber)
-        add_link("Total", "Starch", starch)
-        
-        add_link("Sugars", "Carbs", sugars)
-        add_link("Fiber", "Carbs", fiber)
-        add_link("Starch", "Carbs", starch)
-        
+def _portion_description(portion: Dict) -> str:
+    """
+    Label a USDA foodPortions entry the same way the treemap portion dropdown does.
+    """
+    # Math.round and Number#toString semantics: halves round up, integral floats print without ".0".
+    grams = math.floor(portion["gramWeight"] + 0.5)
+    amount = portion.get("amount")
+    if isinstance(amount, float) and amount.is_integer():
+        amount = int(amount)
+    amount_text = f"{amount!r} " if amount and amount != 1 else ""
+    unit = portion.get("measureUnit") or {}
+    if portion.get("portionDescription"):
+        description = f"{portion['portionDescription']} ({grams}g)"
+    elif portion.get("modifier") and portion["modifier"].strip():
+        description = f"{amount_text}{portion['modifier']} ({grams}g)"
+    elif unit.get("name"):
+        description = f"{amount_text}{unit['name']} ({grams}g)"
+    elif unit.get("abbreviation"):
+        description = f"{amount_text}{unit['abbreviation']} ({grams}g)"
     else:
-        # Normal hierarchy: Total → macros → subtypes
-        
-        # Water content
-        add_link("Total", "Water", water)
+        description = f"Serving ({grams}g)"
+    return " ".join(description.split())
 
-        # Protein (terminal node - no Amino Acids layer)
-        add_link("Total", "Protein", protein)
-
-        # Fat breakdown
-        add_link("Total", "Fat", fat)
-        add_link("Fat", "Sat.", sat_fat)
-        add_link("Sat.", "Fatty Acids", sat_fat)
-        add_link("Fat", "Mono", mono_fat)
-        add_link("Mono", "Fatty Acids", mono_fat)
-        add_link("Fat", "Poly", poly_fat)
-        add_link("Poly", "Fatty Acids", poly_fat)
-        add_link("Fat", "Trans", trans_fat)
-        add_link("Trans", "Fatty Acids", trans_fat)
-        add_link("Fat", "Other Fats", other_fat)
+def list_portions(food_data: Dict) -> List[Dict]:
+    """
+    Available portions for a food, always starting with the 100g default.
+    Each entry has the foodPortions id (None for the default), a description and gramWeight.
+    """
+    portions = [{"id": None, "description": "100g (default)", "gramWeight": 100.0}]
+    for portion in food_data.get("foodPortions") or []:
+        if portion.get("gramWeight") and portion["gramWeight"] > 0:
+            portions.append({
+                "id": portion.get("id"),
+                "description": _portion_description(portion),
+                "gramWeight": float(portion["gramWeight"]),
+            })
+    return portions
 
-        # Carbohydrates breakdown
-        add_link("Total", "Carbs", carbs)
-        add_link("Carbs", "Sugars", sugars)
-        add_link("Carbs", "Fiber", fiber)
-        add_link("Carbs", "Starch", starch)
+def resolve_portion(food_data: Dict, portion: Optional[float] = None, portion_id: Optional[int] = None) -> Optional[float]:
+    """
+    Resolve a gram weight or a foodPortions id to grams (None means the 100g basis).
+    Raises ValueError for an id the food does not have.
+    """
+    if portion_id is None:
+        return portion
+    for entry in list_portions(food_data):
+        if entry["id"] is not None and str(entry["id"]) == str(portion_id):
+            return entry["gramWeight"]
+    raise ValueError(f"Food {food_data.get('fdcId')} has no portion {portion_id}")
 
-        # Minerals
-        add_link("Total", "Minerals", minerals)
+def transform_to_sankey_portions(
+    food_data: Dict,
+    reverse_hierarchy: bool = False,
+    show_sodium: bool = False,
+    show_fat_breakdown: bool = True,
+) -> Dict:
+    """
+    Sankey data for every available portion in one columnar payload.
 
+    Portions only scale link values, so nodes and link endpoints are shared:
+        nodes:    [{"node", "name"}, ...]
+        sources:  [link source index, ...]
+        targets:  [link target index, ...]
+        portions: list_portions(food_data)
+        values:   one row per portion, one column per link (rounded to 4 decimals)
+    """
+    base = transform_to_sankey(
+        food_data,
+        reverse_hierarchy=reverse_hierarchy,
+        show_sodium=show_sodium,
+        show_fat_breakdown=show_fat_breakdown,
+    )
+    base_values = [link["value"] for link in base["links"]]
+    portions = list_portions(food_data)
     return {
-        "nodes": nodes,
-        "links": links
+        "nodes": base["nodes"],
+        "sources": [link["source"] for link in base["links"]],
+        "targets": [link["target"] for link in base["links"]],
+        "portions": portions,
+        "values": [
+            [round(value * portion["gramWeight"] / 100.0, 4) for value in base_values]
+            for portion in portions
+        ],
     }
@@ -0,0 +1,238 @@
+"""
+Streaming NDJSON export of Sankey nutrient flows for every food matching a search.
+
+Search pages are fetched lazily in ascending fdcId order, food details for each
+page are fetched with get_foods_data (batched, bounded concurrency), and one
+JSON line is produced per food, so memory stays constant however many foods
+match. Because results are ordered by fdcId, an interrupted export resumes
+after the last id written: a binary search over the pages finds the first page
+holding a later id, so only a few pages are fetched to skip the rest.
+
+Usage:
+    python -m utils.export "cereal" --data-types Branded --output cereals.ndjson
+    python -m utils.export "cereal" --data-types Branded --output cereals.ndjson --resume
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+from utils.data_transformer import transform_to_sankey
+from utils.log_config import configure_logging
+from utils.usda_api import get_foods_data, search_foods
+
+logger = logging.getLogger(__name__)
+
+# USDA caps foods/search at 200 results per page.
+EXPORT_PAGE_SIZE = 200
+
+
+class ExportError(Exception):
+    """Raised when a search page cannot be fetched, so the export cannot continue."""
+
+    def __init__(self, message: str, status: int = 502):
+        super().__init__(message)
+        self.status = status
+
+
+def _search_page(query: str, page: int, *, data_types: Optional[List[str]], page_size: int, request_id: Optional[str]) -> Dict:
+    result = search_foods(query, page_size=page_size, page=page, request_id=request_id, data_types=data_types, sort_by="fdcId")
+    if "error" in result:
+        raise ExportError(result["error"], result.get("status") or 502)
+    return result
+
+
+def iter_search_hits(
+    query: str,
+    *,
+    data_types: Optional[List[str]] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+    request_id: Optional[str] = None,
+    start_page: int = 1,
+) -> Iterator[List[Dict]]:
+    """
+    Yield search result pages (lists of hits) in ascending fdcId order, one request at a time.
+    """
+    page = start_page
+    while True:
+        result = _search_page(query, page, data_types=data_types, page_size=page_size, request_id=request_id)
+        hits = result.get("results", [])
+        if not hits:
+            return
+        yield hits
+        if page >= result.get("totalPages", 0):
+            return
+        page += 1
+
+
+def find_resume_page(
+    query: str,
+    resume_after: int,
+    *,
+    data_types: Optional[List[str]] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+    request_id: Optional[str] = None,
+) -> int:
+    """
+    First search page that can hold an fdcId above resume_after. Pages are in
+    ascending fdcId order, so this is a binary search on each page's last id,
+    fetching about log2(totalPages) pages.
+    """
+    first = _search_page(query, 1, data_types=data_types, page_size=page_size, request_id=request_id)
+    hits = first.get("results", [])
+    if not hits or int(hits[-1]["fdcId"]) > resume_after:
+        return 1
+    # Page `done` ends at or before resume_after; page `pending` does not (or is past the end).
+    done, pending = 1, first.get("totalPages", 1) + 1
+    while pending - done > 1:
+        middle = (done + pending) // 2
+        hits = _search_page(query, middle, data_types=data_types, page_size=page_size, request_id=request_id).get("results", [])
+        if hits and int(hits[-1]["fdcId"]) <= resume_after:
+            done = middle
+        else:
+            pending = middle
+    return pending
+
+
+def iter_export_records(
+    query: str,
+    *,
+    data_types: Optional[List[str]] = None,
+    reverse_hierarchy: bool = False,
+    show_sodium: bool = False,
+    show_fat_breakdown: bool = True,
+    portion: Optional[float] = None,
+    resume_after: Optional[int] = None,
+    request_id: Optional[str] = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> Iterator[Dict]:
+    """
+    Yield one record per matching food: its search metadata plus the Sankey payload,
+    or an error entry when that food could not be fetched.
+    """
+    start_page = 1
+    if resume_after is not None:
+        start_page = find_resume_page(query, resume_after, data_types=data_types, page_size=page_size, request_id=request_id)
+    for hits in iter_search_hits(query, data_types=data_types, page_size=page_size, request_id=request_id, start_page=start_page):
+        if resume_after is not None:
+            hits = [hit for hit in hits if int(hit["fdcId"]) > resume_after]
+            if not hits:
+                continue
+        foods = get_foods_data([hit["fdcId"] for hit in hits], request_id=request_id, index=False)
+        for hit in hits:
+            record = {
+                "fdcId": hit["fdcId"],
+                "description": hit.get("description", ""),
+                "dataType": hit.get("dataType", ""),
+                "brandOwner": hit.get("brandOwner", ""),
+            }
+            food_data = foods.get(str(hit["fdcId"])) or {"error": "Food not returned by USDA", "status": 404}
+            if "error" in food_data:
+                record["error"] = food_data["error"]
+                record["status"] = food_data.get("status", 502)
+            else:
+                record["sankey"] = transform_to_sankey(
+                    food_data,
+                    reverse_hierarchy=reverse_hierarchy,
+                    show_sodium=show_sodium,
+                    show_fat_breakdown=show_fat_breakdown,
+                    portion=portion,
+                )
+            yield record
+
+
+def iter_ndjson(records: Iterator[Dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def last_exported_id(path: str) -> Optional[int]:
+    """
+    Return the fdcId of the last complete line in an NDJSON export, reading only its tail.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as fh:
+        fh.seek(0, os.SEEK_END)
+        end = fh.tell()
+        size = min(end, 1 << 20)
+        fh.seek(end - size)
+        lines = fh.read(size).split(b"\n")
+    for line in reversed(lines):
+        try:
+            return int(json.loads(line)["fdcId"])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return None
+
+
+def _truncate_partial_line(path: str) -> None:
+    # A crash can leave half a line at the end of the file; drop it before appending.
+    with open(path, "rb+") as fh:
+        fh.seek(0, os.SEEK_END)
+        end = fh.tell()
+        size = min(end, 1 << 20)
+        fh.seek(end - size)
+        tail = fh.read(size)
+        if tail and not tail.endswith(b"\n"):
+            fh.truncate(end - size + tail.rfind(b"\n") + 1)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export Sankey nutrient flows for every food matching a search as NDJSON")
+    parser.add_argument("query")
+    parser.add_argument("--data-types", default="", help="Comma-separated USDA data types, e.g. Branded")
+    parser.add_argument("--reverse-hierarchy", action="store_true")
+    parser.add_argument("--show-sodium", action="store_true")
+    parser.add_argument("--hide-fat-breakdown", action="store_true")
+    parser.add_argument("--portion", type=float, default=None, help="Portion weight in grams (default 100g)")
+    parser.add_argument("--output", help="Output file (default stdout)")
+    parser.add_argument("--resume-after", type=int, default=None, help="Skip foods with fdcId up to and including this one")
+    parser.add_argument("--resume", action="store_true", help="Append to --output, resuming after its last complete line")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    resume_after = args.resume_after
+    if args.resume:
+        if not args.output:
+            parser.error("--resume requires --output")
+        if os.path.exists(args.output):
+            _truncate_partial_line(args.output)
+            resume_after = last_exported_id(args.output)
+    data_types = [dt.strip() for dt in args.data_types.split(",") if dt.strip()] or None
+    request_id = uuid.uuid4().hex
+    logger.info(f"[{request_id}] export start query='{args.query}' dataTypes={data_types} resumeAfter={resume_after}")
+
+    records = iter_export_records(
+        args.query,
+        data_types=data_types,
+        reverse_hierarchy=args.reverse_hierarchy,
+        show_sodium=args.show_sodium,
+        show_fat_breakdown=not args.hide_fat_breakdown,
+        portion=args.portion,
+        resume_after=resume_after,
+        request_id=request_id,
+    )
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8") if args.output else sys.stdout
+    count = 0
+    try:
+        for line in iter_ndjson(records):
+            out.write(line)
+            count += 1
+            if count % EXPORT_PAGE_SIZE == 0:
+                out.flush()
+    except ExportError as e:
+        logger.error(f"[{request_id}] export stopped after {count} foods: {str(e)}")
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    logger.info(f"[{request_id}] export done foods={count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,496 @@
+"""
+Local FoodData Central index built from the USDA bulk downloads.
+
+Ingest streams a bulk dump (the JSON files, or a directory of the CSV files)
+into a single SQLite database holding:
+  - one row per food with its nutrient vector packed as parallel id/amount arrays
+  - a shared nutrient dictionary (id -> name, number, unit)
+  - an FTS5 prefix index over description and brand owner
+
+Usage:
+    python -m utils.food_index ingest FoodData_Central_sr_legacy_food_json.json --db foods.sqlite3
+    python -m utils.food_index ingest FoodData_Central_csv_2024-10-31/ --db foods.sqlite3
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.log_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Bulk CSV data_type values mapped to the names the search API uses.
+CSV_DATA_TYPES = {
+    "foundation_food": "Foundation",
+    "sr_legacy_food": "SR Legacy",
+    "survey_fndds_food": "Survey (FNDDS)",
+    "branded_food": "Branded",
+    "experimental_food": "Experimental",
+}
+READ_CHUNK_SIZE = 1 << 20
+COMMIT_EVERY = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nutrients (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL, number TEXT, unit_name TEXT
+);
+CREATE TABLE IF NOT EXISTS foods (
+    fdc_id INTEGER PRIMARY KEY,
+    data_type TEXT NOT NULL,
+    description TEXT NOT NULL,
+    brand_owner TEXT NOT NULL DEFAULT '',
+    publication_date TEXT,
+    nutrient_ids BLOB NOT NULL,
+    amounts BLOB NOT NULL,
+    portions TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+    description, brand_owner, content='foods', content_rowid='fdc_id', prefix='2 3'
+);
+"""
+
+
+def _pack_vector(pairs: Iterable[Tuple[int, float]]) -> Tuple[bytes, bytes]:
+    ids = array("i")
+    amounts = array("d")
+    for nutrient_id, amount in pairs:
+        ids.append(nutrient_id)
+        amounts.append(amount)
+    return ids.tobytes(), amounts.tobytes()
+
+
+def _unpack_vector(ids_blob: bytes, amounts_blob: bytes) -> Tuple[array, array]:
+    ids = array("i")
+    ids.frombytes(ids_blob)
+    amounts = array("d")
+    amounts.frombytes(amounts_blob)
+    return ids, amounts
+
+
+def iter_json_foods(path: str) -> Iterator[Dict]:
+    """
+    Stream food objects out of a bulk JSON dump such as
+    {"BrandedFoods": [{...}, {...}, ...]} without loading the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as fh:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buf, pos, eof
+            chunk = fh.read(READ_CHUNK_SIZE)
+            if not chunk:
+                eof = True
+                return False
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        # Seek to the opening bracket of the top-level food array.
+        while True:
+            start = buf.find("[", pos)
+            if start != -1:
+                pos = start + 1
+                break
+            pos = len(buf)
+            if not fill():
+                return
+        while True:
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    break
+            if pos >= len(buf) or buf[pos] == "]":
+                return
+            try:
+                food, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Most likely the object straddles the chunk boundary.
+                if eof or not fill():
+                    raise
+                continue
+            pos = end
+            yield food
+
+
+def _portions_from_json(food: Dict) -> Optional[str]:
+    portions = []
+    for p in food.get("foodPortions") or []:
+        portions.append({
+            "id": p.get("id"),
+            "amount": p.get("amount"),
+            "modifier": p.get("modifier"),
+            "portionDescription": p.get("portionDescription"),
+            "gramWeight": p.get("gramWeight"),
+            "measureUnit": p.get("measureUnit"),
+        })
+    return json.dumps(portions, separators=(",", ":")) if portions else None
+
+
+class _Writer:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.known_nutrients = {row[0] for row in conn.execute("SELECT id FROM nutrients")}
+        self.count = 0
+
+    def add_nutrient(self, nutrient_id: int, name: str, number: Optional[str], unit_name: Optional[str]) -> None:
+        if nutrient_id in self.known_nutrients:
+            return
+        self.known_nutrients.add(nutrient_id)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO nutrients (id, name, number, unit_name) VALUES (?, ?, ?, ?)",
+            (nutrient_id, name, number, unit_name),
+        )
+
+    def add_food(
+        self,
+        fdc_id: int,
+        data_type: str,
+        description: str,
+        brand_owner: str,
+        publication_date: Optional[str],
+        vector: Iterable[Tuple[int, float]],
+        portions: Optional[str],
+    ) -> None:
+        ids_blob, amounts_blob = _pack_vector(vector)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO foods (fdc_id, data_type, description, brand_owner, publication_date, "
+            "nutrient_ids, amounts, portions) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (fdc_id, data_type, description, brand_owner or "", publication_date, ids_blob, amounts_blob, portions),
+        )
+        self.count += 1
+        if self.count % COMMIT_EVERY == 0:
+            self.conn.commit()
+            logger.info(f"Ingested {self.count} foods")
+
+
+def ingest_json(path: str, writer: _Writer) -> None:
+    for food in iter_json_foods(path):
+        vector = []
+        for fn in food.get("foodNutrients") or []:
+            nutrient = fn.get("nutrient") or {}
+            nutrient_id = nutrient.get("id")
+            amount = fn.get("amount")
+            if nutrient_id is None or amount is None:
+                continue
+            writer.add_nutrient(nutrient_id, nutrient.get("name", ""), nutrient.get("number"), nutrient.get("unitName"))
+            vector.append((nutrient_id, float(amount)))
+        writer.add_food(
+            food["fdcId"],
+            food.get("dataType", ""),
+            food.get("description", ""),
+            food.get("brandOwner", ""),
+            food.get("publicationDate"),
+            vector,
+            _portions_from_json(food),
+        )
+
+
+def _read_csv(directory: str, name: str) -> Iterator[Dict[str, str]]:
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        yield from csv.DictReader(fh)
+
+
+def ingest_csv(directory: str, writer: _Writer) -> None:
+    """
+    Ingest a directory of bulk CSV files. food_nutrient.csv is far too large to
+    group in memory, so rows are staged in SQLite and grouped there.
+    """
+    conn = writer.conn
+    for row in _read_csv(directory, "nutrient.csv"):
+        writer.add_nutrient(int(row["id"]), row["name"], row.get("nutrient_nbr"), row.get("unit_name"))
+    units = {row["id"]: row["name"] for row in _read_csv(directory, "measure_unit.csv")}
+
+    conn.executescript(
+        "CREATE TEMP TABLE stage_food (fdc_id INTEGER PRIMARY KEY, data_type TEXT, description TEXT, "
+        "publication_date TEXT, brand_owner TEXT DEFAULT '');"
+        "CREATE TEMP TABLE stage_nutrient (fdc_id INTEGER, nutrient_id INTEGER, amount REAL);"
+        "CREATE TEMP TABLE stage_portion (fdc_id INTEGER, seq INTEGER, portion TEXT);"
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO stage_food (fdc_id, data_type, description, publication_date) VALUES (?, ?, ?, ?)",
+        (
+            (int(r["fdc_id"]), CSV_DATA_TYPES[r["data_type"]], r["description"], r.get("publication_date"))
+            for r in _read_csv(directory, "food.csv")
+            if r.get("data_type") in CSV_DATA_TYPES
+        ),
+    )
+    conn.executemany(
+        "UPDATE stage_food SET brand_owner = ? WHERE fdc_id = ?",
+        ((r.get("brand_owner") or "", int(r["fdc_id"])) for r in _read_csv(directory, "branded_food.csv")),
+    )
+    conn.executemany(
+        "INSERT INTO stage_nutrient (fdc_id, nutrient_id, amount) VALUES (?, ?, ?)",
+        (
+            (int(r["fdc_id"]), int(r["nutrient_id"]), float(r["amount"]))
+            for r in _read_csv(directory, "food_nutrient.csv")
+            if r.get("amount") not in (None, "")
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO stage_portion (fdc_id, seq, portion) VALUES (?, ?, ?)",
+        (
+            (
+                int(r["fdc_id"]),
+                int(r.get("seq_num") or 0),
+                json.dumps({
+                    "id": int(r["id"]),
+                    "amount": float(r["amount"]) if r.get("amount") else None,
+                    "modifier": r.get("modifier") or None,
+                    "portionDescription": r.get("portion_description") or None,
+                    "gramWeight": float(r["gram_weight"]) if r.get("gram_weight") else None,
+                    "measureUnit": {"id": int(r["measure_unit_id"]), "name": units.get(r["measure_unit_id"], "")}
+                    if r.get("measure_unit_id") else None,
+                }, separators=(",", ":")),
+            )
+            for r in _read_csv(directory, "food_portion.csv")
+        ),
+    )
+    conn.execute("CREATE INDEX temp.stage_nutrient_fdc ON stage_nutrient (fdc_id)")
+    conn.execute("CREATE INDEX temp.stage_portion_fdc ON stage_portion (fdc_id, seq)")
+
+    # Separate cursors: the food scan stays open while per-food rows are fetched.
+    lookup = conn.cursor()
+    for fdc_id, data_type, description, publication_date, brand_owner in conn.cursor().execute(
+        "SELECT fdc_id, data_type, description, publication_date, brand_owner FROM stage_food ORDER BY fdc_id"
+    ):
+        vector = lookup.execute(
+            "SELECT nutrient_id, amount FROM stage_nutrient WHERE fdc_id = ?", (fdc_id,)
+        ).fetchall()
+        portions = [row[0] for row in lookup.execute(
+            "SELECT portion FROM stage_portion WHERE fdc_id = ? ORDER BY seq", (fdc_id,)
+        )]
+        writer.add_food(
+            fdc_id, data_type, description, brand_owner, publication_date, vector,
+            "[" + ",".join(portions) + "]" if portions else None,
+        )
+    conn.executescript("DROP TABLE temp.stage_food; DROP TABLE temp.stage_nutrient; DROP TABLE temp.stage_portion;")
+
+
+def ingest(paths: List[str], db_path: str) -> int:
+    """
+    Ingest one or more bulk dumps into the index at db_path. Returns the number of foods written.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    writer = _Writer(conn)
+    t0 = time.time()
+    for path in paths:
+        logger.info(f"Ingesting {path}")
+        if os.path.isdir(path):
+            ingest_csv(path, writer)
+        else:
+            ingest_json(path, writer)
+        conn.commit()
+    conn.execute("INSERT INTO foods_fts (foods_fts) VALUES ('rebuild')")
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    logger.info(f"Ingested {writer.count} foods into {db_path} in {time.time() - t0:.1f}s")
+    return writer.count
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _fts_query(query: str) -> Optional[str]:
+    tokens = _TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    # Every token must match; the last one as a prefix so partial words still hit.
+    parts = [f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*']
+    return " ".join(parts)
+
+
+class FoodIndex:
+    """
+    Read-only accessor for an index built by ingest(). Connections are opened
+    lazily per process and thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._nutrients: Optional[Dict[int, Dict]] = None
+        self._data_types: Optional[frozenset] = None
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def nutrient_table(self) -> Dict[int, Dict]:
+        if self._nutrients is None:
+            with self._lock:
+                if self._nutrients is None:
+                    self._nutrients = {
+                        row[0]: {"id": row[0], "name": row[1], "number": row[2], "unitName": row[3]}
+                        for row in self._conn().execute("SELECT id, name, number, unit_name FROM nutrients")
+                    }
+        return self._nutrients
+
+    def data_types(self) -> frozenset:
+        """
+        The data types present in the index, e.g. {"Foundation", "SR Legacy"}.
+        """
+        if self._data_types is None:
+            with self._lock:
+                if self._data_types is None:
+                    self._data_types = frozenset(
+                        row[0] for row in self._conn().execute("SELECT DISTINCT data_type FROM foods")
+                    )
+        return self._data_types
+
+    def covers(self, data_types: Iterable[str]) -> bool:
+        """
+        True if the index holds foods of every one of data_types, so a search
+        restricted to them can be answered without the live API.
+        """
+        return set(data_types) <= self.data_types()
+
+    def get_vector(self, fdc_id: int) -> Optional[Tuple[array, array]]:
+        row = self._conn().execute(
+            "SELECT nutrient_ids, amounts FROM foods WHERE fdc_id = ?", (fdc_id,)
+        ).fetchone()
+        return _unpack_vector(row[0], row[1]) if row else None
+
+    def get_food(self, fdc_id: int) -> Optional[Dict]:
+        """
+        Return the food in the same shape as the API's format=full record
+        (restricted to the fields the app uses), or None if it is not indexed.
+        """
+        row = self._conn().execute(
+            "SELECT fdc_id, data_type, description, brand_owner, publication_date, nutrient_ids, amounts, portions "
+            "FROM foods WHERE fdc_id = ?",
+            (fdc_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        table = self.nutrient_table()
+        ids, amounts = _unpack_vector(row[5], row[6])
+        food = {
+            "fdcId": row[0],
+            "dataType": row[1],
+            "description": row[2],
+            "publicationDate": row[4],
+            "foodNutrients": [
+                {"nutrient": table.get(nid) or {"id": nid, "name": ""}, "amount": amount}
+                for nid, amount in zip(ids, amounts)
+            ],
+            "foodPortions": json.loads(row[7]) if row[7] else [],
+        }
+        if row[3]:
+            food["brandOwner"] = row[3]
+        return food
+
+    def search(
+        self,
+        query: str,
+        page_size: int = 10,
+        page: int = 1,
+        data_types: Optional[List[str]] = None,
+        sort_by: Optional[str] = None,
+    ) -> Dict:
+        """
+        Prefix search over description and brand owner, in the same shape as usda_api.search_foods.
+        Results are ranked by relevance, or by ascending fdcId when sort_by="fdcId".
+        """
+        match = _fts_query(query)
+        if match is None:
+            return {"results": [], "totalPages": 0, "currentPage": page}
+        where = "foods_fts MATCH ?"
+        args: List = [match]
+        if data_types:
+            where += f" AND f.data_type IN ({','.join('?' for _ in data_types)})"
+            args.extend(data_types)
+        order = "f.fdc_id" if sort_by == "fdcId" else "bm25(foods_fts)"
+        conn = self._conn()
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM foods_fts JOIN foods f ON f.fdc_id = foods_fts.rowid WHERE {where}", args
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT f.fdc_id, f.description, f.data_type, f.brand_owner FROM foods_fts "
+            f"JOIN foods f ON f.fdc_id = foods_fts.rowid WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            args + [page_size, max(page - 1, 0) * page_size],
+        ).fetchall()
+        return {
+            "results": [
+                {"fdcId": r[0], "description": r[1], "dataType": r[2], "brandOwner": r[3]}
+                for r in rows
+            ],
+            "totalPages": (total + page_size - 1) // page_size,
+            "currentPage": page,
+        }
+
+    def iter_summaries(self, limit: Optional[int] = None) -> Iterator[Tuple[int, str, str, str]]:
+        """
+        Yield (fdcId, description, dataType, brandOwner) for every food, non-Branded
+        foods first so a limit keeps the generic ones.
+        """
+        sql = (
+            "SELECT fdc_id, description, data_type, brand_owner FROM foods "
+            "ORDER BY data_type = 'Branded', fdc_id"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        yield from self._conn().execute(sql)
+
+    def iter_vectors(self, limit: Optional[int] = None) -> Iterator[Tuple[int, str, str, array, array]]:
+        """
+        Yield (fdcId, description, dataType, nutrient ids, amounts) for every food,
+        in iter_summaries order.
+        """
+        sql = (
+            "SELECT fdc_id, description, data_type, nutrient_ids, amounts FROM foods "
+            "ORDER BY data_type = 'Branded', fdc_id"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        for fdc_id, description, data_type, ids_blob, amounts_blob in self._conn().execute(sql):
+            yield (fdc_id, description, data_type) + _unpack_vector(ids_blob, amounts_blob)
+
+
+def open_index(path: Optional[str]) -> Optional[FoodIndex]:
+    if not path:
+        return None
+    if not os.path.exists(path):
+        logger.warning(f"Food index {path} not found; serving from the live API only")
+        return None
+    return FoodIndex(path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build a local FoodData Central index from bulk downloads")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest_cmd = sub.add_parser("ingest", help="Stream bulk JSON files or CSV directories into the index")
+    ingest_cmd.add_argument("paths", nargs="+")
+    ingest_cmd.add_argument("--db", default=os.environ.get("FOOD_INDEX_PATH", "foods.sqlite3"))
+    args = parser.parse_args(argv)
+    configure_logging()
+    if args.command == "ingest":
+        ingest(args.paths, args.db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""
+Process-wide logging setup: one logfmt line per record at LOG_LEVEL (default INFO).
+
+Log calls in this codebase prefix messages with "[<request_id>]"; the formatter
+lifts that prefix into its own request_id field so lines can be filtered by it.
+"""
+import logging
+import os
+import sys
+from typing import Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+
+def _quote(value: str) -> str:
+    if value and not any(c in value for c in ' "=\n'):
+        return value
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+class LogfmtFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        request_id = None
+        if message.startswith("[") and "] " in message[:40]:
+            request_id, message = message[1:].split("] ", 1)
+        line = f"ts={self.formatTime(record)} level={record.levelname} logger={record.name}"
+        if request_id and request_id != "None":
+            line += f" request_id={request_id}"
+        line += f" msg={_quote(message)}"
+        if record.exc_info:
+            line += f" exc={_quote(self.formatException(record.exc_info))}"
+        return line
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        return f"{super().formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}"
+
+
+def configure_logging(level: Optional[str] = None) -> None:
+    """
+    Install the logfmt handler on the root logger. Later calls without a level
+    keep the existing setup, so an entry point can configure logging before
+    importing the app.
+    """
+    root = logging.getLogger()
+    configured = any(isinstance(h.formatter, LogfmtFormatter) for h in root.handlers)
+    if level is not None or not configured:
+        root.setLevel(level or LOG_LEVEL)
+    if not configured:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(LogfmtFormatter())
+        root.addHandler(handler)
@@ -0,0 +1,237 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format, plus
+per-request phase timings for the Server-Timing response header.
+
+Metrics live in the worker process that records them, so under gunicorn each
+worker reports its own series; scrape every worker (or run a single worker per
+container) to see the whole picture.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow upstream calls.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # An unlabelled counter is exported as 0 before its first increment.
+        self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last slot is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class CallbackMetric(_Metric):
+    """
+    Reports values read at scrape time, e.g. counters a component already keeps.
+    The callback returns (label values, value) pairs; a single label value may be
+    a bare string.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], callback: Callable[[], Iterable[Tuple[Sequence[str], float]]], kind: str = "gauge", **kwargs):
+        super().__init__(name, documentation, labelnames, **kwargs)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> Iterator[str]:
+        for key, value in self.callback():
+            if isinstance(key, str):
+                key = (key,)
+            yield f"{self.name}{_format_labels(self.labelnames, [str(k) for k in key])} {_format_value(value)}"
+
+
+# Hot-path metrics shared by the app and both USDA clients.
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to produce a response, by route, method and status.", ("route", "method", "status")
+)
+UPSTREAM_SECONDS = Histogram(
+    "usda_upstream_request_duration_seconds", "USDA API request latency per attempt, by endpoint and status.", ("endpoint", "status")
+)
+BACKOFF_SECONDS = Histogram(
+    "usda_backoff_sleep_seconds", "Time spent sleeping between USDA retries, per sleep.", ("endpoint",)
+)
+THROTTLE_SECONDS = Histogram(
+    "usda_throttle_wait_seconds", "Time spent waiting for the shared rate limiter before a USDA request.", ("endpoint",)
+)
+GUARD_REJECTIONS = Counter(
+    "usda_guard_rejections_total", "USDA requests failed fast by the rate limiter or circuit breaker, by reason.", ("endpoint", "reason")
+)
+RETRIES = Counter("usda_retries_total", "USDA requests retried, by endpoint and reason.", ("endpoint", "reason"))
+RATE_LIMITED = Counter("usda_rate_limited_total", "HTTP 429 responses from the USDA API.", ("endpoint",))
+FALLBACKS = Counter(
+    "usda_fallbacks_total", "Requests served by a fallback path, by kind (index_miss, index_coverage, index_error, default_data_types, expired_cache).", ("kind",)
+)
+SEARCH_UNFILTERED_FALLBACK = Counter(
+    "usda_search_unfiltered_fallback_total", "Searches retried without the dataType filter after USDA rejected it."
+)
+TRANSFORM_SECONDS = Histogram("sankey_transform_duration_seconds", "Time spent building Sankey payloads.", ("kind",))
+SERIALIZE_SECONDS = Histogram(
+    "response_serialize_duration_seconds", "Time spent encoding response bodies (identity is JSON encoding).", ("encoding",)
+)
+
+
+# Phase durations (seconds) of the request being handled in this context.
+_phases: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_phases", default=None)
+
+
+def start_request() -> Dict[str, float]:
+    phases: Dict[str, float] = {}
+    _phases.set(phases)
+    return phases
+
+
+def record_phase(name: str, seconds: float) -> None:
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(histogram: Optional[Histogram] = None, phase: Optional[str] = None, **labels):
+    """
+    Time a block into a histogram and/or a Server-Timing phase of the current request.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        if histogram is not None:
+            histogram.observe(elapsed, **labels)
+        if phase is not None:
+            record_phase(phase, elapsed)
+
+
+def server_timing(phases: Dict[str, float], total: float) -> str:
+    """
+    Format phase durations as a Server-Timing header value, in milliseconds.
+    """
+    entries = [f"{name};dur={seconds * 1000.0:.1f}" for name, seconds in phases.items()]
+    entries.append(f"total;dur={total * 1000.0:.1f}")
+    return ", ".join(entries)
+
+
+def upstream_endpoint(base_url: str, url: str) -> str:
+    """
+    Collapse a USDA URL to a low-cardinality endpoint label (food, foods, search).
+    """
+    path = url[len(base_url):] if url.startswith(base_url) else url
+    if path.startswith("/food/"):
+        return "food"
+    if path.startswith("/foods/search"):
+        return "search"
+    if path.startswith("/foods"):
+        return "foods"
+    return "other"
@@ -0,0 +1,340 @@
+"""
+Declarative mapping from USDA FoodData Central nutrients to the Sankey payload.
+
+This module is the single source of truth for both runtimes that build Sankey
+data: utils/data_transformer.py (Flask) and cloudflare-worker/worker.js. The
+worker imports cloudflare-worker/nutrient_tables.js, which is generated from
+the spec below:
+
+    python -m utils.nutrient_spec generate   # rewrite the worker tables
+    python -m utils.nutrient_spec check      # exit 1 if they are out of date
+
+Nutrients are matched by USDA nutrient id; entries that carry no id are
+matched by lowercased name instead. Each quantity lists candidates in preference
+order; its value is the first candidate with a positive amount, where each
+candidate takes the first foodNutrients entry that matches it.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Bump when the spec changes the output for an existing food, so stored
+# payloads built from the previous spec are not served.
+SPEC_VERSION = 2
+
+# quantity -> [(USDA nutrient id or None, [names]), ...] in preference order.
+QUANTITIES: List[Tuple[str, List[Tuple[Optional[int], List[str]]]]] = [
+    ("water", [(1051, ["Water"])]),
+    ("protein", [(1003, ["Protein"])]),
+    ("fat", [(1004, ["Total lipid (fat)"])]),
+    ("carbs", [(1005, ["Carbohydrate, by difference"])]),
+    ("ash", [(1007, ["Ash"])]),
+    ("sodium_mg", [(1093, ["Sodium, Na"])]),
+    ("sat", [(1258, ["Fatty acids, total saturated"])]),
+    ("mono", [(1292, ["Fatty acids, total monounsaturated"])]),
+    ("poly", [(1293, ["Fatty acids, total polyunsaturated"])]),
+    ("trans", [
+        (1257, ["Fatty acids, total trans"]),
+        (None, ["Trans fat"]),
+        (None, ["Trans fatty acids"]),
+    ]),
+    ("total_sugars", [
+        (2000, ["Total Sugars", "Sugars, total including NLEA"]),
+        (1063, ["Sugars, total", "Sugars, Total NLEA"]),
+    ]),
+    # Summed when a food reports no total sugars.
+    ("sucrose", [(1010, ["Sucrose"])]),
+    ("glucose", [(1011, ["Glucose"])]),
+    ("fructose", [(1012, ["Fructose"])]),
+    ("lactose", [(1013, ["Lactose"])]),
+    ("maltose", [(1014, ["Maltose"])]),
+    ("galactose", [(1075, ["Galactose"])]),
+    ("fiber", [
+        (1079, ["Fiber, total dietary"]),
+        (None, ["Dietary fiber, total", "Dietary Fiber"]),
+    ]),
+    ("starch", [(1009, ["Starch"])]),
+]
+
+# Nodes in payload order; a condition hides the node unless the option matches.
+# Conditions: "sodium" / "no_sodium" (showSodium), "breakdown" / "no_breakdown" (showFatBreakdown).
+NODES: List[Tuple[str, Optional[str]]] = [
+    ("Total", None),
+    ("Water", None),
+    ("Protein", None),
+    ("Fat", None),
+    ("Carbs", None),
+    ("Sodium", "sodium"),
+    ("Minerals", None),
+    ("Sat.", "breakdown"),
+    ("Mono", "breakdown"),
+    ("Poly", "breakdown"),
+    ("Trans", "breakdown"),
+    ("Other Fats", "breakdown"),
+    ("Sugars", None),
+    ("Fiber", None),
+    ("Starch", None),
+]
+
+# Links in emission order as (source, target, value, condition). Values are
+# named after the derived values computed by derive_values (and its JS twin).
+FORWARD_LINKS: List[Tuple[str, str, str, Optional[str]]] = [
+    ("Total", "Water", "water", None),
+    ("Total", "Protein", "protein", None),
+    ("Total", "Sodium", "sodium", "sodium"),
+    ("Total", "Minerals", "other_minerals", "sodium"),
+    ("Total", "Minerals", "minerals", "no_sodium"),
+    ("Total", "Sat.", "sat", "breakdown"),
+    ("Total", "Mono", "mono", "breakdown"),
+    ("Total", "Poly", "poly", "breakdown"),
+    ("Total", "Trans", "trans", "breakdown"),
+    ("Total", "Other Fats", "other_fats", "breakdown"),
+    ("Sat.", "Fat", "sat", "breakdown"),
+    ("Mono", "Fat", "mono", "breakdown"),
+    ("Poly", "Fat", "poly", "breakdown"),
+    ("Trans", "Fat", "trans", "breakdown"),
+    ("Other Fats", "Fat", "other_fats", "breakdown"),
+    ("Total", "Fat", "fat", "no_breakdown"),
+    ("Total", "Carbs", "carbs", None),
+    ("Carbs", "Sugars", "sugars", None),
+    ("Carbs", "Fiber", "fiber", None),
+    ("Carbs", "Starch", "starch", None),
+]
+REVERSE_LINKS: List[Tuple[str, str, str, Optional[str]]] = [
+    ("Fat", "Sat.", "sat", "breakdown"),
+    ("Fat", "Mono", "mono", "breakdown"),
+    ("Fat", "Poly", "poly", "breakdown"),
+    ("Fat", "Trans", "trans", "breakdown"),
+    ("Fat", "Other Fats", "other_fats", "breakdown"),
+    ("Sat.", "Total", "sat", "breakdown"),
+    ("Mono", "Total", "mono", "breakdown"),
+    ("Poly", "Total", "poly", "breakdown"),
+    ("Trans", "Total", "trans", "breakdown"),
+    ("Other Fats", "Total", "other_fats", "breakdown"),
+    ("Fat", "Total", "fat", "no_breakdown"),
+    ("Carbs", "Sugars", "sugars", None),
+    ("Carbs", "Fiber", "fiber", None),
+    ("Carbs", "Starch", "starch", None),
+    ("Protein", "Total", "protein", None),
+    ("Sugars", "Total", "sugars", None),
+    ("Fiber", "Total", "fiber", None),
+    ("Starch", "Total", "starch", None),
+    ("Water", "Total", "water", None),
+    ("Sodium", "Total", "sodium", "sodium"),
+    ("Minerals", "Total", "other_minerals", "sodium"),
+    ("Minerals", "Total", "minerals", "no_sodium"),
+]
+
+WORKER_TABLES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cloudflare-worker", "nutrient_tables.js")
+
+
+def compile_slots(quantities: List[Tuple[str, List[Tuple[Optional[int], List[str]]]]]):
+    """
+    Number every candidate with a slot; a quantity owns a contiguous slot range.
+    Returns (slot by id, slot by name, quantity slot ranges, slot count).
+    """
+    slot_by_id: Dict[int, int] = {}
+    slot_by_name: Dict[str, int] = {}
+    ranges: List[Tuple[str, int, int]] = []
+    slot = 0
+    for quantity, candidates in quantities:
+        start = slot
+        for nutrient_id, names in candidates:
+            if nutrient_id is not None:
+                slot_by_id[nutrient_id] = slot
+            for name in names:
+                slot_by_name[name.lower()] = slot
+            slot += 1
+        ranges.append((quantity, start, slot))
+    return slot_by_id, slot_by_name, ranges, slot
+
+
+SLOT_TABLES = compile_slots(QUANTITIES)
+SLOT_BY_ID, SLOT_BY_NAME, QUANTITY_SLOTS, SLOT_COUNT = SLOT_TABLES
+
+
+def _enabled(condition: Optional[str], show_sodium: bool, show_fat_breakdown: bool) -> bool:
+    if condition is None:
+        return True
+    return {
+        "sodium": show_sodium,
+        "no_sodium": not show_sodium,
+        "breakdown": show_fat_breakdown,
+        "no_breakdown": not show_fat_breakdown,
+    }[condition]
+
+
+def _compile_layout(reverse_hierarchy: bool, show_sodium: bool, show_fat_breakdown: bool):
+    names = [name for name, condition in NODES if _enabled(condition, show_sodium, show_fat_breakdown)]
+    index = {name: i for i, name in enumerate(names)}
+    spec = REVERSE_LINKS if reverse_hierarchy else FORWARD_LINKS
+    links = [
+        (index[source], index[target], value)
+        for source, target, value, condition in spec
+        if _enabled(condition, show_sodium, show_fat_breakdown)
+    ]
+    return names, links
+
+
+def _layout_key(reverse_hierarchy: bool, show_sodium: bool, show_fat_breakdown: bool) -> str:
+    return f"{int(reverse_hierarchy)}{int(show_sodium)}{int(show_fat_breakdown)}"
+
+
+# "<reverse><sodium><breakdown>" -> (node names, [(source index, target index, value name)])
+LAYOUTS: Dict[str, Tuple[List[str], List[Tuple[int, int, str]]]] = {
+    _layout_key(r, s, b): _compile_layout(r, s, b)
+    for r in (False, True) for s in (False, True) for b in (False, True)
+}
+
+
+def layout(reverse_hierarchy: bool = False, show_sodium: bool = False, show_fat_breakdown: bool = True):
+    """
+    Node names and link endpoints for one option combination.
+    """
+    return LAYOUTS[_layout_key(reverse_hierarchy, show_sodium, show_fat_breakdown)]
+
+
+def resolve_slots(food_nutrients: Sequence[Dict], tables=SLOT_TABLES) -> List[float]:
+    """
+    Scan foodNutrients once and return the first matching amount per slot.
+    Unmatched slots are 0.0. Names are only consulted for entries without an id.
+    tables is the result of compile_slots and defaults to the Sankey QUANTITIES.
+    """
+    by_id, by_name, _, slot_count = tables
+    slots: List[Optional[float]] = [None] * slot_count
+    for entry in food_nutrients:
+        nutrient = entry.get("nutrient") or {}
+        nutrient_id = nutrient.get("id")
+        if nutrient_id is not None:
+            slot = by_id.get(nutrient_id)
+        else:
+            slot = by_name.get((nutrient.get("name") or "").lower())
+        if slot is None:
+            continue
+        if slots[slot] is None:
+            slots[slot] = entry.get("amount") or 0.0
+    return [0.0 if amount is None else amount for amount in slots]
+
+
+def resolve_quantities(food_nutrients: Sequence[Dict], tables=SLOT_TABLES) -> Dict[str, float]:
+    """
+    Value of every quantity in QUANTITIES (or the quantities tables were
+    compiled from) for one food, 0.0 when not reported.
+    """
+    slots = resolve_slots(food_nutrients, tables)
+    values = {}
+    for quantity, start, end in tables[2]:
+        value = 0.0
+        for slot in range(start, end):
+            if slots[slot] > 0:
+                value = slots[slot]
+                break
+        values[quantity] = value
+    return values
+
+
+def derive_values(q: Dict[str, float]) -> Dict[str, float]:
+    """
+    Link values from resolved quantities. cloudflare-worker/worker.js has the
+    same arithmetic (deriveValues); keep the operation order identical so both
+    produce bit-identical floats.
+    """
+    water, protein, fat, carbs = q["water"], q["protein"], q["fat"], q["carbs"]
+
+    sugars = q["total_sugars"]
+    if sugars == 0:
+        sugars = q["glucose"] + q["fructose"] + q["sucrose"] + q["maltose"] + q["lactose"] + q["galactose"]
+    fiber = q["fiber"]
+    starch = q["starch"]
+    if starch == 0 and carbs > 0:
+        starch = max(0, carbs - sugars - fiber)
+
+    # Minerals are Ash when reported, otherwise the remainder of 100g
+    minerals = q["ash"]
+    if minerals == 0:
+        minerals = max(0, 100 - water - protein - fat - carbs)
+    # Sodium is reported in mg; the Sankey works in grams
+    sodium = q["sodium_mg"] / 1000
+
+    return {
+        "water": water,
+        "protein": protein,
+        "fat": fat,
+        "carbs": carbs,
+        "minerals": minerals,
+        "sodium": sodium,
+        "other_minerals": max(0, minerals - sodium),
+        "sat": q["sat"],
+        "mono": q["mono"],
+        "poly": q["poly"],
+        "trans": q["trans"],
+        "other_fats": max(0, fat - q["sat"] - q["mono"] - q["poly"] - q["trans"]),
+        "sugars": sugars,
+        "fiber": fiber,
+        "starch": starch,
+    }
+
+
+def render_worker_tables() -> str:
+    """
+    JavaScript module with the compiled tables for cloudflare-worker/worker.js.
+    """
+    def dump(value) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(", ", ": "))
+
+    layouts = {
+        key: {"nodes": names, "links": [list(link) for link in links]}
+        for key, (names, links) in LAYOUTS.items()
+    }
+    lines = [
+        "// Generated by `python -m utils.nutrient_spec generate` from utils/nutrient_spec.py.",
+        "// Do not edit by hand.",
+        "",
+        f"export const SPEC_VERSION = {SPEC_VERSION};",
+        f"export const SLOT_COUNT = {SLOT_COUNT};",
+        "",
+        "// USDA nutrient id -> slot",
+        f"export const SLOT_BY_ID = new Map({dump(sorted(SLOT_BY_ID.items()))});",
+        "",
+        "// Lowercased nutrient name -> slot, for entries without an id",
+        f"export const SLOT_BY_NAME = new Map({dump(sorted(SLOT_BY_NAME.items()))});",
+        "",
+        "// [quantity, first slot, end slot] in preference order",
+        f"export const QUANTITY_SLOTS = {dump([list(r) for r in QUANTITY_SLOTS])};",
+        "",
+        '// "<reverse><sodium><breakdown>" -> node names and [source, target, value name] links',
+        "export const LAYOUTS = {",
+    ]
+    for key, value in layouts.items():
+        lines.append(f"  {dump(key)}: {dump(value)},")
+    lines.append("};")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["generate", "check"])
+    parser.add_argument("--out", default=WORKER_TABLES_PATH)
+    args = parser.parse_args(argv)
+
+    rendered = render_worker_tables()
+    if args.command == "generate":
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(rendered)
+        print(f"wrote {args.out}")
+        return 0
+    try:
+        with open(args.out, encoding="utf-8") as f:
+            current = f.read()
+    except FileNotFoundError:
+        current = ""
+    if current != rendered:
+        print(f"{args.out} is out of date; run `python -m utils.nutrient_spec generate`", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Content-addressed store of serialized Sankey responses.
+
+A payload is fully determined by the source food record's revision and the
+transform options, so it is built, serialized and compressed once and then
+served as bytes (or via sendfile from PAYLOAD_STORE_DIR) under a strong ETag
+derived from the same key.
+
+The directory is bounded by max_disk_bytes: when a write takes it over, the
+oldest payloads (by mtime, all encodings of a key together) are deleted until
+it is back to PRUNE_TARGET of the budget.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import metrics
+from utils.cache import LRUCache, _Entry
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+# Pruning stops once the directory is down to this fraction of max_disk_bytes.
+PRUNE_TARGET = 0.8
+# Preference order when the client accepts several encodings.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+_SUFFIXES = {"identity": ".json", "gzip": ".json.gz", "br": ".json.br"}
+
+
+def food_revision(food_data: Dict) -> str:
+    """
+    Identify the revision of a USDA food record. FoodData Central bumps
+    publicationDate (and modifiedDate for Branded foods) whenever a record changes.
+    Records with none of publicationDate, modifiedDate or availableDate fall back
+    to a SHA-1 of the whole record, which serializes it on every lookup and
+    changes whenever any field does.
+    """
+    dated = [str(food_data.get(k) or "") for k in ("publicationDate", "modifiedDate", "availableDate")]
+    if any(dated):
+        return f"{food_data.get('fdcId')}@{'/'.join(dated)}"
+    raw = json.dumps(food_data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return f"{food_data.get('fdcId')}#{hashlib.sha1(raw).hexdigest()}"
+
+
+def payload_key(food_data: Dict, kind: str, options: Tuple) -> str:
+    text = "|".join([food_revision(food_data), kind] + [repr(o) for o in options])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class StoredPayload:
+    __slots__ = ("key", "etag", "bodies", "paths")
+
+    def __init__(self, key: str, bodies: Dict[str, bytes], paths: Optional[Dict[str, str]] = None):
+        self.key = key
+        self.etag = key[:32]
+        # With a directory, only file paths are kept in memory and bodies is empty.
+        self.bodies = bodies
+        self.paths = paths or {}
+
+    def size(self) -> int:
+        return sum(len(b) for b in self.bodies.values()) + 256
+
+    def pick_encoding(self, accept_encoding) -> str:
+        """
+        Pick the best stored encoding for a werkzeug Accept-Encoding header object.
+        """
+        return pick_encoding(accept_encoding, [e for e in ENCODINGS if e in self.bodies or e in self.paths])
+
+
+def pick_encoding(accept_encoding, available=ENCODINGS) -> str:
+    """
+    The first of `available` encodings that a werkzeug Accept-Encoding header
+    object accepts, else identity. Every stored payload has all of ENCODINGS, so
+    with the default this is the encoding a payload will be served in.
+    """
+    for encoding in available:
+        if accept_encoding[encoding]:
+            return encoding
+    return "identity"
+
+
+class PayloadStore:
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        directory: Optional[str] = None,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ):
+        self.memory = LRUCache(max_bytes)
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = {"hits": 0, "builds": 0, "pruned": 0}
+        self._lock = threading.Lock()
+        # Bytes in the directory as of the last scan plus this process's writes
+        # since; None until the first write scans it.
+        self._disk_bytes: Optional[int] = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _encode(self, payload: Any) -> Dict[str, bytes]:
+        """
+        JSON-encode and compress a payload; bytes (already encoded, e.g. a
+        columnar wire format) are only compressed.
+        """
+        with metrics.timed(metrics.SERIALIZE_SECONDS, "serialize", encoding="identity"):
+            if isinstance(payload, bytes):
+                raw = payload
+            else:
+                raw = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        bodies = {"identity": raw}
+        with metrics.timed(metrics.SERIALIZE_SECONDS, "compress", encoding="gzip"):
+            bodies["gzip"] = gzip.compress(raw, compresslevel=9, mtime=0)
+        if brotli is not None:
+            with metrics.timed(metrics.SERIALIZE_SECONDS, "compress", encoding="br"):
+                bodies["br"] = brotli.compress(raw)
+        return bodies
+
+    def _write_files(self, key: str, bodies: Dict[str, bytes]) -> Dict[str, str]:
+        paths = {}
+        for encoding, body in bodies.items():
+            path = os.path.join(self.directory, key[:2], key + _SUFFIXES[encoding])
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(body)
+                os.replace(tmp, path)
+            paths[encoding] = path
+        self._account(sum(len(body) for body in bodies.values()))
+        return paths
+
+    def _scan(self) -> Dict[str, Tuple[float, int, List[str]]]:
+        # key -> (newest mtime, total size, paths); files other workers remove
+        # mid-scan are skipped, as are their temporary files.
+        keys: Dict[str, Tuple[float, int, List[str]]] = {}
+        suffixes = tuple(_SUFFIXES.values())
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(suffixes):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = name.split(".", 1)[0]
+                mtime, size, paths = keys.get(key, (0.0, 0, []))
+                keys[key] = (max(mtime, st.st_mtime), size + st.st_size, paths + [path])
+        return keys
+
+    def _account(self, written: int) -> None:
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += written
+                over = self._disk_bytes > self.max_disk_bytes
+            else:
+                over = True
+        if over:
+            self.prune()
+
+    def prune(self) -> int:
+        """
+        Delete the oldest payloads until the directory is within PRUNE_TARGET of
+        max_disk_bytes (nothing if it is under max_disk_bytes). Returns the
+        number of payloads deleted.
+        """
+        keys = self._scan()
+        total = sum(size for _, size, _ in keys.values())
+        removed = 0
+        if total > self.max_disk_bytes:
+            target = self.max_disk_bytes * PRUNE_TARGET
+            for key, (_, size, paths) in sorted(keys.items(), key=lambda item: item[1][0]):
+                if total <= target:
+                    break
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                self.memory.delete(key)
+                total -= size
+                removed += 1
+            logger.info(f"Payload store pruned {removed} payloads; {total} bytes left in {self.directory}")
+        with self._lock:
+            self._disk_bytes = total
+            self.stats["pruned"] += removed
+        return removed
+
+    def _from_files(self, key: str) -> Optional[StoredPayload]:
+        paths = {}
+        for encoding, suffix in _SUFFIXES.items():
+            path = os.path.join(self.directory, key[:2], key + suffix)
+            if os.path.exists(path):
+                paths[encoding] = path
+        return StoredPayload(key, {}, paths) if "identity" in paths else None
+
+    def get_or_build(self, key: str, build: Callable[[], Any]) -> StoredPayload:
+        entry = self.memory.get(key)
+        # Another worker may have pruned the files behind a remembered entry.
+        if entry is not None and entry.value.paths and not os.path.exists(entry.value.paths["identity"]):
+            self.memory.delete(key)
+            entry = None
+        if entry is not None:
+            with self._lock:
+                self.stats["hits"] += 1
+            return entry.value
+        stored = self._from_files(key) if self.directory else None
+        if stored is None:
+            bodies = self._encode(build())
+            with self._lock:
+                self.stats["builds"] += 1
+            if self.directory:
+                try:
+                    stored = StoredPayload(key, {}, self._write_files(key, bodies))
+                except OSError as e:
+                    logger.warning(f"Payload store write failed for {key}: {str(e)}; keeping it in memory")
+                    stored = StoredPayload(key, bodies)
+            else:
+                stored = StoredPayload(key, bodies)
+        self.memory.set(key, _Entry(stored, stored.size(), 0, 0, 0))
+        return stored
@@ -0,0 +1,91 @@
+"""
+Opt-in sampling profiler for request-handling threads.
+
+A background thread wakes every PROFILER_INTERVAL_MS milliseconds, reads the
+current stack of each thread that is inside a request, and counts it in
+collapsed-stack form ("outer;inner;leaf count"), which flamegraph.pl and
+speedscope read directly. Idle worker threads are never sampled, so the
+profile only shows time spent serving requests.
+
+Enable with PROFILER_INTERVAL_MS=10 and read the profile from /debug/profile,
+which is only served with PROFILE_ENDPOINT_ENABLED=1.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Set
+
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS") or 0)
+MAX_STACK_DEPTH = 64
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float, max_depth: int = MAX_STACK_DEPTH):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self.started_at = time.time()
+        self._active: Set[int] = set()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+    def _ensure_started(self) -> None:
+        # The sampler thread does not survive fork, so each worker starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._active = set()
+            threading.Thread(target=self._run, name="sampling-profiler", daemon=True).start()
+
+    def enter(self) -> None:
+        """Mark the calling thread as serving a request."""
+        self._ensure_started()
+        with self._lock:
+            self._active.add(threading.get_ident())
+
+    def leave(self) -> None:
+        with self._lock:
+            self._active.discard(threading.get_ident())
+
+    def _stack(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.interval)
+            with self._lock:
+                active = set(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            stacks = [self._stack(frames[ident]) for ident in active if ident in frames]
+            with self._lock:
+                self.samples.update(stacks)
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self.samples.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            return {"samples": sum(self.samples.values()), "stacks": len(self.samples), "since": self.started_at}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples.clear()
+            self.started_at = time.time()
+
+
+profiler = SamplingProfiler(PROFILER_INTERVAL_MS / 1000.0) if PROFILER_INTERVAL_MS > 0 else None
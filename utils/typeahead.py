@@ -0,0 +1,396 @@
+"""
+In-memory typeahead index over food descriptions and brand owners.
+
+Foods enter the index from live search results, fetched food records and, when
+FOOD_INDEX_PATH is set, the local food index. Each immutable segment keeps:
+  - a sorted vocabulary with one flat postings array, so a prefix lookup is two
+    bisects and a slice
+  - a trigram map over that vocabulary, used for words with no prefix match
+    (typos such as "chiken")
+
+New foods collect in a small buffer that lookups scan directly. A full buffer
+becomes a segment, and segments of similar size are merged in a background
+thread, so lookups never wait on a rebuild.
+"""
+import bisect
+import heapq
+import logging
+import re
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from utils.cache import LRUCache, _Entry
+
+logger = logging.getLogger(__name__)
+
+DATA_TYPES = ("Branded", "SR Legacy", "Survey (FNDDS)", "Foundation", "Experimental")
+_TYPE_CODES = {name: code for code, name in enumerate(DATA_TYPES)}
+_UNKNOWN_TYPE = len(DATA_TYPES)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Sorts after every token that starts with a given prefix.
+_PREFIX_END = "\U0010ffff"
+
+BUFFER_SIZE = 256
+# Upper bound on foods checked per segment and lookup.
+CANDIDATE_LIMIT = 4000
+# Matches collected per segment, as a multiple of the requested limit.
+RANK_WINDOW = 4
+# Prefixes matching more words than this use the precomputed short-prefix lists.
+MERGE_WORD_LIMIT = 256
+SHORT_PREFIX_TOP = 512
+FUZZY_MIN_LENGTH = 3
+FUZZY_MIN_SIMILARITY = 0.45
+FUZZY_MAX_TERMS = 8
+RESULT_CACHE_BYTES = 2 * 1024 * 1024
+
+# (fdcId, description, data type code, brand owner, words). Words are the
+# lowercased tokens of description and brand owner, each preceded by a space, so
+# "does a word start with p" is the substring test " p" in words.
+_Food = Tuple[int, str, int, str, str]
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Segment:
+    """
+    Immutable index over a set of foods. Foods are stored in rank order (shorter
+    descriptions first), so every postings list is also in rank order and a
+    lookup can stop after the first few matches.
+    """
+
+    __slots__ = ("ids", "descriptions", "types", "brands", "words", "vocab", "starts", "postings", "trigrams", "short_prefixes")
+
+    def __init__(self, foods: Sequence[_Food]):
+        foods = sorted(foods, key=lambda f: (len(f[1]), f[0]))
+        self.ids = array("q", (f[0] for f in foods))
+        self.descriptions = [f[1] for f in foods]
+        self.types = bytes(f[2] for f in foods)
+        self.brands = [f[3] for f in foods]
+        self.words = [f[4] for f in foods]
+        by_token: Dict[str, List[int]] = {}
+        for position, food in enumerate(foods):
+            for token in dict.fromkeys(food[4].split()):
+                by_token.setdefault(token, []).append(position)
+        self.vocab = sorted(by_token)
+        self.starts = array("i", [0])
+        self.postings = array("i")
+        for token in self.vocab:
+            self.postings.extend(by_token[token])
+            self.starts.append(len(self.postings))
+        self.trigrams: Dict[str, array] = {}
+        for vocab_id, token in enumerate(self.vocab):
+            for gram in _trigrams(token):
+                self.trigrams.setdefault(gram, array("i")).append(vocab_id)
+        # One- and two-character prefixes span too many words to merge per
+        # lookup, so their best-ranked foods are kept ready.
+        short: Dict[str, List[int]] = {}
+        for token, positions in by_token.items():
+            for prefix in {token[:1], token[:2]}:
+                short.setdefault(prefix, []).extend(positions[:SHORT_PREFIX_TOP])
+        self.short_prefixes = {
+            prefix: array("i", sorted(set(positions))[:SHORT_PREFIX_TOP]) for prefix, positions in short.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def foods(self) -> List[_Food]:
+        return list(zip(self.ids, self.descriptions, self.types, self.brands, self.words))
+
+    def word_range(self, prefix: str) -> Tuple[int, int]:
+        """Vocabulary ids [lo, hi) of every word starting with prefix."""
+        lo = bisect.bisect_left(self.vocab, prefix)
+        return lo, bisect.bisect_left(self.vocab, prefix + _PREFIX_END, lo)
+
+    def iter_positions(self, vocab_ids: Iterable[int]) -> Iterator[int]:
+        """Positions of foods containing any of the words, in rank order, each once."""
+        slices = [self.postings[self.starts[i]:self.starts[i + 1]] for i in vocab_ids]
+        if len(slices) == 1:
+            yield from slices[0]
+            return
+        last = -1
+        for position in heapq.merge(*slices):
+            if position != last:
+                last = position
+                yield position
+
+    def prefix_positions(self, prefix: str) -> Tuple[int, Iterator[int]]:
+        """(number of postings, positions in rank order) for foods with a word starting with prefix."""
+        lo, hi = self.word_range(prefix)
+        if hi - lo > MERGE_WORD_LIMIT and prefix in self.short_prefixes:
+            top = self.short_prefixes[prefix]
+            return self.starts[hi] - self.starts[lo], iter(top)
+        return self.starts[hi] - self.starts[lo], self.iter_positions(range(lo, hi))
+
+    def similar(self, token: str) -> List[int]:
+        """Vocabulary ids of words sharing enough trigrams with token (Dice coefficient)."""
+        grams = _trigrams(token)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for vocab_id in self.trigrams.get(gram, ()):
+                shared[vocab_id] = shared.get(vocab_id, 0) + 1
+        scored = []
+        for vocab_id, count in shared.items():
+            similarity = 2.0 * count / (len(grams) + len(self.vocab[vocab_id]))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((similarity, vocab_id))
+        return [vocab_id for _, vocab_id in heapq.nlargest(FUZZY_MAX_TERMS, scored)]
+
+
+def _similar_words(token: str, vocab: Iterable[str]) -> Set[str]:
+    """Words in vocab sharing enough trigrams with token; the buffer's version of _Segment.similar."""
+    grams = _trigrams(token)
+    scored = []
+    for word in vocab:
+        similarity = 2.0 * len(grams & _trigrams(word)) / (len(grams) + len(word))
+        if similarity >= FUZZY_MIN_SIMILARITY:
+            scored.append((similarity, word))
+    return {word for _, word in heapq.nlargest(FUZZY_MAX_TERMS, scored)}
+
+
+def _matcher(word: str, similar: Optional[Set[str]] = None) -> Callable[[str], bool]:
+    """Test for food words containing word as a prefix, or one of its similar words."""
+    prefix = " " + word
+    if not similar:
+        return lambda words: prefix in words
+    alternatives = [f" {w} " for w in similar]
+    return lambda words: prefix in words or any(alt in words + " " for alt in alternatives)
+
+
+def _first_word(words: str) -> str:
+    end = words.find(" ", 1)
+    return words if end < 0 else words[:end]
+
+
+class TypeaheadIndex:
+    def __init__(self, loader: Optional[Callable[[], Iterable[Tuple[int, str, str, str]]]] = None, max_entries: int = 500_000):
+        self.max_entries = max_entries
+        self._segments: Tuple[_Segment, ...] = ()
+        self._buffer: List[_Food] = []
+        self._known: Set[int] = set()
+        self._lock = threading.Lock()
+        self._merging = False
+        self._loader = loader
+        self._results = LRUCache(RESULT_CACHE_BYTES)
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def _start_load(self) -> None:
+        # Bulk-load the local food index once, in the background; lookups serve
+        # what is already indexed in the meantime.
+        with self._lock:
+            loader, self._loader = self._loader, None
+        if loader is not None:
+            threading.Thread(target=self._load, args=(loader,), name="typeahead-load", daemon=True).start()
+
+    def preload(self) -> None:
+        """
+        Run the pending bulk load now, in the calling thread.
+        """
+        with self._lock:
+            loader, self._loader = self._loader, None
+        if loader is not None:
+            self._load(loader)
+
+    def _load(self, loader: Callable[[], Iterable[Tuple[int, str, str, str]]]) -> None:
+        try:
+            foods = []
+            for fdc_id, description, data_type, brand_owner in loader():
+                if fdc_id not in self._known:
+                    foods.append(self._food(fdc_id, description, data_type, brand_owner))
+            segment = _Segment(foods)
+        except Exception as e:
+            logger.warning(f"Typeahead load from the local food index failed: {str(e)}")
+            return
+        with self._lock:
+            self._segments = (segment,) + self._segments
+            self._known.update(segment.ids)
+            self.generation += 1
+        logger.info(f"Typeahead index loaded {len(segment)} foods from the local food index")
+
+    @staticmethod
+    def _food(fdc_id: int, description: str, data_type: str, brand_owner: str) -> _Food:
+        description = description or ""
+        brand_owner = brand_owner or ""
+        words = "".join(" " + token for token in tokenize(description) + tokenize(brand_owner))
+        return (int(fdc_id), description, _TYPE_CODES.get(data_type, _UNKNOWN_TYPE), brand_owner, words)
+
+    def add_many(self, foods: Iterable[Dict]) -> int:
+        """
+        Index search hits or food records (fdcId, description, dataType, brandOwner)
+        not seen before. Returns how many were added.
+        """
+        if self._loader is not None:
+            self._start_load()
+        new = []
+        for food in foods:
+            try:
+                fdc_id = int(food["fdcId"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if fdc_id in self._known or not food.get("description"):
+                continue
+            new.append(self._food(fdc_id, food["description"], food.get("dataType", ""), food.get("brandOwner", "")))
+        if not new:
+            return 0
+        added = 0
+        with self._lock:
+            for food in new:
+                if food[0] in self._known or len(self._known) >= self.max_entries:
+                    continue
+                self._known.add(food[0])
+                self._buffer.append(food)
+                added += 1
+            if len(self._buffer) >= BUFFER_SIZE:
+                self._segments = self._segments + (_Segment(self._buffer),)
+                self._buffer = []
+                if self._needs_merge() and not self._merging:
+                    self._merging = True
+                    threading.Thread(target=self._compact, name="typeahead-merge", daemon=True).start()
+            if added:
+                self.generation += 1
+        return added
+
+    def _merge_position(self) -> Optional[int]:
+        # Segments grow like a binary counter: a segment is merged into the one
+        # before it once it is at least as large, which keeps the segment count
+        # logarithmic in the number of foods.
+        segments = self._segments
+        for i in range(len(segments) - 2, -1, -1):
+            if len(segments[i + 1]) >= len(segments[i]):
+                return i
+        return None
+
+    def _needs_merge(self) -> bool:
+        return self._merge_position() is not None
+
+    def _compact(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    i = self._merge_position()
+                    if i is None:
+                        return
+                    older, newer = self._segments[i], self._segments[i + 1]
+                merged = _Segment(older.foods() + newer.foods())
+                with self._lock:
+                    # Segments sealed or loaded meanwhile keep their place around the pair.
+                    i = next(i for i, segment in enumerate(self._segments) if segment is older)
+                    self._segments = self._segments[:i] + (merged,) + self._segments[i + 2:]
+        finally:
+            with self._lock:
+                self._merging = False
+
+    def suggest(self, query: str, limit: int = 10, data_types: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        Foods whose description or brand owner contains every query word as a
+        prefix, falling back to similar words for misspelled ones. Prefix matches
+        rank before fuzzy ones, then foods whose description starts with the
+        first word, then shorter descriptions.
+        """
+        if self._loader is not None:
+            self._start_load()
+        words = tokenize(query)
+        if not words:
+            return []
+        allowed = {_TYPE_CODES[dt] for dt in data_types or () if dt in _TYPE_CODES} or None
+        cache_key = f"{self.generation}|{limit}|{','.join(sorted(data_types or ()))}|{' '.join(words)}"
+        cached = self._results.get(cache_key)
+        if cached is not None:
+            return cached.value
+
+        with self._lock:
+            segments, buffer = self._segments, list(self._buffer)
+        best: Dict[int, Tuple] = {}
+        for segment in segments:
+            self._search_segment(segment, words, allowed, limit, best)
+        if buffer:
+            self._search_buffer(buffer, words, allowed, best)
+
+        ranked = heapq.nsmallest(limit, best.values(), key=lambda item: item[0])
+        results = [
+            {
+                "fdcId": key[3],
+                "description": description,
+                "dataType": DATA_TYPES[code] if code < len(DATA_TYPES) else "",
+                "brandOwner": brand,
+            }
+            for key, description, code, brand in ranked
+        ]
+        self._results.set(cache_key, _Entry(results, 200 * len(results) + 100, 0, 0, 0))
+        return results
+
+    @staticmethod
+    def _search_buffer(buffer: List[_Food], words: List[str], allowed: Optional[Set[int]], best: Dict[int, Tuple]) -> None:
+        # Same rules as a segment: a word with no prefix match in the buffer
+        # falls back to the buffer's similar words.
+        vocab = {token for food in buffer for token in food[4].split()}
+        alternatives = []
+        for word in words:
+            if any(token.startswith(word) for token in vocab):
+                alternatives.append(None)
+                continue
+            similar = _similar_words(word, vocab) if len(word) >= FUZZY_MIN_LENGTH else None
+            if not similar:
+                return
+            alternatives.append(similar)
+        fuzzy = sum(1 for similar in alternatives if similar is not None)
+        checks = [_matcher(word, similar) for word, similar in zip(words, alternatives)]
+        for food in buffer:
+            if allowed is not None and food[2] not in allowed:
+                continue
+            if all(check(food[4]) for check in checks):
+                key = (fuzzy, 0 if checks[0](_first_word(food[4])) else 1, len(food[1]), food[0])
+                best[food[0]] = (key, food[1], food[2], food[3])
+
+    def _search_segment(self, segment: _Segment, words: List[str], allowed: Optional[Set[int]], limit: int, best: Dict[int, Tuple]) -> None:
+        # One plan per query word: (postings count, word, fuzzy alternatives, positions).
+        plans = []
+        for word in words:
+            count, positions = segment.prefix_positions(word)
+            if count:
+                plans.append((count, word, None, positions))
+                continue
+            if len(word) < FUZZY_MIN_LENGTH:
+                return
+            similar = segment.similar(word)
+            if not similar:
+                return
+            count = sum(segment.starts[i + 1] - segment.starts[i] for i in similar)
+            plans.append((count, word, {segment.vocab[i] for i in similar}, segment.iter_positions(similar)))
+        plans.sort(key=lambda plan: plan[0])
+
+        # Walk the rarest word's foods in rank order and check the other words.
+        # Since the order already favours short descriptions, a few times the
+        # limit is enough to rank the top results.
+        fuzzy = sum(1 for plan in plans if plan[2] is not None)
+        first = words[0]
+        leads = _matcher(first, next((plan[2] for plan in plans if plan[1] == first), None))
+        checks = [_matcher(word, similar) for _, word, similar, _ in plans[1:]]
+        wanted = limit * RANK_WINDOW
+        accepted = 0
+        for scanned, position in enumerate(plans[0][3]):
+            if scanned >= CANDIDATE_LIMIT or accepted >= wanted:
+                break
+            if allowed is not None and segment.types[position] not in allowed:
+                continue
+            words_text = segment.words[position]
+            if checks and not all(check(words_text) for check in checks):
+                continue
+            accepted += 1
+            description = segment.descriptions[position]
+            fdc_id = segment.ids[position]
+            key = (fuzzy, 0 if leads(_first_word(words_text)) else 1, len(description), fdc_id)
+            current = best.get(fdc_id)
+            if current is None or key < current[0]:
+                best[fdc_id] = (key, description, segment.types[position], segment.brands[position])
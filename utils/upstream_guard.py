@@ -0,0 +1,252 @@
+"""
+Rate limiter and circuit breaker for USDA API calls, shared by every worker
+process on the host.
+
+The token bucket refills at `rate` requests per second up to `burst`. A 429
+halves the rate (down to `min_rate`) and successes add back a twentieth of the
+configured rate, at most once per ADJUST_INTERVAL_SECONDS either way, so the
+workers together settle just under what USDA will accept. A Retry-After header blocks every worker until it has passed.
+
+The breaker opens after `failure_threshold` consecutive 5xx or network
+failures; 429s are left to the rate limiter and neither trip nor reset it.
+While open, callers fail fast with UpstreamUnavailable; after `cooldown`
+seconds one caller is let through as a probe, and its outcome closes or
+reopens the breaker.
+
+With a `path`, state lives in a small file guarded by fcntl.flock, so gunicorn
+workers share it; the file is reopened after fork, like the SQLite cache tier.
+Without one, state is local to the process.
+
+Sharing does not make requests faster. When callers want more than USDA
+accepts, each waits about (requests in flight) / (accepted rate) either way,
+which is ~0.75 s mean for the 16 callers against 20 req/s in
+`benchmarks.run --only throttle`. A shared bucket spends that wait queued for
+a token. Per-process buckets send too much and spend it in 429s and
+Retry-After sleeps, with a quarter to a half more upstream requests and
+three to six times the 429s. Their median can come out lower than the shared one,
+because callers that happen to win a token return at once while the rest
+sleep out Retry-After. Share state to spare the upstream quota, not to cut latency.
+"""
+import email.utils
+import fcntl
+import os
+import random
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Multiplicative decrease on 429, additive increase (fraction of the configured rate) on success.
+RATE_DECREASE = 0.5
+RATE_INCREASE = 0.05
+# The 429s of one burst arrive together and should only count once.
+ADJUST_INTERVAL_SECONDS = 1.0
+# Full-jitter exponential backoff between retries.
+BACKOFF_BASE_SECONDS = 0.3
+BACKOFF_CAP_SECONDS = 5.0
+
+# tokens, updated_at, rate, rate_changed_at, blocked_until, failures, opened_at, probe_until
+_FIELDS = 8
+_STATE = struct.Struct(f"<{_FIELDS}d")
+_TOKENS, _UPDATED_AT, _RATE, _RATE_CHANGED_AT, _BLOCKED_UNTIL, _FAILURES, _OPENED_AT, _PROBE_UNTIL = range(_FIELDS)
+
+
+class UpstreamUnavailable(Exception):
+    """
+    Raised instead of calling USDA when the breaker is open or the wait for a
+    token would exceed max_wait. retry_after is the earliest useful retry, in seconds.
+    """
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"USDA API unavailable ({reason}); retry in {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def jittered_backoff(attempt: int, base: float = BACKOFF_BASE_SECONDS, cap: float = BACKOFF_CAP_SECONDS) -> float:
+    """
+    Full-jitter delay before retry number `attempt` (1-based), so workers that
+    failed together do not retry together.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class _LocalState:
+    def __init__(self, initial: List[float]):
+        self._values = list(initial)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self) -> Iterator[List[float]]:
+        with self._lock:
+            yield self._values
+
+
+class _FileState:
+    """
+    Fixed-size state record in a file, read and rewritten under an exclusive flock.
+    """
+
+    def __init__(self, path: str, initial: List[float]):
+        self.path = path
+        self._initial = initial
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+
+    def _open(self) -> int:
+        # flock belongs to the open file description, which a forked child
+        # shares with its parent, so each process needs its own.
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    @contextmanager
+    def transaction(self) -> Iterator[List[float]]:
+        # flock does not exclude threads sharing a descriptor; the thread lock does.
+        with self._lock:
+            fd = self._open()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(fd, _STATE.size, 0)
+                values = list(_STATE.unpack(raw)) if len(raw) == _STATE.size else list(self._initial)
+                yield values
+                os.pwrite(fd, _STATE.pack(*values), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class UpstreamGuard:
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        *,
+        min_rate: Optional[float] = None,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        max_wait: float = 5.0,
+        probe_timeout: float = 10.0,
+        path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Args:
+            rate: Requests per second across all sharing processes; <= 0 disables the bucket
+            burst: Bucket capacity
+            min_rate: Floor for the adaptive rate (default rate / 20)
+            failure_threshold: Consecutive failures that open the breaker; 0 disables it
+            cooldown: Seconds the breaker stays open before a probe
+            max_wait: Longest wait for a token or Retry-After before failing fast
+            probe_timeout: Seconds before another caller may probe if the probe never reports
+            path: State file shared by processes; None keeps state in this process
+            clock: Wall-clock seconds; processes sharing a path must agree on it
+        """
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.probe_timeout = probe_timeout
+        self._clock = clock
+        initial = [float(burst), clock(), float(rate), 0.0, 0.0, 0.0, 0.0, 0.0]
+        self._state = _FileState(path, initial) if path else _LocalState(initial)
+
+    def _refill(self, s: List[float], now: float) -> None:
+        if s[_RATE] > 0:
+            s[_TOKENS] = min(self.burst, s[_TOKENS] + (now - s[_UPDATED_AT]) * s[_RATE])
+        s[_UPDATED_AT] = now
+
+    def acquire(self) -> float:
+        """
+        Reserve one upstream request and return how long to sleep before sending
+        it. Raises UpstreamUnavailable, reserving nothing, when the breaker is
+        open or the wait would exceed max_wait.
+        """
+        now = self._clock()
+        with self._state.transaction() as s:
+            probe = False
+            if s[_OPENED_AT]:
+                reopen_at = s[_OPENED_AT] + self.cooldown
+                if now < reopen_at:
+                    raise UpstreamUnavailable("circuit_open", reopen_at - now)
+                if now < s[_PROBE_UNTIL]:
+                    raise UpstreamUnavailable("circuit_half_open", s[_PROBE_UNTIL] - now)
+                probe = True
+            self._refill(s, now)
+            wait = max(0.0, s[_BLOCKED_UNTIL] - now)
+            if s[_RATE] > 0 and s[_TOKENS] < 1:
+                wait = max(wait, (1 - s[_TOKENS]) / s[_RATE])
+            if wait > self.max_wait:
+                raise UpstreamUnavailable("rate_limited", wait)
+            if s[_RATE] > 0:
+                s[_TOKENS] -= 1
+            if probe:
+                s[_PROBE_UNTIL] = now + wait + self.probe_timeout
+            return wait
+
+    def record(self, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        """
+        Report the outcome of a request: an HTTP status, or None for a network error.
+        """
+        now = self._clock()
+        with self._state.transaction() as s:
+            if status is not None and status != 429 and status < 500:
+                s[_FAILURES] = 0
+                s[_OPENED_AT] = 0.0
+                s[_PROBE_UNTIL] = 0.0
+                if 0 < s[_RATE] < self.rate and now - s[_RATE_CHANGED_AT] >= ADJUST_INTERVAL_SECONDS:
+                    self._refill(s, now)
+                    s[_RATE] = min(self.rate, s[_RATE] + self.rate * RATE_INCREASE)
+                    s[_RATE_CHANGED_AT] = now
+                return
+            if status == 429:
+                if s[_RATE] > 0 and now - s[_RATE_CHANGED_AT] >= ADJUST_INTERVAL_SECONDS:
+                    self._refill(s, now)
+                    s[_RATE] = max(self.min_rate, s[_RATE] * RATE_DECREASE)
+                    s[_TOKENS] = min(s[_TOKENS], 0.0)
+                    s[_RATE_CHANGED_AT] = now
+                if retry_after:
+                    s[_BLOCKED_UNTIL] = max(s[_BLOCKED_UNTIL], now + retry_after)
+                return
+            s[_FAILURES] += 1
+            if self.failure_threshold and (s[_OPENED_AT] or s[_FAILURES] >= self.failure_threshold):
+                s[_OPENED_AT] = now
+                s[_PROBE_UNTIL] = 0.0
+            if retry_after:
+                s[_BLOCKED_UNTIL] = max(s[_BLOCKED_UNTIL], now + retry_after)
+
+    def snapshot(self) -> Dict[str, float]:
+        now = self._clock()
+        with self._state.transaction() as s:
+            self._refill(s, now)
+            return {
+                "tokens": s[_TOKENS],
+                "rate": s[_RATE],
+                "blockedSeconds": max(0.0, s[_BLOCKED_UNTIL] - now),
+                "failures": s[_FAILURES],
+                "open": 1.0 if s[_OPENED_AT] and now < s[_OPENED_AT] + self.cooldown else 0.0,
+            }
@@ -1,19 +1,93 @@
+import contextvars
 import os
 import requests
 import logging
+import sqlite3
+import threading
 from typing import Dict, Optional, List
 import time
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics
+from utils.cache import TieredCache, DEFAULT_MAX_BYTES
+from utils.food_index import open_index
+from utils.typeahead import TypeaheadIndex
+from utils.upstream_guard import UpstreamGuard, UpstreamUnavailable, jittered_backoff, parse_retry_after
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG)
 
 # USDA FoodData API base URL
-BASE_URL = "https://api.nal.usda.gov/fdc/v1"
+BASE_URL = os.environ.get("USDA_BASE_URL", "https://api.nal.usda.gov/fdc/v1")
 API_KEY = os.environ.get("USDA_API_KEY", "DEMO_KEY")
 TIMEOUT_SECONDS = 10
 MAX_RETRIES = 3
 RETRY_STATUSES = {429, 500, 502, 503}
+# USDA POST /foods accepts at most 20 fdcIds per call.
+BATCH_SIZE = 20
+BATCH_CONCURRENCY = 4
 VALID_DATA_TYPES = {"Branded", "SR Legacy", "Survey (FNDDS)", "Foundation", "Experimental"}
+DEFAULT_DATA_TYPES = ("Survey (FNDDS)", "SR Legacy", "Branded", "Foundation")
+
+# Response cache. USDA_CACHE_DB enables the SQLite tier shared by all workers on the host.
+CACHE_MAX_BYTES = int(os.environ.get("USDA_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+CACHE_DB_PATH = os.environ.get("USDA_CACHE_DB") or None
+# Per-endpoint (ttl, stale_ttl, negative_ttl) in seconds. Food records change rarely;
+# search rankings drift, so they expire sooner.
+CACHE_TTLS = {
+    "food": (24 * 3600, 7 * 24 * 3600, 3600),
+    "search": (3600, 6 * 3600, 600),
+}
+response_cache = TieredCache(max_bytes=CACHE_MAX_BYTES, disk_path=CACHE_DB_PATH)
+# Read at scrape time, so it follows response_cache if it is replaced.
+metrics.CallbackMetric(
+    "usda_response_cache",
+    "Response cache counters and size (entries, bytes) from TieredCache.snapshot().",
+    ("stat",),
+    lambda: ((stat, value) for stat, value in response_cache.snapshot().items() if isinstance(value, (int, float))),
+)
+# Optional offline index built with `python -m utils.food_index ingest`; the live API is the fallback.
+FOOD_INDEX_PATH = os.environ.get("FOOD_INDEX_PATH") or None
+local_index = open_index(FOOD_INDEX_PATH)
+# Typeahead index over foods seen in live results plus the local index (if any).
+TYPEAHEAD_MAX_ENTRIES = int(os.environ.get("TYPEAHEAD_MAX_ENTRIES", 500_000))
+suggest_index = TypeaheadIndex(
+    loader=(lambda: local_index.iter_summaries(TYPEAHEAD_MAX_ENTRIES)) if local_index is not None else None,
+    max_entries=TYPEAHEAD_MAX_ENTRIES,
+)
+# Nutrient vectors of the foods behind /api/compare's "similar" lists: the local
+# index (if any) plus records fetched from USDA once the index exists. Created by
+# _neighbors() on the first similar_foods call, so NumPy and the vector load wait
+# for /api/compare; NEIGHBOR_PRELOAD=1 loads it in preload_indexes instead.
+NEIGHBOR_MAX_ENTRIES = int(os.environ.get("NEIGHBOR_MAX_ENTRIES", 500_000))
+NEIGHBOR_PRELOAD = os.environ.get("NEIGHBOR_PRELOAD", "").lower() in ("1", "true", "yes")
+neighbor_index = None
+_neighbor_lock = threading.Lock()
+# Route upstream fetches through the pooled asyncio client in utils.usda_async.
+USE_ASYNC_CLIENT = os.environ.get("USDA_ASYNC_CLIENT", "").lower() in ("1", "true", "yes")
+# Rate limiter and circuit breaker in front of every upstream request, from both
+# clients. USDA_GUARD_FILE shares their state between the workers on the host;
+# USDA_RATE_LIMIT=0 turns off the token bucket (Retry-After is still honored).
+RATE_LIMIT = float(os.environ.get("USDA_RATE_LIMIT", 20))
+RATE_BURST = float(os.environ.get("USDA_RATE_BURST", 40))
+BREAKER_FAILURES = int(os.environ.get("USDA_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get("USDA_BREAKER_COOLDOWN", 30))
+# Longest a request waits for the rate limiter or a Retry-After before failing fast.
+MAX_WAIT_SECONDS = float(os.environ.get("USDA_MAX_WAIT", 5))
+GUARD_PATH = os.environ.get("USDA_GUARD_FILE") or None
+upstream_guard = UpstreamGuard(
+    RATE_LIMIT,
+    RATE_BURST,
+    failure_threshold=BREAKER_FAILURES,
+    cooldown=BREAKER_COOLDOWN_SECONDS,
+    max_wait=MAX_WAIT_SECONDS,
+    probe_timeout=TIMEOUT_SECONDS,
+    path=GUARD_PATH,
+)
+metrics.CallbackMetric(
+    "usda_upstream_guard",
+    "Shared rate limiter and breaker state (tokens, rate, blockedSeconds, failures, open).",
+    ("stat",),
+    lambda: ((stat, value) for stat, value in upstream_guard.snapshot().items()),
+)
 
 def _mask_api_key(params: Dict) -> Dict:
     safe = dict(params or {})
@@ -22,55 +96,233 @@ def _mask_api_key(params: Dict) -> Dict:
         safe["api_key"] = f"***{key[-4:]}" if len(key) >= 4 else "***"
     return safe
 
+def _backoff(endpoint: str, seconds: float) -> None:
+    time.sleep(seconds)
+    metrics.BACKOFF_SECONDS.observe(seconds, endpoint=endpoint)
+    metrics.record_phase("backoff", seconds)
+
+def _throttle(endpoint: str) -> None:
+    """
+    Wait for the shared rate limiter; raises UpstreamUnavailable to fail fast.
+    """
+    try:
+        wait = upstream_guard.acquire()
+    except UpstreamUnavailable as e:
+        metrics.GUARD_REJECTIONS.inc(endpoint=endpoint, reason=e.reason)
+        raise
+    if wait > 0:
+        time.sleep(wait)
+        metrics.THROTTLE_SECONDS.observe(wait, endpoint=endpoint)
+        metrics.record_phase("throttle", wait)
+
+def _unavailable_error(e: UpstreamUnavailable, request_id: Optional[str]) -> Dict:
+    return {"error": "USDA API temporarily unavailable", "status": 503, "retryAfter": round(e.retry_after, 1), "requestId": request_id}
+
 def _request_with_retries(
     method: str,
     url: str,
     *,
     params: Dict,
+    json_body: Optional[Dict] = None,
     allow_404_retry: bool = False,
     request_id: Optional[str] = None,
 ) -> requests.Response:
     """
     Perform an HTTP request with limited retries for transient errors.
     Optionally retry once on 404 when allow_404_retry is True.
+
+    Every attempt goes through upstream_guard, which raises UpstreamUnavailable
+    instead of sending when the breaker is open or the rate limit would make
+    the request wait longer than MAX_WAIT_SECONDS. Retries use jittered
+    backoff; after the last attempt the transient response itself is returned.
     """
-    backoff_seconds = 0.3
     last_exc: Optional[Exception] = None
     safe_params = _mask_api_key(params)
+    endpoint = metrics.upstream_endpoint(BASE_URL, url)
     for attempt in range(1, MAX_RETRIES + 1):
+        _throttle(endpoint)
         try:
-            t0 = time.time()
-            response = requests.request(method, url, params=params, timeout=TIMEOUT_SECONDS)
-            elapsed = (time.time() - t0) * 1000.0
+            t0 = time.perf_counter()
+            try:
+                response = requests.request(method, url, params=params, json=json_body, timeout=TIMEOUT_SECONDS)
+            finally:
+                elapsed_s = time.perf_counter() - t0
+                metrics.record_phase("upstream", elapsed_s)
+            elapsed = elapsed_s * 1000.0
+            metrics.UPSTREAM_SECONDS.observe(elapsed_s, endpoint=endpoint, status=response.status_code)
+            upstream_guard.record(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+            if response.status_code == 429:
+                metrics.RATE_LIMITED.inc(endpoint=endpoint)
             # Retry on certain HTTP statuses
-            if response.status_code in RETRY_STATUSES or (allow_404_retry and response.status_code == 404 and attempt == 1):
+            if attempt < MAX_RETRIES and (
+                response.status_code in RETRY_STATUSES or (allow_404_retry and response.status_code == 404 and attempt == 1)
+            ):
+                backoff_seconds = jittered_backoff(attempt)
                 logger.warning(
                     f"[{request_id}] Transient HTTP {response.status_code} for {url} params={safe_params} "
                     f"(attempt {attempt}, {elapsed:.1f}ms); retrying in {backoff_seconds:.1f}s..."
                 )
-                time.sleep(backoff_seconds)
-                backoff_seconds *= 2
+                metrics.RETRIES.inc(endpoint=endpoint, reason=response.status_code)
+                _backoff(endpoint, backoff_seconds)
                 continue
-            logger.debug(
-                f"[{request_id}] HTTP {response.status_code} for {url} params={safe_params} "
-                f"(attempt {attempt}, {elapsed:.1f}ms)"
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"[{request_id}] HTTP {response.status_code} for {url} params={safe_params} "
+                    f"(attempt {attempt}, {elapsed:.1f}ms)"
+                )
             return response
         except requests.RequestException as e:
             last_exc = e
+            metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint, status="error")
+            upstream_guard.record(None)
+            if attempt == MAX_RETRIES:
+                break
+            backoff_seconds = jittered_backoff(attempt)
             logger.warning(
                 f"[{request_id}] Network error for {url} params={safe_params} "
                 f"(attempt {attempt}): {str(e)}; retrying in {backoff_seconds:.1f}s..."
             )
-            time.sleep(backoff_seconds)
-            backoff_seconds *= 2
+            metrics.RETRIES.inc(endpoint=endpoint, reason="network")
+            _backoff(endpoint, backoff_seconds)
     # If we get here, either we exhausted retries or had persistent error
     if last_exc:
         raise last_exc
     # No exception but never returned a response (should not happen)
     raise requests.RequestException(f"Failed to get a successful response after {MAX_RETRIES} attempts for {url}")
 
-def search_foods(query: str, page_size: int = 10, page: int = 1, *, request_id: Optional[str] = None, data_types: Optional[List[str]] = None) -> Dict:
+def _normalize_data_types(data_types: Optional[List[str]], request_id: Optional[str] = None) -> List[str]:
+    # Default data types if none specified.
+    # Keep order stable so result mix remains predictable.
+    if not data_types:
+        return list(DEFAULT_DATA_TYPES)
+    # Normalize and drop unsupported values to avoid upstream 400s.
+    normalized = [dt.strip() for dt in data_types if isinstance(dt, str) and dt.strip()]
+    filtered = [dt for dt in normalized if dt in VALID_DATA_TYPES]
+    if not filtered:
+        logger.warning(f"[{request_id}] No valid dataTypes in {data_types}; falling back to defaults")
+        metrics.FALLBACKS.inc(kind="default_data_types")
+        filtered = list(DEFAULT_DATA_TYPES)
+    return filtered
+
+def _expired_fallback(key: str, result: Dict, request_id: Optional[str]) -> Dict:
+    """
+    While USDA is failing (429, 5xx, network, open breaker), serve a cached copy
+    past its stale window rather than the error, if one is still held.
+    """
+    if not (isinstance(result, dict) and "error" in result and result.get("status") in (0, 429, 500, 502, 503)):
+        return result
+    cached = response_cache.peek(key, include_expired=True)
+    if cached is None or (isinstance(cached, dict) and "error" in cached):
+        return result
+    logger.warning(f"[{request_id}] Serving expired cache entry for {key}: {result.get('error')}")
+    metrics.FALLBACKS.inc(kind="expired_cache")
+    return cached
+
+def _cached(endpoint: str, key: str, fetch, request_id: Optional[str]) -> Dict:
+    ttl, stale_ttl, negative_ttl = CACHE_TTLS[endpoint]
+    result = response_cache.get_or_fetch(
+        f"{endpoint}:{key}", fetch, ttl=ttl, stale_ttl=stale_ttl, negative_ttl=negative_ttl
+    )
+    result = _expired_fallback(f"{endpoint}:{key}", result, request_id)
+    if isinstance(result, dict) and "error" in result and result.get("requestId") != request_id:
+        # Cached 404s carry the id of the request that stored them.
+        result = dict(result, requestId=request_id)
+    return result
+
+def search_foods(query: str, page_size: int = 10, page: int = 1, *, request_id: Optional[str] = None, data_types: Optional[List[str]] = None, sort_by: Optional[str] = None) -> Dict:
+    """
+    Search the local food index, falling back to the cached live search when it has
+    no hits or does not hold every requested data type (e.g. a Foundation-only
+    index asked for Branded foods, whose live matches it would otherwise hide).
+    See _search_foods for arguments and return shape.
+    """
+    if local_index is not None:
+        try:
+            normalized = _normalize_data_types(data_types, request_id)
+            if local_index.covers(normalized):
+                local = local_index.search(query, page_size=page_size, page=page, data_types=normalized, sort_by=sort_by)
+                if local["results"]:
+                    return local
+                metrics.FALLBACKS.inc(kind="index_miss")
+            else:
+                metrics.FALLBACKS.inc(kind="index_coverage")
+        except sqlite3.Error as e:
+            logger.warning(f"[{request_id}] Local index search failed: {str(e)}; using USDA API")
+            metrics.FALLBACKS.inc(kind="index_error")
+    key = "|".join([
+        query.strip().lower(),
+        str(page_size),
+        str(page),
+        ",".join(sorted(dt.strip() for dt in data_types or [] if isinstance(dt, str))),
+        sort_by or "",
+    ])
+    fetch = _search_foods
+    if USE_ASYNC_CLIENT:
+        from utils.usda_async import search_foods_blocking as fetch
+    result = _cached(
+        "search",
+        key,
+        lambda: fetch(query, page_size=page_size, page=page, request_id=request_id, data_types=data_types, sort_by=sort_by),
+        request_id,
+    )
+    if "results" in result:
+        suggest_index.add_many(result["results"])
+    return result
+
+def suggest_foods(query: str, limit: int = 10, *, data_types: Optional[List[str]] = None, request_id: Optional[str] = None) -> List[Dict]:
+    """
+    Typeahead matches for a partial query from the in-memory suggest index, without
+    calling USDA. Items have the same shape as search_foods results; data_types
+    follows the search_foods filter rules.
+    """
+    return suggest_index.suggest(query, limit=limit, data_types=_normalize_data_types(data_types, request_id))
+
+def _neighbors():
+    global neighbor_index
+    if neighbor_index is None:
+        with _neighbor_lock:
+            if neighbor_index is None:
+                from utils.compare import NeighborIndex
+
+                neighbor_index = NeighborIndex(
+                    loader=(lambda: local_index.iter_vectors(NEIGHBOR_MAX_ENTRIES)) if local_index is not None else None,
+                    max_entries=NEIGHBOR_MAX_ENTRIES,
+                )
+    return neighbor_index
+
+def preload_indexes() -> None:
+    """
+    Load the typeahead index (and with NEIGHBOR_PRELOAD, the neighbor index) from
+    the local food index now, in this thread, instead of in the background on
+    first use. A preloading gunicorn master calls this so workers share the
+    result copy-on-write.
+    """
+    if local_index is not None:
+        local_index.nutrient_table()
+        local_index.data_types()
+    suggest_index.preload()
+    if NEIGHBOR_PRELOAD:
+        _neighbors().preload()
+
+def _index_neighbors(foods: List[Dict]) -> None:
+    # Records fresh from USDA join the neighbor index, but only once /api/compare
+    # has created it; lookups never create it.
+    if neighbor_index is not None:
+        neighbor_index.add_many(foods)
+
+def similar_foods(foods: List[Dict], limit: int = 5, *, exclude: Optional[List] = None) -> List[List[Dict]]:
+    """
+    For each food record, the `limit` foods in the neighbor index with the closest
+    per-100 g nutrient vectors, nearest first and without calling USDA. fdcIds in
+    exclude (default: the foods themselves) are skipped.
+    """
+    if exclude is None:
+        exclude = [food.get("fdcId") for food in foods]
+    from utils.compare import vector_matrix
+
+    return _neighbors().nearest(vector_matrix(foods), limit=limit, exclude=[i for i in exclude if i is not None])
+
+def _search_foods(query: str, page_size: int = 10, page: int = 1, *, request_id: Optional[str] = None, data_types: Optional[List[str]] = None, sort_by: Optional[str] = None) -> Dict:
     """
     Search for foods in USDA FoodData API with pagination support
     
@@ -79,6 +331,7 @@ def search_foods(query: str, page_size: int = 10, page: int = 1, *, request_id:
         page_size: Number of results per page
         page: Page number (1-based)
         data_types: List of USDA data types to include (e.g., ["Branded", "SR Legacy", "Survey (FNDDS)", "Foundation"])
+        sort_by: Optional USDA sort field (e.g., "fdcId"), ascending; default is relevance
         
     Returns:
         On success, a dictionary containing:
@@ -91,18 +344,7 @@ def search_foods(query: str, page_size: int = 10, page: int = 1, *, request_id:
     """
     try:
         url = f"{BASE_URL}/foods/search"
-        # Default data types if none specified.
-        # Keep order stable so result mix remains predictable.
-        if not data_types:
-            data_types = ["Survey (FNDDS)", "SR Legacy", "Branded", "Foundation"]
-        else:
-            # Normalize and drop unsupported values to avoid upstream 400s.
-            normalized = [dt.strip() for dt in data_types if isinstance(dt, str) and dt.strip()]
-            filtered = [dt for dt in normalized if dt in VALID_DATA_TYPES]
-            if not filtered:
-                logger.warning(f"[{request_id}] No valid dataTypes in {data_types}; falling back to defaults")
-                filtered = ["Survey (FNDDS)", "SR Legacy", "Branded", "Foundation"]
-            data_types = filtered
+        data_types = _normalize_data_types(data_types, request_id)
         params = {
             "api_key": API_KEY,
             "query": query,
@@ -110,6 +352,9 @@ def search_foods(query: str, page_size: int = 10, page: int = 1, *, request_id:
             "pageNumber": page,
             "dataType": data_types
         }
+        if sort_by:
+            params["sortBy"] = sort_by
+            params["sortOrder"] = "asc"
         
         response = _request_with_retries("GET", url, params=params, allow_404_retry=True, request_id=request_id)
         # USDA occasionally changes accepted dataType combinations. If a filtered
@@ -118,12 +363,8 @@ def search_foods(query: str, page_size: int = 10, page: int = 1, *, request_id:
             logger.warning(
                 f"[{request_id}] USDA rejected dataType filter {data_types}; retrying unfiltered search"
             )
-            fallback_params = {
-                "api_key": API_KEY,
-                "query": query,
-                "pageSize": page_size,
-                "pageNumber": page,
-            }
+            metrics.SEARCH_UNFILTERED_FALLBACK.inc()
+            fallback_params = {k: v for k, v in params.items() if k != "dataType"}
             response = _request_with_retries(
                 "GET",
                 url,
@@ -159,11 +400,45 @@ def search_foods(query: str, page_size: int = 10, page: int = 1, *, request_id:
             text = ""
         logger.error(f"[{request_id}] HTTP error searching foods (status={status_code}): {str(e)}; body={text}")
         return {"error": f"USDA search failed with status {status_code}", "status": status_code, "requestId": request_id}
+    except UpstreamUnavailable as e:
+        logger.warning(f"[{request_id}] Search not sent: {str(e)}")
+        return _unavailable_error(e, request_id)
     except requests.RequestException as e:
         logger.error(f"[{request_id}] Network error searching foods: {str(e)}")
         return {"error": "Network error contacting USDA API", "status": 0, "requestId": request_id}
 
 def get_food_data(food_id: str, *, request_id: Optional[str] = None) -> Dict:
+    """
+    Fetch food data from the local food index, or from USDA FoodData API through the response cache
+    """
+    if local_index is not None:
+        try:
+            food = local_index.get_food(int(food_id))
+            if food is None:
+                metrics.FALLBACKS.inc(kind="index_miss")
+        except ValueError:
+            food = None
+        except sqlite3.Error as e:
+            logger.warning(f"[{request_id}] Local index lookup failed id={food_id}: {str(e)}; using USDA API")
+            metrics.FALLBACKS.inc(kind="index_error")
+            food = None
+        if food is not None:
+            return food
+    fetch = _get_food_data
+    if USE_ASYNC_CLIENT:
+        from utils.usda_async import get_food_data_blocking as fetch
+
+    def fetch_and_index() -> Dict:
+        food = fetch(food_id, request_id=request_id)
+        if isinstance(food, dict) and "error" not in food:
+            _index_neighbors([food])
+        return food
+    food = _cached("food", str(food_id).strip(), fetch_and_index, request_id)
+    if "error" not in food:
+        suggest_index.add_many([food])
+    return food
+
+def _get_food_data(food_id: str, *, request_id: Optional[str] = None) -> Dict:
     """
     Fetch food data from USDA FoodData API
     """
@@ -188,6 +463,92 @@ def get_food_data(food_id: str, *, request_id: Optional[str] = None) -> Dict:
             text = ""
         logger.error(f"[{request_id}] HTTP error fetching food data id={food_id} (status={status_code}): {str(e)}; body={text}")
         return {"error": f"USDA food {food_id} failed with status {status_code}", "status": status_code, "requestId": request_id}
+    except UpstreamUnavailable as e:
+        logger.warning(f"[{request_id}] Food request not sent id={food_id}: {str(e)}")
+        return _unavailable_error(e, request_id)
     except requests.RequestException as e:
         logger.error(f"[{request_id}] Network error fetching food data id={food_id}: {str(e)}")
         return {"error": "Network error contacting USDA API", "status": 0, "requestId": request_id}
+
+def _get_foods_batch(food_ids: List[str], *, request_id: Optional[str] = None) -> Dict[str, Dict]:
+    """
+    Fetch up to BATCH_SIZE foods with one POST /foods call.
+    Ids the API does not return are reported as 404 errors.
+    """
+    try:
+        url = f"{BASE_URL}/foods"
+        params = {"api_key": API_KEY}
+        body = {"fdcIds": [int(fid) for fid in food_ids], "format": "full"}
+        response = _request_with_retries("POST", url, params=params, json_body=body, request_id=request_id)
+        response.raise_for_status()
+        # Match on the numeric id, so "0123" finds the record USDA returns as 123.
+        found = {int(food["fdcId"]): food for food in response.json() if isinstance(food, dict) and "fdcId" in food}
+        return {
+            fid: found.get(int(fid)) or {"error": f"USDA food {fid} not found", "status": 404, "requestId": request_id}
+            for fid in food_ids
+        }
+    except requests.HTTPError as e:
+        status_code = e.response.status_code if e.response is not None else 0
+        logger.error(f"[{request_id}] HTTP error fetching food batch ids={food_ids} (status={status_code}): {str(e)}")
+        error = {"error": f"USDA food batch failed with status {status_code}", "status": status_code, "requestId": request_id}
+    except UpstreamUnavailable as e:
+        logger.warning(f"[{request_id}] Food batch not sent ids={food_ids}: {str(e)}")
+        error = _unavailable_error(e, request_id)
+    except requests.RequestException as e:
+        logger.error(f"[{request_id}] Network error fetching food batch ids={food_ids}: {str(e)}")
+        error = {"error": "Network error contacting USDA API", "status": 0, "requestId": request_id}
+    return {fid: error for fid in food_ids}
+
+def get_foods_data(food_ids: List[str], *, request_id: Optional[str] = None, index: bool = True) -> Dict[str, Dict]:
+    """
+    Fetch many foods at once.
+
+    Foods in the local index or the response cache are served directly; the rest
+    are fetched with batched POST /foods calls (BATCH_SIZE ids each) running in
+    parallel. Returns a dictionary keyed by fdcId string whose values are food
+    records or error dictionaries in the get_food_data format. Fetched records are
+    added to the typeahead and neighbor indexes unless index is False, as for
+    exports, which would otherwise grow them with every food they stream.
+    """
+    results: Dict[str, Dict] = {}
+    missing: List[str] = []
+    for food_id in dict.fromkeys(str(fid).strip() for fid in food_ids):
+        if not food_id.isdigit():
+            results[food_id] = {"error": f"Invalid food id {food_id}", "status": 400, "requestId": request_id}
+            continue
+        food = None
+        if local_index is not None:
+            try:
+                food = local_index.get_food(int(food_id))
+                if food is None:
+                    metrics.FALLBACKS.inc(kind="index_miss")
+            except sqlite3.Error as e:
+                logger.warning(f"[{request_id}] Local index lookup failed id={food_id}: {str(e)}; using USDA API")
+                metrics.FALLBACKS.inc(kind="index_error")
+        if food is None:
+            food = response_cache.peek(f"food:{food_id}")
+        if food is not None:
+            results[food_id] = food
+        else:
+            missing.append(food_id)
+
+    chunks = [missing[i:i + BATCH_SIZE] for i in range(0, len(missing), BATCH_SIZE)]
+    if chunks:
+        ttl, stale_ttl, negative_ttl = CACHE_TTLS["food"]
+        with ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(chunks))) as executor:
+            # Each batch runs in a copy of this context, so the upstream and
+            # throttle phases it records reach this request's Server-Timing.
+            futures = [
+                executor.submit(contextvars.copy_context().run, _get_foods_batch, chunk, request_id=request_id)
+                for chunk in chunks
+            ]
+            for future in futures:
+                fetched = future.result()
+                for food_id, food in fetched.items():
+                    response_cache.put(f"food:{food_id}", food, ttl=ttl, stale_ttl=stale_ttl, negative_ttl=negative_ttl)
+                    results[food_id] = _expired_fallback(f"food:{food_id}", food, request_id)
+                if index:
+                    fresh = [food for food in fetched.values() if "error" not in food]
+                    suggest_index.add_many(fresh)
+                    _index_neighbors(fresh)
+    return results
@@ -0,0 +1,303 @@
+"""
+asyncio client for the USDA FoodData Central API.
+
+Offers the same search_foods/get_food_data results as utils.usda_api, with:
+  - one pooled keep-alive HTTP connection set (httpx.AsyncClient)
+  - backoff via asyncio.sleep, so waiting retries never hold a thread
+  - a concurrency limit on in-flight upstream requests
+  - single-flight coalescing: concurrent calls for the same food or search
+    share one upstream request
+  - the same shared rate limiter and circuit breaker (usda_api.upstream_guard)
+    as the sync client, waited on with asyncio.sleep
+
+Sync code (the Flask routes) reaches it through the *_blocking wrappers, which
+run coroutines on a background event loop owned by this process. Enable it for
+the app with USDA_ASYNC_CLIENT=1; a threaded gunicorn worker
+(`--worker-class gthread --threads 16`) then serves many requests per process
+over the shared pool.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from utils import metrics, usda_api
+from utils.upstream_guard import UpstreamUnavailable, jittered_backoff, parse_retry_after
+from utils.usda_api import (
+    API_KEY,
+    BASE_URL,
+    MAX_RETRIES,
+    RETRY_STATUSES,
+    TIMEOUT_SECONDS,
+    _mask_api_key,
+    _normalize_data_types,
+    _unavailable_error,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = int(os.environ.get("USDA_MAX_CONCURRENCY", 8))
+MAX_CONNECTIONS = int(os.environ.get("USDA_MAX_CONNECTIONS", 16))
+
+
+class AsyncUSDAClient:
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        api_key: str = API_KEY,
+        *,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_connections: int = MAX_CONNECTIONS,
+        timeout: float = TIMEOUT_SECONDS,
+        max_retries: int = MAX_RETRIES,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.upstream_calls = 0
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _request_with_retries(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Dict,
+        allow_404_retry: bool = False,
+        request_id: Optional[str] = None,
+    ) -> httpx.Response:
+        """
+        Async counterpart of usda_api._request_with_retries, including its
+        UpstreamUnavailable fail-fast and jittered backoff.
+        """
+        last_exc: Optional[Exception] = None
+        safe_params = _mask_api_key(params)
+        endpoint = metrics.upstream_endpoint(self.base_url, url)
+        for attempt in range(1, self.max_retries + 1):
+            await self._throttle(endpoint)
+            try:
+                async with self._semaphore:
+                    self.upstream_calls += 1
+                    t0 = time.perf_counter()
+                    response = await self._client.request(method, url, params=params)
+                elapsed_s = time.perf_counter() - t0
+                elapsed = elapsed_s * 1000.0
+                metrics.UPSTREAM_SECONDS.observe(elapsed_s, endpoint=endpoint, status=response.status_code)
+                await self._record(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+                if response.status_code == 429:
+                    metrics.RATE_LIMITED.inc(endpoint=endpoint)
+                if attempt < self.max_retries and (
+                    response.status_code in RETRY_STATUSES or (allow_404_retry and response.status_code == 404 and attempt == 1)
+                ):
+                    backoff_seconds = jittered_backoff(attempt)
+                    logger.warning(
+                        f"[{request_id}] Transient HTTP {response.status_code} for {url} params={safe_params} "
+                        f"(attempt {attempt}, {elapsed:.1f}ms); retrying in {backoff_seconds:.1f}s..."
+                    )
+                    metrics.RETRIES.inc(endpoint=endpoint, reason=response.status_code)
+                    await self._backoff(endpoint, backoff_seconds)
+                    continue
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f"[{request_id}] HTTP {response.status_code} for {url} params={safe_params} "
+                        f"(attempt {attempt}, {elapsed:.1f}ms)"
+                    )
+                return response
+            except httpx.RequestError as e:
+                last_exc = e
+                metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint, status="error")
+                await self._record(None)
+                if attempt == self.max_retries:
+                    break
+                backoff_seconds = jittered_backoff(attempt)
+                logger.warning(
+                    f"[{request_id}] Network error for {url} params={safe_params} "
+                    f"(attempt {attempt}): {str(e)}; retrying in {backoff_seconds:.1f}s..."
+                )
+                metrics.RETRIES.inc(endpoint=endpoint, reason="network")
+                await self._backoff(endpoint, backoff_seconds)
+        if last_exc:
+            raise last_exc
+        raise httpx.RequestError(f"Failed to get a successful response after {self.max_retries} attempts for {url}")
+
+    async def _backoff(self, endpoint: str, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+        metrics.BACKOFF_SECONDS.observe(seconds, endpoint=endpoint)
+
+    # The guard's state may sit behind a flock shared with other workers, so
+    # its calls run in the default executor rather than blocking the loop.
+    async def _record(self, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        await asyncio.to_thread(usda_api.upstream_guard.record, status, retry_after)
+
+    async def _throttle(self, endpoint: str) -> None:
+        try:
+            wait = await asyncio.to_thread(usda_api.upstream_guard.acquire)
+        except UpstreamUnavailable as e:
+            metrics.GUARD_REJECTIONS.inc(endpoint=endpoint, reason=e.reason)
+            raise
+        if wait > 0:
+            await asyncio.sleep(wait)
+            metrics.THROTTLE_SECONDS.observe(wait, endpoint=endpoint)
+
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Dict]]) -> Dict:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one caller's cancellation doesn't cancel the shared request.
+        return await asyncio.shield(task)
+
+    async def search_foods(
+        self,
+        query: str,
+        page_size: int = 10,
+        page: int = 1,
+        *,
+        request_id: Optional[str] = None,
+        data_types: Optional[List[str]] = None,
+        sort_by: Optional[str] = None,
+    ) -> Dict:
+        """
+        Search for foods; same arguments and result shape as usda_api.search_foods.
+        """
+        data_types = _normalize_data_types(data_types, request_id)
+        key = f"search:{query.strip().lower()}|{page_size}|{page}|{','.join(data_types)}|{sort_by or ''}"
+        return await self._single_flight(
+            key, lambda: self._search_foods(query, page_size, page, request_id, data_types, sort_by)
+        )
+
+    async def _search_foods(self, query: str, page_size: int, page: int, request_id: Optional[str], data_types: List[str], sort_by: Optional[str] = None) -> Dict:
+        url = f"{self.base_url}/foods/search"
+        try:
+            params = {
+                "api_key": self.api_key,
+                "query": query,
+                "pageSize": page_size,
+                "pageNumber": page,
+                "dataType": data_types,
+            }
+            if sort_by:
+                params["sortBy"] = sort_by
+                params["sortOrder"] = "asc"
+            response = await self._request_with_retries("GET", url, params=params, allow_404_retry=True, request_id=request_id)
+            if response.status_code == 400 and data_types:
+                logger.warning(
+                    f"[{request_id}] USDA rejected dataType filter {data_types}; retrying unfiltered search"
+                )
+                metrics.SEARCH_UNFILTERED_FALLBACK.inc()
+                fallback_params = {k: v for k, v in params.items() if k != "dataType"}
+                response = await self._request_with_retries(
+                    "GET", url, params=fallback_params, allow_404_retry=True, request_id=request_id
+                )
+            response.raise_for_status()
+
+            data = response.json()
+            total_hits = data.get("totalHits", 0)
+            return {
+                "results": [
+                    {
+                        "fdcId": food["fdcId"],
+                        "description": food["description"],
+                        "dataType": food.get("dataType", ""),
+                        "brandOwner": food.get("brandOwner", ""),
+                    }
+                    for food in data.get("foods", [])
+                ],
+                "totalPages": (total_hits + page_size - 1) // page_size,
+                "currentPage": page,
+            }
+        except httpx.HTTPStatusError as e:
+            status_code = e.response.status_code
+            logger.error(f"[{request_id}] HTTP error searching foods (status={status_code}): {str(e)}; body={e.response.text}")
+            return {"error": f"USDA search failed with status {status_code}", "status": status_code, "requestId": request_id}
+        except UpstreamUnavailable as e:
+            logger.warning(f"[{request_id}] Search not sent: {str(e)}")
+            return _unavailable_error(e, request_id)
+        except httpx.RequestError as e:
+            logger.error(f"[{request_id}] Network error searching foods: {str(e)}")
+            return {"error": "Network error contacting USDA API", "status": 0, "requestId": request_id}
+
+    async def get_food_data(self, food_id: str, *, request_id: Optional[str] = None) -> Dict:
+        """
+        Fetch one food record; same result shape as usda_api.get_food_data.
+        """
+        food_id = str(food_id).strip()
+        return await self._single_flight(f"food:{food_id}", lambda: self._get_food_data(food_id, request_id))
+
+    async def _get_food_data(self, food_id: str, request_id: Optional[str]) -> Dict:
+        try:
+            url = f"{self.base_url}/food/{food_id}"
+            params = {"api_key": self.api_key, "format": "full"}
+            response = await self._request_with_retries("GET", url, params=params, allow_404_retry=True, request_id=request_id)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            status_code = e.response.status_code
+            logger.error(f"[{request_id}] HTTP error fetching food data id={food_id} (status={status_code}): {str(e)}; body={e.response.text}")
+            return {"error": f"USDA food {food_id} failed with status {status_code}", "status": status_code, "requestId": request_id}
+        except UpstreamUnavailable as e:
+            logger.warning(f"[{request_id}] Food request not sent id={food_id}: {str(e)}")
+            return _unavailable_error(e, request_id)
+        except httpx.RequestError as e:
+            logger.error(f"[{request_id}] Network error fetching food data id={food_id}: {str(e)}")
+            return {"error": "Network error contacting USDA API", "status": 0, "requestId": request_id}
+
+
+class _LoopThread:
+    """
+    Background event loop shared by every thread in the process. Recreated
+    after fork, since a loop and its sockets can't be shared with a child.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client: Optional[AsyncUSDAClient] = None
+
+    def _start(self) -> None:
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="usda-async-loop", daemon=True)
+        thread.start()
+
+        async def make_client() -> AsyncUSDAClient:
+            return AsyncUSDAClient()
+
+        self.client = asyncio.run_coroutine_threadsafe(make_client(), loop).result()
+        self.loop = loop
+        self._pid = os.getpid()
+
+    def run(self, factory: Callable[[AsyncUSDAClient], Awaitable[Dict]], timeout: Optional[float] = None) -> Dict:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+        return asyncio.run_coroutine_threadsafe(factory(self.client), self.loop).result(timeout)
+
+
+_runner = _LoopThread()
+
+
+def search_foods_blocking(query: str, page_size: int = 10, page: int = 1, *, request_id: Optional[str] = None, data_types: Optional[List[str]] = None, sort_by: Optional[str] = None) -> Dict:
+    return _runner.run(
+        lambda client: client.search_foods(query, page_size, page, request_id=request_id, data_types=data_types, sort_by=sort_by)
+    )
+
+
+def get_food_data_blocking(food_id: str, *, request_id: Optional[str] = None) -> Dict:
+    return _runner.run(lambda client: client.get_food_data(food_id, request_id=request_id))
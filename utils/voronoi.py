@@ -0,0 +1,274 @@
+"""
+Weighted (power) Voronoi treemap inside a circle, ported from the solver in
+docs/js/treemap.js (solveWeightedVoronoi and helpers) so layouts can be
+computed once on the server instead of on the client's main thread.
+
+Each cell starts as the circle polygon and is clipped by the power bisector of
+every other site. Clipping is the hot loop, so bisectors are applied nearest
+first and the loop stops at the first one farther from the site than any
+vertex of the cell; the remaining planes cannot cut it. The result is the
+same polygon the JS produces by clipping against every plane in turn.
+"""
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Point = Tuple[float, float]
+
+# Solver settings used by the circular Voronoi charts in docs/js/treemap.js.
+MAX_ITERATIONS = 70
+CENTROID_STEP = 0.42
+WEIGHT_STEP = 0.85
+BOUNDARY_SIDES = 80
+# Stop once the mean absolute area error per cell (px^2) is below this.
+TOLERANCE = 0.35
+
+
+def circle_polygon(cx: float, cy: float, radius: float, sides: int = BOUNDARY_SIDES) -> List[Point]:
+    return [
+        (cx + radius * math.cos(2 * math.pi * i / sides), cy + radius * math.sin(2 * math.pi * i / sides))
+        for i in range(sides)
+    ]
+
+
+def clip_half_plane(polygon: List[Point], a: float, b: float, c: float, x: float, y: float) -> Tuple[List[Point], float]:
+    """
+    Sutherland-Hodgman clip of polygon to the half-plane a*x + b*y <= c.
+    Also returns the largest squared distance from (x, y) to a kept vertex.
+    """
+    out = []
+    extent = 0.0
+    prev = polygon[-1]
+    prev_d = a * prev[0] + b * prev[1] - c
+    for curr in polygon:
+        curr_d = a * curr[0] + b * curr[1] - c
+        if (curr_d <= 0) != (prev_d <= 0):
+            denom = prev_d - curr_d
+            if abs(denom) < 1e-9:
+                point = curr
+            else:
+                t = prev_d / denom
+                point = (prev[0] + (curr[0] - prev[0]) * t, prev[1] + (curr[1] - prev[1]) * t)
+            out.append(point)
+            d2 = (point[0] - x) ** 2 + (point[1] - y) ** 2
+            if d2 > extent:
+                extent = d2
+        if curr_d <= 0:
+            out.append(curr)
+            d2 = (curr[0] - x) ** 2 + (curr[1] - y) ** 2
+            if d2 > extent:
+                extent = d2
+        prev, prev_d = curr, curr_d
+    return out, extent
+
+
+def area_centroid(polygon: Sequence[Point]) -> Tuple[float, float, float]:
+    """
+    (area, centroid x, centroid y); the vertex mean for degenerate polygons.
+    """
+    n = len(polygon)
+    if n < 3:
+        return 0.0, 0.0, 0.0
+    twice_area = cx = cy = 0.0
+    for i in range(n):
+        x0, y0 = polygon[i]
+        x1, y1 = polygon[(i + 1) % n]
+        cross = x0 * y1 - x1 * y0
+        twice_area += cross
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+    area = abs(twice_area) * 0.5
+    if abs(twice_area) < 1e-9:
+        return area, sum(p[0] for p in polygon) / n, sum(p[1] for p in polygon) / n
+    return area, cx / (3 * twice_area), cy / (3 * twice_area)
+
+
+def _clip_boundary(
+    boundary: List[Point], cx: float, cy: float, radius: float,
+    a: float, b: float, c: float, x: float, y: float,
+) -> Tuple[List[Point], float]:
+    """
+    clip_half_plane for the regular boundary polygon, without visiting every
+    vertex: the kept vertices form one run whose ends follow from the angle of
+    the half-plane, and only the vertices next to those ends are tested.
+    """
+    n = len(boundary)
+    norm = math.hypot(a, b)
+    if norm == 0:
+        return (list(boundary), (math.hypot(x - cx, y - cy) + radius) ** 2) if c >= 0 else ([], 0.0)
+    # Vertex k is kept when cos(theta_k - phi) <= limit.
+    limit = (c - a * cx - b * cy) / (radius * norm)
+    if limit >= 1:
+        return list(boundary), (math.hypot(x - cx, y - cy) + radius) ** 2
+    if limit < -1:
+        return [], 0.0
+
+    def d(k: int) -> float:
+        px, py = boundary[k % n]
+        return a * px + b * py - c
+
+    step = 2 * math.pi / n
+    phi = math.atan2(b, a)
+    half = math.acos(limit)
+    first = math.ceil((phi + half) / step)
+    last = math.floor((phi + 2 * math.pi - half) / step)
+    # Settle rounding at the ends against the exact vertex test.
+    while first <= last and d(first) > 0:
+        first += 1
+    while d(first - 1) <= 0 and first - 1 > last - n:
+        first -= 1
+    while last >= first and d(last) > 0:
+        last -= 1
+    while d(last + 1) <= 0 and last + 1 < first + n:
+        last += 1
+    if last < first:
+        return [], 0.0
+    if last - first + 1 >= n:
+        return list(boundary), (math.hypot(x - cx, y - cy) + radius) ** 2
+
+    def crossing(i: int, j: int) -> Point:
+        di, dj = d(i), d(j)
+        p1, p2 = boundary[i % n], boundary[j % n]
+        if abs(di - dj) < 1e-9:
+            return p2
+        t = di / (di - dj)
+        return (p1[0] + (p2[0] - p1[0]) * t, p1[1] + (p2[1] - p1[1]) * t)
+
+    cell = [crossing(first - 1, first)] + [boundary[k % n] for k in range(first, last + 1)] + [crossing(last, last + 1)]
+    return cell, max((px - x) ** 2 + (py - y) ** 2 for px, py in cell)
+
+
+def power_cell(
+    index: int,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    weights: np.ndarray,
+    boundary: List[Point],
+    cx: float,
+    cy: float,
+    radius: float,
+) -> List[Point]:
+    """
+    Cell of site index: the boundary polygon (circle_polygon(cx, cy, radius))
+    clipped by every other site's power bisector.
+    """
+    x, y = xs[index], ys[index]
+    a = 2 * (xs - x)
+    b = 2 * (ys - y)
+    c = (xs * xs + ys * ys - weights) - (x * x + y * y - weights[index])
+    # Distance from the site to each bisector, positive on the kept side. A site
+    # on top of this one has no bisector and is clipped first, as a constant test.
+    norm = np.hypot(a, b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        reach = np.where(norm > 0, (c - a * x - b * y) / norm, -np.inf)
+    reach[index] = np.inf
+    order = np.argsort(reach, kind="stable").tolist()
+    # Plain floats from here on: NumPy scalar arithmetic is slow in the clip loop.
+    x, y = float(x), float(y)
+    a, b, c, reach = a.tolist(), b.tolist(), c.tolist(), reach.tolist()
+
+    cell = None
+    # Every boundary vertex lies within this distance of the site.
+    extent = math.hypot(x - cx, y - cy) + radius
+    for j in order:
+        # The cell lies within extent of the site; a bisector farther away than
+        # that cannot cut it, and neither can any later (farther) one.
+        if reach[j] >= extent:
+            break
+        if cell is None:
+            cell, extent = _clip_boundary(boundary, cx, cy, radius, a[j], b[j], c[j], x, y)
+        else:
+            cell, extent = clip_half_plane(cell, a[j], b[j], c[j], x, y)
+        if not cell:
+            break
+        extent = math.sqrt(extent)
+    return list(boundary) if cell is None else cell
+
+
+def solve_weighted_voronoi(
+    sites: List[List[float]],
+    target_areas: Sequence[float],
+    cx: float,
+    cy: float,
+    radius: float,
+    max_iterations: int = MAX_ITERATIONS,
+    centroid_step: float = CENTROID_STEP,
+    weight_step: float = WEIGHT_STEP,
+    boundary_sides: int = BOUNDARY_SIDES,
+) -> Tuple[np.ndarray, np.ndarray, List[List[Point]]]:
+    """
+    Move sites and power weights until each cell's area approaches its target.
+    Sites are updated one at a time within an iteration, as in the JS solver.
+
+    Returns (site xs, site ys, cells).
+    """
+    boundary = circle_polygon(cx, cy, radius, boundary_sides)
+    xs = np.array([s[0] for s in sites], dtype=np.float64)
+    ys = np.array([s[1] for s in sites], dtype=np.float64)
+    weights = np.zeros(len(sites))
+    cells: List[List[Point]] = [[] for _ in sites]
+    max_dist = max(0.0, radius - 2)
+
+    for _ in range(max_iterations):
+        total_error = 0.0
+        for i in range(len(sites)):
+            cell = power_cell(i, xs, ys, weights, boundary, cx, cy, radius)
+            cells[i] = cell
+            area, centroid_x, centroid_y = area_centroid(cell)
+            area_error = target_areas[i] - area
+            total_error += abs(area_error)
+
+            # Move the site toward its cell centroid for centroidal behaviour.
+            if len(cell) >= 3:
+                xs[i] += (centroid_x - xs[i]) * centroid_step
+                ys[i] += (centroid_y - ys[i]) * centroid_step
+            # Adjust the power weight to correct the area mismatch.
+            weights[i] += area_error * weight_step
+
+            # Keep sites inside the circle.
+            dx, dy = xs[i] - cx, ys[i] - cy
+            dist = math.sqrt(dx * dx + dy * dy) or 1.0
+            if dist > max_dist:
+                xs[i] = cx + dx / dist * max_dist
+                ys[i] = cy + dy / dist * max_dist
+
+        if total_error / max(1, len(sites)) < TOLERANCE:
+            break
+    return xs, ys, cells
+
+
+def circular_voronoi(values: Sequence[float], size: float) -> Optional[Dict]:
+    """
+    Lay out values (sorted largest first) as cells of a circle in a size x size box.
+
+    Returns {"size", "radius", "cells": [{"polygon", "centroid", "share"}, ...]} with
+    one cell per value in input order, or None when there is nothing to draw.
+    share is the cell's fraction of the circle area, which the client uses to decide
+    whether a cell is big enough for a label.
+    """
+    if not values:
+        return None
+    cx = cy = size / 2
+    radius = size / 2 - 8
+    circle_area = math.pi * radius * radius
+    total = max(1e-9, sum(values))
+    targets = [value / total * circle_area for value in values]
+
+    # Initial sites on a golden-angle spiral for stable convergence.
+    golden = math.pi * (3 - math.sqrt(5))
+    sites = []
+    for i in range(len(values)):
+        r = radius * math.sqrt((i + 1) / (len(values) + 1)) * 0.85
+        sites.append([cx + r * math.cos(i * golden), cy + r * math.sin(i * golden)])
+
+    _, _, cells = solve_weighted_voronoi(sites, targets, cx, cy, radius)
+    out = []
+    for cell in cells:
+        area, centroid_x, centroid_y = area_centroid(cell)
+        out.append({
+            "polygon": [[round(x, 1), round(y, 1)] for x, y in cell],
+            "centroid": [round(centroid_x, 1), round(centroid_y, 1)],
+            "share": round(area / circle_area, 4),
+        })
+    return {"size": size, "radius": radius, "cells": out}
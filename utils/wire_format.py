@@ -0,0 +1,152 @@
+"""
+Compact encodings of the /api/food payloads, decoded in the browser by
+docs/js/wire.js.
+
+Columnar Sankey (SANKEY_COLUMNAR_MIMETYPE) packs a transform_to_sankey payload
+into one little-endian buffer the client reads with typed arrays:
+
+    offset  size  field
+    0       4     magic b"SNK1"
+    4       2     node count N (uint16)
+    6       2     link count L (uint16)
+    8       4     byte length S of the name table (uint32)
+    12      S     node names, UTF-8, separated by "\\n"; node i is the i-th name
+    ...           zero padding to a multiple of 4
+            2L    link sources (uint16)
+            2L    link targets (uint16)
+            ...   zero padding to a multiple of 4
+            4L    link values (float32)
+
+Values travel as float32, about 7 significant digits, which is finer than
+anything the charts draw.
+
+The nutrient vector (NUTRIENT_VECTOR_MIMETYPE) is the raw USDA record trimmed to what the charts read:
+the foodNutrients entries for the Sankey spec quantities and the chart
+micronutrients, as parallel id, name and amount arrays in record order, plus
+the foodPortions fields the portion picker uses. Expanding it gives a record
+every parser in the repo reads exactly like the original.
+"""
+import struct
+from typing import Dict, List
+
+from utils.chart_bundle import AMINO_ACIDS, MINERALS, VITAMINS
+from utils.data_transformer import list_portions
+from utils.nutrient_spec import QUANTITIES
+
+SANKEY_COLUMNAR_MIMETYPE = "application/x-sankey-columnar"
+NUTRIENT_VECTOR_MIMETYPE = "application/x-nutrient-vector+json"
+SANKEY_MAGIC = b"SNK1"
+_HEADER = struct.Struct("<4sHHI")
+
+NUTRIENT_VECTOR_FORMAT = "nutrient-vector"
+# Bump when the vector layout changes, so stored vectors are rebuilt.
+NUTRIENT_VECTOR_VERSION = 2
+# Nutrients are kept when their id or lowercased name is listed: the server
+# matches by id, the docs/js parsers by name.
+CHART_NUTRIENT_IDS = frozenset(
+    [nutrient_id for _, candidates in QUANTITIES for nutrient_id, _ in candidates if nutrient_id is not None]
+    + [nutrient_id for _, nutrient_id, _ in MINERALS + VITAMINS]
+    + [nutrient_id for _, nutrient_id in AMINO_ACIDS]
+)
+CHART_NUTRIENT_NAMES = frozenset(
+    [name.lower() for _, candidates in QUANTITIES for _, names in candidates for name in names]
+    + [name.lower() for _, _, name in MINERALS + VITAMINS]
+    + [name.lower() for name, _ in AMINO_ACIDS]
+)
+# foodPortions fields read by list_portions and the portion picker.
+PORTION_FIELDS = ("id", "gramWeight", "amount", "modifier", "portionDescription")
+
+
+def _pad4(size: int) -> int:
+    return -size % 4
+
+
+def encode_sankey_columnar(payload: Dict) -> bytes:
+    """
+    Pack a {"nodes", "links"} Sankey payload into the columnar layout.
+    """
+    names = "\n".join(node["name"] for node in payload["nodes"]).encode("utf-8")
+    links = payload["links"]
+    count = len(links)
+    parts = [
+        _HEADER.pack(SANKEY_MAGIC, len(payload["nodes"]), count, len(names)),
+        names,
+        b"\0" * _pad4(len(names)),
+        struct.pack(f"<{count}H", *(link["source"] for link in links)),
+        struct.pack(f"<{count}H", *(link["target"] for link in links)),
+        b"\0" * _pad4(4 * count),
+        struct.pack(f"<{count}f", *(link["value"] for link in links)),
+    ]
+    return b"".join(parts)
+
+
+def decode_sankey_columnar(raw: bytes) -> Dict:
+    """
+    Inverse of encode_sankey_columnar, with values widened back to Python floats.
+    """
+    magic, node_count, count, names_size = _HEADER.unpack_from(raw, 0)
+    if magic != SANKEY_MAGIC:
+        raise ValueError(f"not a columnar Sankey payload (magic {magic!r})")
+    offset = _HEADER.size
+    names = raw[offset:offset + names_size].decode("utf-8").split("\n") if node_count else []
+    offset += names_size + _pad4(names_size)
+    sources = struct.unpack_from(f"<{count}H", raw, offset)
+    targets = struct.unpack_from(f"<{count}H", raw, offset + 2 * count)
+    offset += 4 * count + _pad4(4 * count)
+    values = struct.unpack_from(f"<{count}f", raw, offset)
+    return {
+        "nodes": [{"node": i, "name": name} for i, name in enumerate(names)],
+        "links": [{"source": s, "target": t, "value": v} for s, t, v in zip(sources, targets, values)],
+    }
+
+
+def _trim_portion(portion: Dict) -> Dict:
+    trimmed = {key: portion[key] for key in PORTION_FIELDS if portion.get(key) is not None}
+    unit = portion.get("measureUnit") or {}
+    if unit.get("name") or unit.get("abbreviation"):
+        trimmed["measureUnit"] = {key: unit[key] for key in ("name", "abbreviation") if unit.get(key)}
+    return trimmed
+
+
+def nutrient_vector(food_data: Dict) -> Dict:
+    """
+    The raw food record reduced to the nutrients and portion fields the charts use,
+    plus the labelled portion list (list_portions) the portion picker shows.
+    """
+    ids: List = []
+    names: List[str] = []
+    amounts: List[float] = []
+    for entry in food_data.get("foodNutrients") or []:
+        nutrient = entry.get("nutrient") or {}
+        nutrient_id = nutrient.get("id")
+        name = nutrient.get("name") or ""
+        if nutrient_id in CHART_NUTRIENT_IDS or name.lower() in CHART_NUTRIENT_NAMES:
+            ids.append(nutrient_id)
+            names.append(name)
+            amounts.append(entry.get("amount") or 0)
+    return {
+        "format": NUTRIENT_VECTOR_FORMAT,
+        "fdcId": food_data.get("fdcId"),
+        "description": food_data.get("description"),
+        "dataType": food_data.get("dataType"),
+        "foodPortions": [_trim_portion(p) for p in food_data.get("foodPortions") or []],
+        "portions": list_portions(food_data),
+        "ids": ids,
+        "names": names,
+        "amounts": amounts,
+    }
+
+
+def expand_nutrient_vector(vector: Dict) -> Dict:
+    """
+    Rebuild a USDA-shaped record (foodNutrients entries) from a nutrient vector.
+    """
+    food_nutrients = []
+    for nutrient_id, name, amount in zip(vector["ids"], vector["names"], vector["amounts"]):
+        nutrient = {"name": name}
+        if nutrient_id is not None:
+            nutrient["id"] = nutrient_id
+        food_nutrients.append({"nutrient": nutrient, "amount": amount})
+    food = {key: vector[key] for key in ("fdcId", "description", "dataType", "foodPortions")}
+    food["foodNutrients"] = food_nutrients
+    return food